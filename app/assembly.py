@@ -0,0 +1,185 @@
+"""assembly.py — constraint-based exam paper assembly.
+
+The generator used to take the first N unused questions of each type, so
+every paper came out the same.  Here each type's candidate pool is loaded
+with one indexed query (``question_type = ? AND is_used = 0``) that fetches
+only the columns the solver needs, then the constraints are solved in
+memory with a seeded RNG — no ``ORDER BY RANDOM()``, which would sort the
+whole bank on every call.
+
+Constraints, all optional except ``count``::
+
+    config = {
+        '单选': {'count': 10, 'points': 2,
+                 'difficulty': {'easy': 3, 'medium': 5, 'hard': 2},
+                 'knowledge_points': ['机会成本']},
+        ...
+    }
+    difficulty = {'easy': 0.3, 'medium': 0.5, 'hard': 0.2}   # default mix
+    knowledge_points = ['边际成本', '外部性']                  # whole paper
+
+Difficulty mixes are weights, converted to per-type counts by largest
+remainder.  Required knowledge points are covered first (greedily, within
+the difficulty quotas where possible), then quotas are filled, then any
+remaining slots take whatever is left.  The result is always a best-effort
+paper plus a list of targets that could not be met.
+"""
+import random
+from collections import defaultdict
+
+from app.db_models import db, QuestionModel
+
+
+def _norm(value):
+    return (value or '').strip().casefold()
+
+
+def allocate(count, weights):
+    """Split count over weights by largest remainder: {key: int}, summing to count.
+
+    Raises ValueError for a weight that is not a non-negative number.
+    """
+    for k, w in (weights or {}).items():
+        if isinstance(w, bool) or not isinstance(w, (int, float)) or w < 0:
+            raise ValueError(f'difficulty weight for {k!r} must be a non-negative number')
+    weights = {k: float(w) for k, w in (weights or {}).items() if w > 0}
+    total = sum(weights.values())
+    if count <= 0 or not total:
+        return {}
+    exact = {k: count * w / total for k, w in weights.items()}
+    quotas = {k: int(v) for k, v in exact.items()}
+    short = count - sum(quotas.values())
+    for k in sorted(exact, key=lambda k: (quotas[k] - exact[k], k))[:short]:
+        quotas[k] += 1
+    return quotas
+
+
+def load_candidates(question_type, subject=None):
+    """Unused questions of one type as [(question_id, difficulty, knowledge_point)].
+
+    difficulty is trimmed and casefolded; knowledge_point is casefolded for
+    substring matching against required knowledge points.
+    """
+    stmt = db.select(
+        QuestionModel.question_id, QuestionModel.difficulty, QuestionModel.knowledge_point
+    ).where(
+        QuestionModel.question_type == question_type,
+        QuestionModel.is_used == False,
+    )
+    if subject:
+        stmt = stmt.where(QuestionModel.subject == subject)
+    levels = {}     # few distinct difficulty values; normalize each once
+    pool = []
+    for qid, diff, kp in db.session.execute(stmt):
+        level = levels.get(diff)
+        if level is None:
+            level = levels[diff] = _norm(diff)
+        pool.append((qid, level, kp.casefold() if kp else ''))
+    # Sorted so a given seed reproduces the same paper regardless of scan order.
+    pool.sort()
+    return pool
+
+
+def _pick_type(pool, count, quotas, required_kps, rng):
+    """Choose up to count pool indexes.
+
+    Returns (picked_question_ids, covered_kps, remaining_quotas).
+    """
+    remaining = dict(quotas)
+    picked, taken = [], set()
+
+    def take(i):
+        picked.append(i)
+        taken.add(i)
+        level = pool[i][1]
+        if remaining.get(level, 0) > 0:
+            remaining[level] -= 1
+
+    # 1. Coverage: one random match per uncovered knowledge point, preferring
+    #    difficulty levels that still have quota.
+    covered = set()
+    for kp in required_kps:
+        if len(picked) >= count:
+            break
+        if kp in covered:
+            continue
+        matches = [i for i, cand in enumerate(pool) if kp in cand[2] and i not in taken]
+        if not matches:
+            continue
+        in_quota = [i for i in matches if remaining.get(pool[i][1], 0) > 0]
+        i = rng.choice(in_quota or matches)
+        take(i)
+        covered.update(k for k in required_kps if k in pool[i][2])
+
+    # 2. Difficulty quotas, sampled from each level's bucket.
+    if quotas:
+        by_level = defaultdict(list)
+        for i, cand in enumerate(pool):
+            if cand[1] in remaining and i not in taken:
+                by_level[cand[1]].append(i)
+        for level in sorted(remaining):
+            need = min(remaining[level], count - len(picked), len(by_level[level]))
+            for i in rng.sample(by_level[level], need):
+                take(i)
+
+    # 3. Any remaining slots.
+    need = count - len(picked)
+    if need > 0:
+        rest = [i for i in range(len(pool)) if i not in taken]
+        for i in rng.sample(rest, min(need, len(rest))):
+            take(i)
+
+    rng.shuffle(picked)
+    return [pool[i][0] for i in picked], covered, remaining
+
+
+def assemble(config, subject=None, difficulty=None, knowledge_points=None, seed=None):
+    """Solve the paper constraints.
+
+    Returns (question_ids_by_type, report).  report['unmet'] lists each
+    missed target as {'kind', 'question_type'?, 'target', 'requested',
+    'selected'}; it is empty when every constraint was satisfied.
+    """
+    rng = random.Random(seed)
+    global_kps = [_norm(kp) for kp in (knowledge_points or []) if _norm(kp)]
+    covered_global = set()
+    selected = {}
+    report = {'types': {}, 'unmet': []}
+
+    for raw_type, settings in config.items():
+        question_type = raw_type.strip()
+        count = int(settings.get('count', 0) or 0)
+        if count <= 0:
+            continue
+        weights = settings.get('difficulty') or difficulty or {}
+        quotas = allocate(count, {_norm(k): v for k, v in weights.items()})
+        type_kps = [_norm(kp) for kp in settings.get('knowledge_points') or [] if _norm(kp)]
+        required = list(dict.fromkeys(type_kps + [kp for kp in global_kps if kp not in covered_global]))
+
+        pool = load_candidates(question_type, subject)
+        picked, covered, remaining = _pick_type(pool, count, quotas, required, rng)
+        selected[question_type] = picked
+        covered_global |= covered
+
+        report['types'][question_type] = {
+            'requested': count, 'selected': len(picked), 'available': len(pool),
+        }
+        if len(picked) < count:
+            report['unmet'].append({'kind': 'count', 'question_type': question_type,
+                                    'target': question_type, 'requested': count,
+                                    'selected': len(picked)})
+        for level, quota in quotas.items():
+            got = quota - remaining.get(level, 0)
+            if got < quota:
+                report['unmet'].append({'kind': 'difficulty', 'question_type': question_type,
+                                        'target': level, 'requested': quota, 'selected': got})
+        for kp in type_kps:
+            if kp not in covered:
+                report['unmet'].append({'kind': 'knowledge_point', 'question_type': question_type,
+                                        'target': kp, 'requested': 1, 'selected': 0})
+
+    for kp in global_kps:
+        if kp not in covered_global:
+            report['unmet'].append({'kind': 'knowledge_point', 'target': kp,
+                                    'requested': 1, 'selected': 0})
+    return selected, report
@@ -0,0 +1,211 @@
+"""batch_export.py — render many exam papers in parallel into one ZIP.
+
+POST /api/exams/export-batch takes exam IDs and mode/answer variants.  The
+request thread snapshots each exam (questions, course settings, image
+metadata; see utils.snapshot_exam) and hands the snapshots to a process
+pool, since python-docx rendering is CPU-bound and holds the GIL.  Finished
+documents are written into a ZIP that is streamed back as each one
+completes, in completion order; nothing is written to exports/.  The
+archive ends with manifest.json listing every file and any failures.
+
+Each batch gets an ExportBatch whose progress (done/failed of total) can
+be polled at GET /api/exams/export-batch/<batch_id>; the ID is sent in
+the X-Export-Batch response header.
+
+EXPORT_WORKERS sets the pool size (default: CPU count, at most 4);
+0 renders in the request thread instead, e.g. where worker processes
+cannot be spawned.  Batches are tracked in this process and only the most
+recent MAX_FINISHED_BATCHES are kept.
+"""
+import json
+import multiprocessing
+import os
+import re
+import threading
+import uuid
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+from app.utils import render_exam_snapshot
+
+MODES = ('zh', 'en', 'both')
+MAX_FILES = 200
+MAX_FINISHED_BATCHES = 50
+
+_batches = OrderedDict()
+_batches_lock = threading.Lock()
+_pool = None          # (workers, ProcessPoolExecutor)
+_pool_lock = threading.Lock()
+
+
+class ExportBatch:
+    """Progress of one batch export."""
+
+    def __init__(self, total):
+        self.batch_id = 'exp_' + uuid.uuid4().hex[:12]
+        self.status = 'running'
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self.files = []
+        self.errors = []
+        self.created_at = datetime.now()
+        self.finished_at = None
+
+    @property
+    def finished(self):
+        return self.status != 'running'
+
+    def to_dict(self):
+        return {
+            'batch_id': self.batch_id,
+            'status': self.status,
+            'total': self.total,
+            'done': self.done,
+            'failed': self.failed,
+            'files': list(self.files),
+            'errors': list(self.errors),
+            'created_at': self.created_at.isoformat(),
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
+def register(batch):
+    with _batches_lock:
+        finished = [bid for bid, b in _batches.items() if b.finished]
+        for bid in finished[:max(0, len(finished) - MAX_FINISHED_BATCHES)]:
+            del _batches[bid]
+        _batches[batch.batch_id] = batch
+    return batch
+
+
+def get_batch(batch_id):
+    with _batches_lock:
+        return _batches.get(batch_id)
+
+
+def default_workers():
+    return min(4, os.cpu_count() or 1)
+
+
+def _get_pool(workers):
+    """The shared process pool, rebuilt when EXPORT_WORKERS has changed.
+
+    A replaced pool finishes the documents already submitted to it.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool[0] != workers:
+            if _pool is not None:
+                _pool[1].shutdown(wait=False)
+            # spawn, not fork: the server process has threads and open connections
+            _pool = (workers, ProcessPoolExecutor(max_workers=workers,
+                                                  mp_context=multiprocessing.get_context('spawn')))
+        return _pool[1]
+
+
+def parse_variants(raw):
+    """[(mode, show_answer)] from [{"mode", "show_answer"}]. Raises ValueError."""
+    if raw is None:
+        return [('zh', True)]
+    if not isinstance(raw, list) or not raw:
+        raise ValueError('variants must be a non-empty list')
+    variants = []
+    for item in raw:
+        mode = (item or {}).get('mode', 'zh') if isinstance(item, dict) else None
+        if mode not in MODES:
+            raise ValueError(f'mode must be one of {", ".join(MODES)}')
+        variant = (mode, bool(item.get('show_answer', True)))
+        if variant not in variants:
+            variants.append(variant)
+    return variants
+
+
+_UNSAFE_NAME_RE = re.compile(r'[\\/:*?"<>|\s]+')
+
+
+def file_names(snapshots, variants):
+    """Archive name for every (snapshot, variant), unique within the batch."""
+    names = {}
+    taken = set()
+    for snap in snapshots:
+        base = _UNSAFE_NAME_RE.sub('_', snap.name).strip('_') or snap.exam_id
+        for mode, show_answer in variants:
+            name = f"{base}_{mode}{'_答案' if show_answer else ''}.docx"
+            if name in taken:
+                name = f"{base}_{snap.exam_id}_{mode}{'_答案' if show_answer else ''}.docx"
+            taken.add(name)
+            names[(snap.exam_id, mode, show_answer)] = name
+    return names
+
+
+class _ZipStream:
+    """Write-only sink for ZipFile; drain() hands back what was written."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _rendered(tasks, workers):
+    """Yield (name, docx_bytes, error) as documents finish."""
+    if not workers:
+        for name, snap, mode, show_answer in tasks:
+            try:
+                yield name, render_exam_snapshot(snap, mode, show_answer), None
+            except Exception as e:
+                yield name, None, str(e)
+        return
+
+    pool = _get_pool(workers)
+    futures = {pool.submit(render_exam_snapshot, snap, mode, show_answer): name
+               for name, snap, mode, show_answer in tasks}
+    try:
+        for future in as_completed(futures):
+            try:
+                yield futures[future], future.result(), None
+            except Exception as e:
+                yield futures[future], None, str(e)
+    finally:
+        # Client went away: drop documents not yet started
+        for future in futures:
+            future.cancel()
+
+
+def stream_zip(batch, tasks, workers):
+    """Generate the ZIP bytes for tasks [(name, snapshot, mode, show_answer)]."""
+    sink = _ZipStream()
+    try:
+        # .docx files are already deflated; storing them keeps this cheap
+        with zipfile.ZipFile(sink, 'w', zipfile.ZIP_STORED) as zf:
+            for name, data, error in _rendered(tasks, workers):
+                if error is None:
+                    zf.writestr(name, data)
+                    batch.files.append(name)
+                    batch.done += 1
+                else:
+                    batch.errors.append({'file': name, 'error': error})
+                    batch.failed += 1
+                yield sink.drain()
+            zf.writestr('manifest.json', json.dumps(
+                {'files': batch.files, 'errors': batch.errors}, ensure_ascii=False, indent=2))
+        yield sink.drain()
+        batch.status = ('completed' if not batch.failed
+                        else 'partial' if batch.done else 'failed')
+    finally:
+        if not batch.finished:
+            batch.status = 'cancelled'
+        batch.finished_at = datetime.now()
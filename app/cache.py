@@ -0,0 +1,155 @@
+"""cache.py — conditional GET and serialized-response caching for read APIs.
+
+Every committed write through the SQLAlchemy session bumps an in-process
+generation counter for each table it touched:
+
+* ORM unit-of-work changes (add/modify/delete of mapped objects, including
+  many-to-many secondary tables) are collected in ``after_flush``;
+* bulk statements executed via ``Session.execute`` — ``update(Model)``,
+  ``query.update()``/``delete()``, ``exam_questions.insert()`` — are
+  collected in ``do_orm_execute``.
+
+Counters are only bumped in ``after_commit`` (and discarded on rollback), so
+a reader can never cache uncommitted data under a new generation.
+
+``@cached_response(*tables)`` keys an LRU of rendered bodies by request path,
+query string and the current generations of those tables.  A hit skips the
+view entirely; the strong ETag is a digest of the body, so ``If-None-Match``
+gets a 304 without re-sending anything.  Responses carry
+``Cache-Control: no-cache`` so the browser always revalidates.
+
+Counters live in this process: writes made by other processes or by raw SQL
+on a separate connection are not seen.  The app runs as a single process.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, make_response, request
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+DEFAULT_MAX_ENTRIES = 256
+
+_generations = {}
+_gen_lock = threading.Lock()
+
+
+def generation(table_name):
+    return _generations.get(table_name, 0)
+
+
+def bump(*table_names):
+    """Invalidate cached responses that depend on these tables."""
+    with _gen_lock:
+        for name in table_names:
+            _generations[name] = _generations.get(name, 0) + 1
+
+
+def _touched(session):
+    return session.info.setdefault('cache_touched_tables', set())
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_flushed_tables(session, flush_context):
+    touched = _touched(session)
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        mapper = getattr(obj, '__mapper__', None)
+        if mapper is None:
+            continue
+        touched.update(t.name for t in mapper.tables)
+        touched.update(rel.secondary.name for rel in mapper.relationships
+                       if rel.secondary is not None)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _collect_bulk_tables(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        table = getattr(orm_execute_state.statement, 'table', None)
+        if table is not None and getattr(table, 'name', None):
+            _touched(orm_execute_state.session).add(table.name)
+
+
+@event.listens_for(Session, 'after_commit')
+def _bump_committed_tables(session):
+    touched = session.info.pop('cache_touched_tables', None)
+    if touched:
+        bump(*touched)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_rolled_back_tables(session, previous_transaction):
+    session.info.pop('cache_touched_tables', None)
+
+
+class LRUCache:
+    """Thread-safe LRU; the response cache stores (etag, body, mimetype) entries."""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def init_response_cache(app):
+    """Attach a per-app LRU (size from RESPONSE_CACHE_SIZE; 0 disables it)."""
+    size = app.config.get('RESPONSE_CACHE_SIZE', DEFAULT_MAX_ENTRIES)
+    app.extensions['response_cache'] = LRUCache(size) if size else None
+
+
+def cached_response(*tables):
+    """Cache a GET view's 200 responses until one of `tables` is written."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            lru = current_app.extensions.get('response_cache')
+            # Generations are read before the view runs: a write committed
+            # mid-request leaves this entry under the superseded key.
+            key = (request.path, request.query_string,
+                   tuple(generation(t) for t in tables))
+            entry = lru.get(key) if lru is not None else None
+            if entry is None:
+                resp = make_response(view(*args, **kwargs))
+                if resp.status_code != 200 or resp.is_streamed:
+                    return resp
+                body = resp.get_data()
+                entry = (hashlib.blake2b(body, digest_size=16).hexdigest(), body, resp.mimetype)
+                if lru is not None:
+                    lru.put(key, entry)
+
+            etag, body, mimetype = entry
+            if request.if_none_match.contains(etag):
+                resp = current_app.response_class(status=304)
+            else:
+                resp = current_app.response_class(body, mimetype=mimetype)
+            resp.set_etag(etag)
+            resp.headers['Cache-Control'] = 'no-cache'
+            return resp
+        return wrapper
+    return decorator
@@ -1,4 +1,5 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, inspect
 from datetime import datetime
 import json
 import uuid
@@ -9,7 +10,11 @@ db = SQLAlchemy()
 exam_questions = db.Table('exam_questions',
     db.Column('exam_id', db.String(64), db.ForeignKey('exams.exam_id'), primary_key=True),
     db.Column('question_id', db.String(64), db.ForeignKey('questions.question_id'), primary_key=True),
-    db.Column('position', db.Integer)  # Question order within exam
+    db.Column('position', db.Integer),  # Question order within exam
+    # An exam's questions in order, without a sort step
+    db.Index('ix_exam_questions_exam_id_position', 'exam_id', 'position', 'question_id'),
+    # Which exams use a question: deletes, usage marking, FK checks
+    db.Index('ix_exam_questions_question_id', 'question_id'),
 )
 
 
@@ -35,8 +40,17 @@ class QuestionTypeModel(db.Model):
 
 class QuestionModel(db.Model):
     __tablename__ = 'questions'
+    __table_args__ = (
+        # Keyset pagination order for GET /api/questions
+        db.Index('ix_questions_created_at_question_id', 'created_at', 'question_id'),
+        # Exam assembly candidates and the list page's type/usage filters;
+        # also serves question_type alone.
+        db.Index('ix_questions_type_used_subject', 'question_type', 'is_used', 'subject'),
+        # Subject-scoped list page and facets; also serves subject alone.
+        db.Index('ix_questions_subject_type_difficulty', 'subject', 'question_type', 'difficulty'),
+    )
     question_id = db.Column(db.String(64), primary_key=True)
-    question_type = db.Column(db.String(32), nullable=False, index=True)
+    question_type = db.Column(db.String(32), nullable=False)
     content = db.Column(db.Text, nullable=False)
     options = db.Column(db.Text, default='[]')          # JSON string
     answer = db.Column(db.Text)
@@ -44,7 +58,7 @@ class QuestionModel(db.Model):
     explanation = db.Column(db.Text)
     content_en = db.Column(db.Text, nullable=True)
     options_en = db.Column(db.Text, nullable=True)          # JSON string
-    subject = db.Column(db.String(128), nullable=True, index=True)   # 考试科目
+    subject = db.Column(db.String(128), nullable=True)   # 考试科目
     knowledge_point = db.Column(db.String(256), nullable=True)
     tags = db.Column(db.String(512), nullable=True)         # comma-separated
     difficulty = db.Column(db.String(32), nullable=True)    # easy/medium/hard
@@ -54,29 +68,116 @@ class QuestionModel(db.Model):
     used_date = db.Column(db.DateTime)
     created_at = db.Column(db.DateTime)
     updated_at = db.Column(db.DateTime)
+    content_hash = db.Column(db.String(64), nullable=True, index=True)  # see utils.content_hash
+
+    def to_dict(self, fields=None):
+        """Serialize the question; fields limits the output to those keys."""
+        out = {}
+        for field in fields or QUESTION_FIELDS:
+            attr, decode = QUESTION_FIELDS[field]
+            value = getattr(self, attr)
+            out[field] = decode(value) if decode else value
+        return out
+
+    @classmethod
+    def columns_for(cls, fields=None):
+        """Columns to SELECT to serialize the given output fields."""
+        names = dict.fromkeys(QUESTION_FIELDS[f][0] for f in (fields or QUESTION_FIELDS))
+        return [getattr(cls, name) for name in names]
+
+
+def _decode_list(value):
+    return json.loads(value) if value else []
+
+
+def _decode_dict(value):
+    return json.loads(value) if value else {}
+
+
+def _isoformat(value):
+    return value.isoformat() if value else None
 
-    def to_dict(self):
-        return {
-            'question_id': self.question_id,
-            'question_type': self.question_type,
-            'content': self.content,
-            'options': json.loads(self.options) if self.options else [],
-            'answer': self.answer,
-            'reference_answer': self.reference_answer,
-            'explanation': self.explanation,
-            'content_en': self.content_en,
-            'options_en': json.loads(self.options_en) if self.options_en else [],
-            'subject': self.subject,
-            'knowledge_point': self.knowledge_point,
-            'tags': self.tags,
-            'difficulty': self.difficulty,
-            'language': self.language,
-            'metadata': json.loads(self.metadata_json) if self.metadata_json else {},
-            'is_used': self.is_used,
-            'used_date': self.used_date.isoformat() if self.used_date else None,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
-        }
+
+# Output field -> (column attribute, decoder). Drives to_dict() and the
+# ?fields= projection, so JSON columns are only decoded when requested.
+QUESTION_FIELDS = {
+    'question_id': ('question_id', None),
+    'question_type': ('question_type', None),
+    'content': ('content', None),
+    'options': ('options', _decode_list),
+    'answer': ('answer', None),
+    'reference_answer': ('reference_answer', None),
+    'explanation': ('explanation', None),
+    'content_en': ('content_en', None),
+    'options_en': ('options_en', _decode_list),
+    'subject': ('subject', None),
+    'knowledge_point': ('knowledge_point', None),
+    'tags': ('tags', None),
+    'difficulty': ('difficulty', None),
+    'language': ('language', None),
+    'metadata': ('metadata_json', _decode_dict),
+    'is_used': ('is_used', None),
+    'used_date': ('used_date', _isoformat),
+    'created_at': ('created_at', _isoformat),
+    'updated_at': ('updated_at', _isoformat),
+}
+
+
+def question_serializer(fields=None):
+    """Return fn(row) -> dict for Rows selected with columns_for(fields).
+
+    Extra columns appended after those (e.g. a cursor key) are ignored.
+    Positional access keeps this well ahead of to_dict() on large pages.
+    """
+    fields = list(fields or QUESTION_FIELDS)
+    names = list(dict.fromkeys(QUESTION_FIELDS[f][0] for f in fields))
+    plan = [(f, names.index(QUESTION_FIELDS[f][0]), QUESTION_FIELDS[f][1]) for f in fields]
+
+    def serialize(row):
+        return {f: decode(row[i]) if decode else row[i] for f, i, decode in plan}
+    return serialize
+
+
+@event.listens_for(QuestionModel, 'before_insert')
+@event.listens_for(QuestionModel, 'before_update')
+def _set_content_hash(mapper, connection, target):
+    """Keep content_hash in step with content on every ORM insert/update.
+
+    An insert keeps a hash the caller computed (imports hash figures that
+    are not stored yet); an update recomputes it when content changed.
+    """
+    state = inspect(target)
+    if target.content_hash is None or (state.persistent and state.attrs.content.history.has_changes()):
+        from app.utils import content_hash, image_identities
+        images = image_identities(connection, [target.content])
+        target.content_hash = content_hash(target.content, images)
+
+
+@event.listens_for(QuestionModel, 'before_insert')
+@event.listens_for(QuestionModel, 'before_update')
+def _strip_question_type(mapper, connection, target):
+    """Store question_type trimmed so lookups can use a plain indexed equality."""
+    if target.question_type:
+        target.question_type = target.question_type.strip()
+
+
+class QuestionSignatureModel(db.Model):
+    """MinHash signature of a question's normalized content (see app/near_dup.py).
+
+    Derived data: no FK, rows are rebuilt from questions.content at any time.
+    """
+    __tablename__ = 'question_signatures'
+    question_id = db.Column(db.String(64), primary_key=True)
+    signature = db.Column(db.LargeBinary, nullable=False)   # packed uint64 bins
+
+
+# LSH band buckets: one row per (question, band); questions sharing a bucket
+# are near-duplicate candidates.
+question_lsh_buckets = db.Table('question_lsh_buckets',
+    db.Column('question_id', db.String(64), primary_key=True),
+    db.Column('band', db.Integer, primary_key=True),
+    db.Column('bucket', db.BigInteger, nullable=False, index=True),
+)
 
 
 class CourseSettingsModel(db.Model):
@@ -109,9 +210,27 @@ class CourseSettingsModel(db.Model):
         }
 
 
+class ImageBlobModel(db.Model):
+    """One stored image file, addressed by the SHA-256 of its bytes.
+
+    question_images rows are aliases of a blob; ref_count is how many of
+    them point at it.  See the image store in app/utils.py.
+    """
+    __tablename__ = 'image_blobs'
+    sha256       = db.Column(db.String(64), primary_key=True)
+    filename     = db.Column(db.String(256), nullable=False)   # path under uploads/images/
+    content_type = db.Column(db.String(64), default='image/png')
+    file_size    = db.Column(db.Integer)
+    ref_count    = db.Column(db.Integer, nullable=False, default=0)
+    created_at   = db.Column(db.DateTime, default=datetime.now)
+
+
 class QuestionImageModel(db.Model):
     """Stores metadata for images embedded in question fields (content/reference_answer/explanation).
-    Actual image bytes are stored on disk in uploads/images/.
+    Actual image bytes are stored on disk in uploads/images/, once per distinct
+    content (ImageBlobModel); each row is an image_id alias of its blob.
+    Rows from before the content-addressed store have no sha256 and own
+    their file directly.
     """
     __tablename__ = 'question_images'
     id           = db.Column(db.Integer, primary_key=True, autoincrement=True)
@@ -120,7 +239,9 @@ class QuestionImageModel(db.Model):
     question_id  = db.Column(db.String(64), db.ForeignKey('questions.question_id'),
                              nullable=True, index=True)
     field        = db.Column(db.String(32))          # 'content' | 'reference_answer' | 'explanation'
-    filename     = db.Column(db.String(256), nullable=False)   # basename on disk
+    sha256       = db.Column(db.String(64), db.ForeignKey('image_blobs.sha256'),
+                             nullable=True, index=True)
+    filename     = db.Column(db.String(256), nullable=False)   # path under uploads/images/
     original_name = db.Column(db.String(256))
     content_type = db.Column(db.String(64), default='image/png')
     file_size    = db.Column(db.Integer)
@@ -139,6 +260,10 @@ class QuestionImageModel(db.Model):
 
 class ExamModel(db.Model):
     __tablename__ = 'exams'
+    __table_args__ = (
+        # Newest-first exam list
+        db.Index('ix_exams_created_at_exam_id', 'created_at', 'exam_id'),
+    )
     exam_id = db.Column(db.String(64), primary_key=True)
     name = db.Column(db.String(256), nullable=False)
     config = db.Column(db.Text, default='{}')    # JSON string
@@ -176,6 +301,67 @@ class ExamModel(db.Model):
             'updated_at': self.updated_at.isoformat() if self.updated_at else None,
         }
 
+    def to_summary_dict(self, type_counts=None, questions=None):
+        """Exam header plus per-type question counts and total score.
+
+        type_counts comes from ExamModel.type_counts_for(); questions (optional,
+        already ordered) from ExamModel.questions_for(). Neither triggers a query.
+        """
+        config = json.loads(self.config) if self.config else {}
+        type_counts = type_counts or {}
+        total_score = sum(
+            n * config.get(q_type, {}).get('points', 0)
+            for q_type, n in type_counts.items()
+        )
+        data = {
+            'exam_id': self.exam_id,
+            'name': self.name,
+            'config': config,
+            'subject': self.subject or '',
+            'is_confirmed': self.is_confirmed or False,
+            'confirmed_at': self.confirmed_at.isoformat() if self.confirmed_at else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+            'question_count': sum(type_counts.values()),
+            'type_counts': type_counts,
+            'total_score': total_score,
+        }
+        if questions is not None:
+            data['questions'] = [q.to_dict() for q in questions]
+        return data
+
+    @staticmethod
+    def type_counts_for(exam_ids):
+        """Return {exam_id: {question_type: count}} in a single grouped query."""
+        counts = {}
+        if not exam_ids:
+            return counts
+        rows = db.session.query(
+            exam_questions.c.exam_id, QuestionModel.question_type, db.func.count()
+        ).join(
+            QuestionModel, QuestionModel.question_id == exam_questions.c.question_id
+        ).filter(
+            exam_questions.c.exam_id.in_(exam_ids)
+        ).group_by(exam_questions.c.exam_id, QuestionModel.question_type).all()
+        for exam_id, q_type, n in rows:
+            counts.setdefault(exam_id, {})[q_type] = n
+        return counts
+
+    @staticmethod
+    def questions_for(exam_ids):
+        """Return {exam_id: [QuestionModel, ...]} ordered by position, in one query."""
+        grouped = {}
+        if not exam_ids:
+            return grouped
+        rows = db.session.query(exam_questions.c.exam_id, QuestionModel).join(
+            QuestionModel, QuestionModel.question_id == exam_questions.c.question_id
+        ).filter(
+            exam_questions.c.exam_id.in_(exam_ids)
+        ).order_by(exam_questions.c.exam_id, exam_questions.c.position).all()
+        for exam_id, question in rows:
+            grouped.setdefault(exam_id, []).append(question)
+        return grouped
+
     def get_ordered_questions(self):
         """Get questions ordered by position."""
         return db.session.query(QuestionModel).join(
@@ -1,22 +1,36 @@
 """docx_importer.py — Rich-content Word document importer.
 
 Replaces word_to_csv_converter.py for .docx files.
-Iterates doc.element.body directly to capture:
+Iterates the body's paragraphs and tables directly to capture:
   - Inline images (<w:drawing> elements)
   - Tables (<w:tbl> elements)
   - Soft line-break–separated logical lines within a single <w:p>
 
-Returns a list of question dicts compatible with the existing import route.
+Two entry points produce the same question dicts for the import route:
+parse_docx_with_rich_content() loads the document through python-docx and
+returns a list; iter_docx_questions() streams word/document.xml out of the
+zip with lxml iterparse, yields each question as soon as the next marker
+ends it and discards the XML it came from, so memory stays flat however
+long the bank is.
 """
+import posixpath
 import re
+import zipfile
+
 from docx import Document
 from docx.oxml.ns import qn
-from docx.text.paragraph import Paragraph as DocxParagraph
+from lxml import etree
 
 # XML namespace for DrawingML blip (image reference)
 _A_BLIP = '{http://schemas.openxmlformats.org/drawingml/2006/main}blip'
 _R_EMBED = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}embed'
 
+# Package-level XML (OPC) used by the streaming reader
+_PKG_REL = '{http://schemas.openxmlformats.org/package/2006/relationships}Relationship'
+_CT_DEFAULT = '{http://schemas.openxmlformats.org/package/2006/content-types}Default'
+_CT_OVERRIDE = '{http://schemas.openxmlformats.org/package/2006/content-types}Override'
+_OFFICE_DOCUMENT = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument'
+
 
 def _local_tag(element):
     tag = element.tag
@@ -48,26 +62,28 @@ def _para_logical_lines(p_element):
     return lines
 
 
-def _extract_images(p_element, doc, save_image_fn):
-    """Return an HTML string of <img> tags for every inline image in the paragraph."""
-    parts = []
+def _extract_images(p_element, load_image, save_image_fn):
+    """Save every inline image in the paragraph; returns their image IDs.
+
+    load_image(r_id) -> (bytes, content_type), or None for an unknown rId.
+    """
+    image_ids = []
     for drawing in p_element.iter(qn('w:drawing')):
         for blip in drawing.iter(_A_BLIP):
             r_id = blip.get(_R_EMBED)
-            if r_id and r_id in doc.part.rels:
-                try:
-                    img_part = doc.part.related_parts[r_id]
-                    image_id = save_image_fn(
-                        img_part.blob,
-                        img_part.content_type or 'image/png',
-                    )
-                    parts.append(
-                        f'<img src="/api/images/{image_id}" '
-                        f'style="max-width:100%;display:block;" />'
-                    )
-                except Exception:
-                    pass
-    return '\n'.join(parts)
+            if not r_id:
+                continue
+            try:
+                image = load_image(r_id)
+                if image is not None:
+                    image_ids.append(save_image_fn(*image))
+            except Exception:
+                pass
+    return image_ids
+
+
+def _img_html(image_id):
+    return f'<img src="/api/images/{image_id}" style="max-width:100%;display:block;" />'
 
 
 def _tbl_to_html(tbl_element):
@@ -147,88 +163,79 @@ def _new_question(q_type, answer):
         'answer': answer,
         'reference_answer': '',
         'explanation': '',
+        'images': [],
     }
 
 
-def parse_docx_with_rich_content(filepath: str, save_image_fn, known_types=None) -> list:
-    """Parse a .docx file and return a list of question dicts with HTML content.
-
-    Args:
-        filepath: Path to the .docx file.
-        save_image_fn: callable(image_bytes: bytes, content_type: str) -> image_id: str
-            Called for each embedded image; should persist the image and return its ID.
-        known_types: Optional set/list of valid question type names for validation.
-                     If None, falls back to a Chinese-character heuristic.
+class _QuestionReader:
+    """Turns body-level <w:p>/<w:tbl> elements, in order, into question dicts.
 
-    Returns:
-        List of dicts with keys: type, content, options, options_en, content_en,
-        knowledge_point, tags, difficulty, answer, reference_answer, explanation.
-        'content' (and reference_answer/explanation) may contain HTML with
-        <img src="/api/images/..."> and <table>...</table> elements.
+    feed() returns the previous question when a type marker starts a new
+    one; finish() returns the last.  Only strings are kept between calls,
+    so callers may discard each element once it has been fed.
     """
-    doc = Document(filepath)
-    body = doc.element.body
-
-    questions = []
-    current_q = None
-    current_field = None   # 'content' | 'reference_answer' | 'explanation' | None
-    field_parts = []       # accumulates HTML fragments for current_field
 
-    def flush_field():
-        nonlocal field_parts
-        if current_q is None or current_field is None:
-            field_parts = []
-            return
-        text = '\n'.join(p for p in field_parts if p).strip()
-        current_q[current_field] = text
-        field_parts = []
-
-    def finalize_question():
-        if current_q is None:
-            return
-        flush_field()
-        questions.append(dict(current_q))
-
-    def process_text_line(line: str):
+    def __init__(self, load_image, save_image_fn, known_types=None):
+        self.load_image = load_image
+        self.save_image_fn = save_image_fn
+        self.known_types = known_types
+        self.current_q = None
+        self.current_field = None   # 'content' | 'reference_answer' | 'explanation' | None
+        self.field_parts = []       # accumulates HTML fragments for current_field
+
+    def flush_field(self):
+        if self.current_q is not None and self.current_field is not None:
+            text = '\n'.join(p for p in self.field_parts if p).strip()
+            self.current_q[self.current_field] = text
+        self.field_parts = []
+
+    def finish(self):
+        """Finalize and return the question being read, if any."""
+        if self.current_q is None:
+            return None
+        self.flush_field()
+        question, self.current_q = dict(self.current_q), None
+        return question
+
+    def process_text_line(self, line: str):
         """Handle one logical text line in the context of the current field."""
-        nonlocal current_field, field_parts
-
         line = line.strip()
         if not line:
             return
 
         # ── Section markers ────────────────────────────────────────────────
         if line.startswith('<参考答案>'):
-            flush_field()
-            current_field = 'reference_answer'
+            self.flush_field()
+            self.current_field = 'reference_answer'
             inline = line[len('<参考答案>'):].strip()
             if inline and not inline.startswith('</'):
-                field_parts.append(inline)
+                self.field_parts.append(inline)
             return
 
         if line.startswith('</参考答案>'):
-            flush_field()
-            current_field = None
+            self.flush_field()
+            self.current_field = None
             return
 
         if line.startswith('<解析>'):
-            flush_field()
-            current_field = 'explanation'
+            self.flush_field()
+            self.current_field = 'explanation'
             inline = line[len('<解析>'):].strip()
             if inline and not inline.startswith('</'):
-                field_parts.append(inline)
+                self.field_parts.append(inline)
             return
 
         if line.startswith('</解析>'):
-            flush_field()
-            current_field = None
+            self.flush_field()
+            self.current_field = None
             return
 
         # ── Field-specific handling ────────────────────────────────────────
-        if current_field == 'reference_answer':
-            field_parts.append(line)
+        current_q = self.current_q
+        if self.current_field == 'reference_answer':
+            self.field_parts.append(line)
 
-        elif current_field == 'explanation':
+        elif self.current_field == 'explanation':
             if re.match(r'^知识点[:：]', line):
                 current_q['knowledge_point'] = re.sub(r'^知识点[:：]\s*', '', line)
             elif re.match(r'^标签[:：]', line):
@@ -238,9 +245,9 @@ def parse_docx_with_rich_content(filepath: str, save_image_fn, known_types=None)
             elif re.match(r'^难度[:：]', line):
                 current_q['difficulty'] = re.sub(r'^难度[:：]\s*', '', line)
             else:
-                field_parts.append(line)
+                self.field_parts.append(line)
 
-        elif current_field == 'content':
+        elif self.current_field == 'content':
             # English option: [A_en] text
             if re.match(r'^\[[A-Z]_en\]', line):
                 current_q['options_en'].append(
@@ -250,53 +257,180 @@ def parse_docx_with_rich_content(filepath: str, save_image_fn, known_types=None)
             elif re.match(r'^\[([A-Z])\]', line) and len(line) >= 3:
                 current_q['options'].append(line[3:].strip())
             else:
-                field_parts.append(line)
+                self.field_parts.append(line)
 
-    # ── Main body iteration ───────────────────────────────────────────────
-    for child in body:
-        tag = _local_tag(child)
-
-        if tag == 'sectPr':
-            continue
+    def feed(self, element):
+        """Read one body child; returns a question it completed, else None."""
+        tag = _local_tag(element)
+        finished = None
 
         if tag == 'p':
-            # Wrap with DocxParagraph to access .text cleanly
-            para = DocxParagraph(child, doc)
-            logical_lines = _para_logical_lines(child)
+            logical_lines = _para_logical_lines(element)
             first_line = logical_lines[0].strip() if logical_lines else ''
 
-            q_type, answer, is_marker = _parse_question_marker(first_line, known_types)
+            q_type, answer, is_marker = _parse_question_marker(first_line, self.known_types)
 
             if is_marker:
                 # Finalize previous question before starting a new one
-                if current_q is not None:
-                    finalize_question()
-                current_q = _new_question(q_type, answer)
-                current_field = 'content'
-                field_parts = []
+                finished = self.finish()
+                self.current_q = _new_question(q_type, answer)
+                self.current_field = 'content'
+                self.field_parts = []
                 # Process any lines that follow the type marker in this paragraph
                 for line in logical_lines[1:]:
-                    process_text_line(line)
-
-            elif current_q is not None:
-                # Extract any embedded images in this paragraph
-                images_html = _extract_images(child, doc, save_image_fn)
+                    self.process_text_line(line)
 
+            elif self.current_q is not None:
                 # Process text lines
                 for line in logical_lines:
-                    process_text_line(line)
+                    self.process_text_line(line)
 
-                # Append image HTML after text (preserve document order)
-                if images_html and current_field == 'content':
-                    field_parts.append(images_html)
+                # Append image HTML after text (preserve document order).
+                # Only the question body shows images, so others are not saved.
+                if self.current_field == 'content':
+                    image_ids = _extract_images(element, self.load_image, self.save_image_fn)
+                    if image_ids:
+                        self.current_q['images'] += image_ids
+                        self.field_parts.append('\n'.join(map(_img_html, image_ids)))
 
-        elif tag == 'tbl' and current_q is not None:
+        elif tag == 'tbl' and self.current_q is not None:
             # Embed table as HTML in the current field (usually 'content')
-            if current_field == 'content':
-                field_parts.append(_tbl_to_html(child))
+            if self.current_field == 'content':
+                self.field_parts.append(_tbl_to_html(element))
+
+        return finished
+
+
+def parse_docx_with_rich_content(filepath: str, save_image_fn, known_types=None) -> list:
+    """Parse a .docx file and return a list of question dicts with HTML content.
 
-    # Finalize the last question
-    if current_q is not None:
-        finalize_question()
+    Args:
+        filepath: Path to the .docx file.
+        save_image_fn: callable(image_bytes: bytes, content_type: str) -> image_id: str
+            Called for each embedded image; should persist the image and return its ID.
+        known_types: Optional set/list of valid question type names for validation.
+                     If None, falls back to a Chinese-character heuristic.
 
+    Returns:
+        List of dicts with keys: type, content, options, options_en, content_en,
+        knowledge_point, tags, difficulty, answer, reference_answer, explanation,
+        images.  'content' may contain HTML with <img src="/api/images/...">
+        and <table>...</table> elements; 'images' lists the IDs of those
+        images, in order.
+    """
+    doc = Document(filepath)
+
+    def load_image(r_id):
+        if r_id not in doc.part.rels:
+            return None
+        img_part = doc.part.related_parts[r_id]
+        return img_part.blob, img_part.content_type or 'image/png'
+
+    reader = _QuestionReader(load_image, save_image_fn, known_types)
+    questions = [q for q in map(reader.feed, doc.element.body) if q is not None]
+    last = reader.finish()
+    if last is not None:
+        questions.append(last)
     return questions
+
+
+# ── Streaming reader ──────────────────────────────────────────────────────
+
+def _rels_name(part_name):
+    """Zip member holding the relationships of part_name ('' for the package)."""
+    folder, name = posixpath.split(part_name)
+    return posixpath.join(folder, '_rels', name + '.rels')
+
+
+def _read_rels(zf, part_name):
+    """{rId: zip member name} for part_name's internal relationships."""
+    try:
+        root = etree.fromstring(zf.read(_rels_name(part_name)))
+    except KeyError:
+        return {}
+    folder = posixpath.dirname(part_name)
+    rels = {}
+    for rel in root.iter(_PKG_REL):
+        if rel.get('TargetMode') == 'External':
+            continue
+        target = rel.get('Target', '')
+        if target.startswith('/'):
+            rels[rel.get('Id')] = posixpath.normpath(target.lstrip('/'))
+        else:
+            rels[rel.get('Id')] = posixpath.normpath(posixpath.join(folder, target))
+    return rels
+
+
+class _LazyParts:
+    """Image lookups against a .docx zip, reading rels and content types on first use."""
+
+    def __init__(self, zf, part_name):
+        self.zf = zf
+        self.part_name = part_name
+        self._rels = None
+        self._types = None
+
+    def _content_type(self, member):
+        if self._types is None:
+            root = etree.fromstring(self.zf.read('[Content_Types].xml'))
+            self._types = {
+                'defaults': {el.get('Extension', '').lower(): el.get('ContentType')
+                             for el in root.iter(_CT_DEFAULT)},
+                'overrides': {el.get('PartName', '').lstrip('/'): el.get('ContentType')
+                              for el in root.iter(_CT_OVERRIDE)},
+            }
+        ext = posixpath.splitext(member)[1].lstrip('.').lower()
+        return self._types['overrides'].get(member) or self._types['defaults'].get(ext)
+
+    def load_image(self, r_id):
+        if self._rels is None:
+            self._rels = _read_rels(self.zf, self.part_name)
+        member = self._rels.get(r_id)
+        if member is None:
+            return None
+        return self.zf.read(member), self._content_type(member) or 'image/png'
+
+
+def _main_part_name(zf):
+    """Zip member of the main document part, normally word/document.xml."""
+    try:
+        root = etree.fromstring(zf.read(_rels_name('')))
+    except KeyError:
+        return 'word/document.xml'
+    for rel in root.iter(_PKG_REL):
+        if rel.get('Type') == _OFFICE_DOCUMENT:
+            return posixpath.normpath(rel.get('Target', '').lstrip('/'))
+    return 'word/document.xml'
+
+
+def iter_docx_questions(filepath: str, save_image_fn, known_types=None):
+    """Stream question dicts out of a .docx without loading the whole document.
+
+    Same arguments and dicts as parse_docx_with_rich_content(), but a
+    generator: each question is yielded once the next type marker (or the
+    end of the body) completes it.  Body paragraphs and tables are cleared
+    from the tree as soon as they have been read, and images are read from
+    the zip only when a paragraph references them, so save_image_fn runs
+    as parsing reaches each image.
+    """
+    body_tag = qn('w:body')
+    with zipfile.ZipFile(filepath) as zf:
+        part_name = _main_part_name(zf)
+        parts = _LazyParts(zf, part_name)
+        reader = _QuestionReader(parts.load_image, save_image_fn, known_types)
+        with zf.open(part_name) as xml:
+            for _, element in etree.iterparse(xml, events=('end',), tag=(qn('w:p'), qn('w:tbl')),
+                                              resolve_entities=False, remove_comments=True):
+                parent = element.getparent()
+                if parent is None or parent.tag != body_tag:
+                    continue   # nested in a table cell or text box; read with its container
+                question = reader.feed(element)
+                # Drop this element and everything before it in the body
+                element.clear()
+                while element.getprevious() is not None:
+                    del parent[0]
+                if question is not None:
+                    yield question
+        last = reader.finish()
+        if last is not None:
+            yield last
@@ -1,6 +1,12 @@
 from flask import Flask
 from app.routes import bp
 from app.db_models import db, QuestionTypeModel
+from app.search import ensure_fts_index
+from app.near_dup import backfill_signatures
+from app.cache import init_response_cache
+from app.engine import configure_app_database, install_sqlite_pragmas
+from app.migrations import run_migrations
+from app import image_gc
 from config import config
 from datetime import datetime
 from sqlalchemy import text
@@ -24,14 +30,22 @@ def create_app(config_name=None):
     os.makedirs(os.path.join(upload_folder, 'images'), exist_ok=True)
 
     # Initialize database
+    configure_app_database(app)
     db.init_app(app)
+    init_response_cache(app)
     with app.app_context():
+        if app.config.get('SQLITE_TUNING', True):
+            install_sqlite_pragmas(db.engine)
         db.create_all()
         _migrate_db()
+        run_migrations(db.engine)
+        ensure_fts_index(app)
+        backfill_signatures()
         _seed_question_types()
 
     # Register core blueprint
     app.register_blueprint(bp)
+    image_gc.start_scheduler(app)
 
     # Register optional AI/KG blueprints (may be absent in bundled builds)
     try:
@@ -50,7 +64,10 @@ def create_app(config_name=None):
 
 
 def _migrate_db():
-    """Add new columns to existing tables if they don't exist (idempotent)."""
+    """Add columns from before versioned migrations (idempotent).
+
+    Newer schema changes are numbered migrations in app/migrations.py.
+    """
     new_cols = [
         ('exams', 'subject', 'VARCHAR(128)'),
         ('exams', 'is_confirmed', 'BOOLEAN DEFAULT 0'),
@@ -62,7 +79,7 @@ def _migrate_db():
                 conn.execute(text(f'ALTER TABLE {table} ADD COLUMN {col} {col_def}'))
                 conn.commit()
             except Exception:
-                pass  # Column already exists
+                conn.rollback()  # Column already exists (Postgres needs the rollback)
 
 
 def _seed_question_types():
@@ -0,0 +1,158 @@
+"""image_derivatives.py — downscaled variants of stored images.
+
+Uploaded and imported images are stored at full resolution.  Each one also
+gets derivatives, generated in a background thread pool as soon as its
+file is first written:
+
+    thumb  320 px bounding box, for list rows and pickers
+    print  1050 px wide (3.5 in at 300 dpi, the width export embeds images at)
+    webp   WebP, 1600 px bounding box, for the browser
+
+A derivative is a pure function of the original's bytes, so it needs no
+database row: it sits next to its original as <name>.<variant><ext> and
+either exists or not, and is removed together with the original (see the
+image store in app/utils.py).  GET /api/images/<id>?size=<variant> serves
+it, falling back to the original (and queueing generation) while it is
+missing.  Images already within a variant's bounds get a hard link to the
+original instead of a re-encode.
+
+Generation needs Pillow, an optional dependency; without it no derivatives
+are made and every size serves the original.
+"""
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from PIL import Image
+except ImportError:  # optional; originals are served and embedded without it
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+Variant = namedtuple('Variant', 'max_size format')
+
+VARIANTS = {
+    'thumb': Variant((320, 320), None),
+    'print': Variant((1050, 100000), None),
+    'webp': Variant((1600, 1600), 'WEBP'),
+}
+PRINT_DPI = 300
+DEFAULT_WORKERS = 2
+
+_FORMAT_EXTENSIONS = {'JPEG': '.jpg', 'PNG': '.png', 'WEBP': '.webp'}
+_EXTENSION_TYPES = {'.jpg': 'image/jpeg', '.png': 'image/png', '.webp': 'image/webp'}
+
+_executor = None
+_executor_lock = threading.Lock()
+_pending = {}           # original path -> Future
+_failed = set()         # originals Pillow could not process; not retried
+_state_lock = threading.Lock()
+
+
+def available():
+    return Image is not None
+
+
+def _output_format(variant, path):
+    if variant.format:
+        return variant.format
+    return 'JPEG' if os.path.splitext(path)[1].lower() in ('.jpg', '.jpeg') else 'PNG'
+
+
+def derivative_path(path, name):
+    """Where variant name of the original at path is stored."""
+    root = os.path.splitext(path)[0]
+    return f'{root}.{name}{_FORMAT_EXTENSIONS[_output_format(VARIANTS[name], path)]}'
+
+
+def content_type(path):
+    return _EXTENSION_TYPES[os.path.splitext(path)[1]]
+
+
+def remove_derivatives(path):
+    for name in VARIANTS:
+        try:
+            os.remove(derivative_path(path, name))
+        except OSError:
+            pass
+
+
+def _link_or_copy(source, target):
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copyfile(source, target)
+
+
+def _render(source, name, target):
+    variant = VARIANTS[name]
+    fmt = _output_format(variant, source)
+    with Image.open(source) as im:
+        width, height = variant.max_size
+        if im.width <= width and im.height <= height and im.format == fmt:
+            _link_or_copy(source, target)
+            return
+        if fmt == 'JPEG' and im.mode not in ('RGB', 'L'):
+            im = im.convert('RGB')
+        elif im.mode == 'P':
+            im = im.convert('RGBA')  # resample colours, not palette indices
+        im.thumbnail(variant.max_size, Image.LANCZOS)
+        options = {'quality': 85} if fmt in ('JPEG', 'WEBP') else {'optimize': True}
+        if name == 'print':
+            options['dpi'] = (PRINT_DPI, PRINT_DPI)
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(target), suffix='.part',
+                                         delete=False) as f:
+            im.save(f, fmt, **options)
+    os.replace(f.name, target)
+
+
+def generate(path):
+    """Create every missing derivative of the original at path."""
+    try:
+        for name in VARIANTS:
+            target = derivative_path(path, name)
+            if not os.path.exists(target):
+                _render(path, name, target)
+    except Exception:
+        logger.warning('image derivatives failed for %s', path, exc_info=True)
+        with _state_lock:
+            _failed.add(path)
+    finally:
+        with _state_lock:
+            _pending.pop(path, None)
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            workers = DEFAULT_WORKERS
+            try:
+                from flask import current_app
+                workers = current_app.config.get('IMAGE_DERIVATIVE_WORKERS', workers)
+            except RuntimeError:  # outside an app context (migrations, scripts)
+                pass
+            _executor = ThreadPoolExecutor(max_workers=workers,
+                                           thread_name_prefix='image-derivatives')
+        return _executor
+
+
+def schedule(path):
+    """Queue derivative generation for the original at path.
+
+    Returns the Future, or None when there is nothing to do.
+    """
+    if Image is None:
+        return None
+    with _state_lock:
+        if path in _failed:
+            return None
+        future = _pending.get(path)
+        if future is None or future.done():
+            future = _pending[path] = _get_executor().submit(generate, path)
+    return future
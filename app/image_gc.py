@@ -0,0 +1,131 @@
+"""image_gc.py — remove images no question uses.
+
+Editor uploads are stored before their question is saved, with
+question_id NULL; closing the editor without saving leaves them behind.
+collect() finds question_images rows that no existing question owns and
+that are older than a grace period, with one anti-join query per batch,
+and deletes each batch through the image store (which drops unreferenced
+blobs and their files).  It then sweeps files in the store that no blob
+row names, e.g. left by a transaction that rolled back after writing.
+
+Runs on demand (POST /api/images/gc) and, when IMAGE_GC_INTERVAL_HOURS is
+set, every that many hours on a daemon thread.  The grace period
+(IMAGE_GC_GRACE_HOURS, at least MIN_GRACE) keeps images of questions
+still being edited or imported.  Uploads and imports that reuse a store
+file touch its mtime, and the sweep checks for a blob row again right
+before each unlink, so a file an in-flight save just reused survives.
+"""
+import logging
+import os
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+
+from app.db_models import db, ImageBlobModel, QuestionImageModel, QuestionModel
+from app.utils import delete_image_records, image_path
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_GRACE = timedelta(hours=24)
+MIN_GRACE = timedelta(hours=1)
+BATCH_SIZE = 500
+
+# <aa>/<sha256>[.<variant>]<ext>
+_STORE_FILE_RE = re.compile(r'^([0-9a-f]{64})(?:\.[a-z]+)?\.[a-z]+$')
+
+_run_lock = threading.Lock()
+
+
+def orphan_query(cutoff, limit):
+    """Rows of question_images that no existing question owns, older than cutoff."""
+    images = QuestionImageModel.__table__
+    questions = QuestionModel.__table__
+    return (db.select(images.c.id, images.c.image_id, images.c.sha256, images.c.filename)
+            .select_from(images.outerjoin(questions, questions.c.question_id == images.c.question_id))
+            .where(questions.c.question_id.is_(None), images.c.created_at < cutoff)
+            .order_by(images.c.id)
+            .limit(limit))
+
+
+def _sweep_files(cutoff):
+    """Delete store files older than cutoff that no image_blobs row names,
+    and abandoned .part temp files."""
+    root = image_path('')
+    if not os.path.isdir(root):
+        return 0
+    known = {filename.split('/')[-1].split('.')[0]
+             for (filename,) in db.session.execute(db.select(ImageBlobModel.filename))}
+    candidates = [os.path.join(root, name) for name in os.listdir(root) if name.endswith('.part')]
+    for prefix in os.listdir(root):
+        folder = os.path.join(root, prefix)
+        if len(prefix) != 2 or not os.path.isdir(folder):
+            continue
+        for name in os.listdir(folder):
+            match = _STORE_FILE_RE.match(name)
+            if name.endswith('.part') or (match and match.group(1) not in known):
+                candidates.append(os.path.join(folder, name))
+
+    removed = 0
+    cutoff_ts = cutoff.timestamp()
+    for path in candidates:
+        try:
+            if os.path.getmtime(path) >= cutoff_ts or _tracked(path):
+                continue
+            os.remove(path)
+            removed += 1
+        except OSError:
+            pass
+    return removed
+
+
+def _tracked(path):
+    """Whether a blob row names path's content now (it may have been
+    recorded since the sweep listed the known blobs)."""
+    match = _STORE_FILE_RE.match(os.path.basename(path))
+    if not match:
+        return False
+    return db.session.execute(db.select(ImageBlobModel.sha256).where(
+        ImageBlobModel.sha256 == match.group(1))).first() is not None
+
+
+def collect(grace=DEFAULT_GRACE, batch_size=BATCH_SIZE, now=None):
+    """Delete orphaned images older than grace (at least MIN_GRACE); returns counts.
+
+    Commits after every batch.  Concurrent calls are serialized.
+    """
+    cutoff = (now or datetime.now()) - max(grace, MIN_GRACE)
+    result = {'images': 0, 'blobs': 0, 'files': 0}
+    with _run_lock:
+        while True:
+            rows = db.session.execute(orphan_query(cutoff, batch_size)).all()
+            if not rows:
+                break
+            result['blobs'] += delete_image_records(rows)
+            db.session.commit()
+            result['images'] += len(rows)
+            if len(rows) < batch_size:
+                break
+        result['files'] = _sweep_files(cutoff)
+    return result
+
+
+def start_scheduler(app):
+    """Run collect() every IMAGE_GC_INTERVAL_HOURS on a daemon thread."""
+    interval = app.config.get('IMAGE_GC_INTERVAL_HOURS') or 0
+    if interval <= 0:
+        return None
+    grace = timedelta(hours=app.config.get('IMAGE_GC_GRACE_HOURS', 24))
+
+    def run():
+        while True:
+            time.sleep(interval * 3600)
+            try:
+                with app.app_context():
+                    logger.info('image gc: %s', collect(grace))
+            except Exception:
+                logger.exception('image gc failed')
+
+    thread = threading.Thread(target=run, name='image-gc', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,166 @@
+"""import_jobs.py — background question-import jobs with progress.
+
+POST /api/questions/import with ``async=1`` saves the upload, registers an
+ImportJob and returns its ID straight away.  A small thread pool
+(IMPORT_JOB_WORKERS, default 2) runs the job: questions are inserted
+IMPORT_BATCH_SIZE at a time as the file is parsed (a .docx is streamed, so
+the first batch commits while the rest is still being read), each batch in
+its own transaction together with its images.  A failing batch is rolled
+back and counted as failed; batches already committed stay in the bank and
+later batches still run.
+
+Progress counters (parsed, inserted, skipped as duplicate, failed) are
+updated after every batch and can be polled (GET /api/import-jobs/<id>) or
+streamed as Server-Sent Events (GET /api/import-jobs/<id>/events).
+
+Jobs live in this process, like the response-cache generations: a restart
+forgets them, and only the most recent MAX_FINISHED_JOBS finished jobs are
+kept.
+"""
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+DEFAULT_WORKERS = 2
+DEFAULT_BATCH_SIZE = 200
+MAX_FINISHED_JOBS = 50
+
+_jobs = OrderedDict()
+_jobs_lock = threading.Lock()
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class ImportJob:
+    """Status and counters of one background import."""
+
+    FINISHED = ('completed', 'partial', 'failed')
+
+    def __init__(self, filename):
+        self.job_id = 'job_' + uuid.uuid4().hex[:12]
+        self.filename = filename
+        self.status = 'queued'
+        self.total = None          # questions in the file, once parsing has finished
+        self.parsed = 0
+        self.inserted = 0
+        self.skipped = 0           # exact duplicates + skipped near duplicates
+        self.failed = 0
+        self.batches_committed = 0
+        self.batches_failed = 0
+        self.duplicates = []
+        self.near_duplicates = []
+        self.errors = []
+        self.created_at = datetime.now()
+        self.finished_at = None
+        self.version = 0           # bumped on every change, for event streams
+        self._changed = threading.Condition()
+
+    @property
+    def finished(self):
+        return self.status in self.FINISHED
+
+    def update(self, extend=None, **changes):
+        """Apply counter/status changes, append extend ({list field: items})
+        and wake any event-stream readers.
+
+        All changes to a job go through here, under its lock, so readers
+        never see a list while it is being extended.
+        """
+        with self._changed:
+            for key, value in changes.items():
+                setattr(self, key, value)
+            for key, items in (extend or {}).items():
+                getattr(self, key).extend(items)
+            self.version += 1
+            self._changed.notify_all()
+
+    def finish(self, error=None):
+        if self.batches_failed == 0 and error is None:
+            status = 'completed'
+        elif self.batches_committed:
+            status = 'partial'
+        else:
+            status = 'failed'
+        self.update(status=status, finished_at=datetime.now(),
+                    extend={'errors': [error]} if error is not None else None)
+
+    def wait(self, since_version, timeout=None):
+        """Block until version moves past since_version or the job finishes."""
+        with self._changed:
+            self._changed.wait_for(
+                lambda: self.version > since_version or self.finished, timeout)
+            return self.version
+
+    def to_dict(self):
+        with self._changed:   # a consistent snapshot, lists copied
+            return {
+                'job_id': self.job_id,
+                'filename': self.filename,
+                'status': self.status,
+                'total': self.total,
+                'parsed': self.parsed,
+                'inserted': self.inserted,
+                'skipped': self.skipped,
+                'failed': self.failed,
+                'batches_committed': self.batches_committed,
+                'batches_failed': self.batches_failed,
+                'duplicates': list(self.duplicates),
+                'near_duplicates': list(self.near_duplicates),
+                'errors': list(self.errors),
+                'created_at': self.created_at.isoformat(),
+                'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            }
+
+
+def _get_executor(app):
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            workers = app.config.get('IMPORT_JOB_WORKERS', DEFAULT_WORKERS)
+            _executor = ThreadPoolExecutor(max_workers=workers,
+                                           thread_name_prefix='import-job')
+        return _executor
+
+
+def _forget_old_jobs():
+    finished = [jid for jid, job in _jobs.items() if job.finished]
+    for jid in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+        del _jobs[jid]
+
+
+def submit(app, job, run, *args):
+    """Register job and run run(job, *args) on the pool inside app's context.
+
+    Exceptions escaping run mark the job failed (or partial if some batches
+    already committed).
+    """
+    with _jobs_lock:
+        _forget_old_jobs()
+        _jobs[job.job_id] = job
+
+    def task():
+        with app.app_context():
+            job.update(status='running')
+            try:
+                run(job, *args)
+            except Exception as e:
+                job.finish(error=str(e))
+            else:
+                if not job.finished:
+                    job.finish()
+
+    _get_executor(app).submit(task)
+    return job
+
+
+def get_job(job_id):
+    with _jobs_lock:
+        return _jobs.get(job_id)
+
+
+def list_jobs():
+    """Known jobs, newest first."""
+    with _jobs_lock:
+        return list(reversed(_jobs.values()))
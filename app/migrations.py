@@ -0,0 +1,153 @@
+"""migrations.py — versioned schema migrations.
+
+db.create_all() only creates missing tables; it cannot change what already
+exists.  New columns, indexes and data fixes are written as numbered
+migrations here (factory._migrate_db() only keeps the columns added before
+this module existed).  Each runs once per database, in its own
+transaction, and the applied versions are recorded in the schema_version
+table.
+
+A brand-new database is built by create_all() with the current schema and
+then runs every migration too, so migrations must be idempotent
+(checkfirst / IF EXISTS).  Add new ones at the end with the next number.
+"""
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import bindparam, inspect, select, text, update
+
+from app import near_dup
+from app.db_models import db, QuestionModel, ExamModel, QuestionImageModel, exam_questions
+from app.utils import adopt_legacy_images, content_hash, image_identities
+
+schema_version = db.Table('schema_version',
+    db.Column('version', db.Integer, primary_key=True),
+    db.Column('description', db.String(256)),
+    db.Column('applied_at', db.DateTime),
+)
+
+Migration = namedtuple('Migration', 'version description apply')
+MIGRATIONS = []
+
+
+def migration(version, description):
+    """Register fn(connection) as schema migration number version."""
+    def register(fn):
+        assert not MIGRATIONS or version > MIGRATIONS[-1].version, 'migrations must be in order'
+        MIGRATIONS.append(Migration(version, description, fn))
+        return fn
+    return register
+
+
+def _create_indexes(conn, table, *names):
+    """Create the model-declared indexes called names, unless present."""
+    for index in table.indexes:
+        if index.name in names:
+            index.create(conn, checkfirst=True)
+
+
+def _add_column(conn, table, name):
+    """Add the model-declared column name to an existing table, unless present."""
+    if name in {c['name'] for c in inspect(conn).get_columns(table.name)}:
+        return
+    col_type = table.c[name].type.compile(conn.dialect)
+    conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {name} {col_type}'))
+
+
+@migration(1, 'composite indexes for list, assembly and exam queries')
+def _composite_indexes(conn):
+    _create_indexes(conn, QuestionModel.__table__,
+                    'ix_questions_type_used_subject', 'ix_questions_subject_type_difficulty')
+    _create_indexes(conn, exam_questions,
+                    'ix_exam_questions_exam_id_position', 'ix_exam_questions_question_id')
+    _create_indexes(conn, ExamModel.__table__, 'ix_exams_created_at_exam_id')
+    # Leading columns of the composites above
+    for name in ('ix_questions_question_type', 'ix_questions_subject'):
+        conn.execute(text(f'DROP INDEX IF EXISTS {name}'))
+
+
+@migration(2, 'content-addressed image store')
+def _content_addressed_images(conn):
+    _add_column(conn, QuestionImageModel.__table__, 'sha256')
+    _create_indexes(conn, QuestionImageModel.__table__, 'ix_question_images_sha256')
+    adopt_legacy_images(conn)
+
+
+@migration(3, 'keyset pagination index on questions (created_at, question_id)')
+def _keyset_index(conn):
+    _create_indexes(conn, QuestionModel.__table__, 'ix_questions_created_at_question_id')
+
+
+@migration(4, 'normalized content hash for import duplicate detection')
+def _content_hashes(conn):
+    questions = QuestionModel.__table__
+    _add_column(conn, questions, 'content_hash')
+    _create_indexes(conn, questions, 'ix_questions_content_hash')
+    _backfill_content_hashes(conn)
+
+
+def _question_batches(conn, where, batch_size=1000):
+    """Yield (question_id, content) rows matching where, batch_size at a time."""
+    questions = QuestionModel.__table__
+    after = ''
+    while True:
+        rows = conn.execute(
+            select(questions.c.question_id, questions.c.content)
+            .where(where, questions.c.question_id > after)
+            .order_by(questions.c.question_id).limit(batch_size)
+        ).all()
+        if not rows:
+            return
+        yield rows
+        after = rows[-1].question_id
+
+
+def _backfill_content_hashes(conn, where=None):
+    """Set content_hash on rows that have none (or that match where)."""
+    questions = QuestionModel.__table__
+    set_hash = update(questions).where(questions.c.question_id == bindparam('b_id')) \
+        .values(content_hash=bindparam('b_hash'))
+    for rows in _question_batches(conn, questions.c.content_hash.is_(None) if where is None else where):
+        keys = image_identities(conn, [content for _, content in rows])
+        conn.execute(set_hash, [{'b_id': qid, 'b_hash': content_hash(content, keys)} for qid, content in rows])
+
+
+@migration(5, 'trim stored question types')
+def _trim_question_types(conn):
+    # Types used to be stored untrimmed and matched with trim(); normalize
+    # once so generation can use the question_type index.
+    conn.execute(text(
+        'UPDATE questions SET question_type = trim(question_type) '
+        'WHERE question_type != trim(question_type)'
+    ))
+
+
+@migration(6, 'keep image ids in content hashes and near-duplicate signatures')
+def _rehash_questions_with_images(conn):
+    # Images used to normalize to a bare [img], so questions differing only
+    # by figure hashed (and were signed) alike; now they hash by blob.
+    has_image = QuestionModel.__table__.c.content.contains('<img')
+    _backfill_content_hashes(conn, where=has_image)
+    for rows in _question_batches(conn, has_image):
+        near_dup._write_index(conn, rows)
+
+
+def current_version(conn):
+    return conn.execute(db.select(db.func.max(schema_version.c.version))).scalar() or 0
+
+
+def run_migrations(engine):
+    """Apply pending migrations in order; returns the versions applied."""
+    schema_version.create(engine, checkfirst=True)
+    with engine.connect() as conn:
+        version = current_version(conn)
+    applied = []
+    for m in MIGRATIONS:
+        if m.version <= version:
+            continue
+        with engine.begin() as conn:
+            m.apply(conn)
+            conn.execute(schema_version.insert().values(
+                version=m.version, description=m.description, applied_at=datetime.now()))
+        applied.append(m.version)
+    return applied
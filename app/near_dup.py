@@ -0,0 +1,308 @@
+"""near_dup.py — MinHash LSH index for near-duplicate question detection.
+
+Exact content hashes (utils.content_hash) miss reworded or re-punctuated
+copies.  Here each question's normalized content is cut into character
+3-grams (works for Chinese without segmentation) and summarised by a
+one-permutation MinHash: every shingle is hashed once and kept as the
+minimum of one of NUM_BINS bins, so building a signature is linear in the
+text length.  The fraction of equal bins between two signatures estimates
+their Jaccard similarity.
+
+Signatures are split into BANDS bands; each band hashes to a bucket stored
+in ``question_lsh_buckets``.  Questions sharing any bucket are candidates,
+found by an indexed ``bucket IN (...)`` lookup, and only candidates are
+compared — checking a batch costs O(batch), not O(bank).  With 8 bands of 4
+bins, pairs above ~0.6 similarity almost always collide.
+
+Mapper events keep the index in sync with ORM inserts, content edits and
+deletes; bulk inserts and deletes must call index_questions() /
+unindex_questions() themselves.
+"""
+import hashlib
+import struct
+from collections import defaultdict
+
+from sqlalchemy import event, func, inspect, select, delete, insert
+
+from app.db_models import db, QuestionModel, QuestionSignatureModel, question_lsh_buckets
+from app.utils import normalize_question_text
+
+NUM_BINS = 32
+BANDS = 8
+ROWS_PER_BAND = NUM_BINS // BANDS
+SHINGLE_SIZE = 3
+DEFAULT_THRESHOLD = 0.7
+
+_EMPTY = (1 << 64) - 1
+_MASK = (1 << 64) - 1
+_DENSIFY_STEP = 0x9E3779B97F4A7C15
+_PACK = struct.Struct(f'<{NUM_BINS}Q')
+_LOOKUP_CHUNK = 500
+_SCAN_CHUNK = 100
+MAX_BUCKET_SIZE = 200   # bank scans skip buckets shared by more questions
+
+
+def _shingles(text):
+    norm = normalize_question_text(text)
+    if len(norm) <= SHINGLE_SIZE:
+        return {norm} if norm else set()
+    return {norm[i:i + SHINGLE_SIZE] for i in range(len(norm) - SHINGLE_SIZE + 1)}
+
+
+def signature(text):
+    """Return the one-permutation MinHash of text as a tuple of NUM_BINS ints.
+
+    Empty bins (short texts) borrow the next non-empty bin to the right,
+    offset by distance, so every bin stays comparable. Empty text yields
+    all-_EMPTY, which is never bucketed.
+    """
+    bins = [_EMPTY] * NUM_BINS
+    for sh in _shingles(text):
+        h = int.from_bytes(hashlib.blake2b(sh.encode('utf-8'), digest_size=8).digest(), 'little')
+        b, v = h % NUM_BINS, h // NUM_BINS
+        if v < bins[b]:
+            bins[b] = v
+    if all(v == _EMPTY for v in bins):
+        return tuple(bins)
+    dense = list(bins)
+    for j in range(NUM_BINS):
+        k = 1
+        while dense[j] == _EMPTY:
+            src = bins[(j + k) % NUM_BINS]
+            if src != _EMPTY:
+                dense[j] = (src + k * _DENSIFY_STEP) & _MASK
+            k += 1
+    return tuple(dense)
+
+
+def is_empty(sig):
+    return sig[0] == _EMPTY
+
+
+def similarity(sig_a, sig_b):
+    """Estimated Jaccard similarity of the two texts' shingle sets."""
+    if is_empty(sig_a) or is_empty(sig_b):
+        return 0.0
+    return sum(1 for a, b in zip(sig_a, sig_b) if a == b) / NUM_BINS
+
+
+def bucket_keys(sig):
+    """Return [(band, bucket)] for a signature; [] for empty text."""
+    if is_empty(sig):
+        return []
+    keys = []
+    for band in range(BANDS):
+        chunk = sig[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
+        digest = hashlib.blake2b(struct.pack(f'<B{ROWS_PER_BAND}Q', band, *chunk),
+                                 digest_size=8).digest()
+        keys.append((band, int.from_bytes(digest, 'little', signed=True)))
+    return keys
+
+
+def pack(sig):
+    return _PACK.pack(*sig)
+
+
+def unpack(blob):
+    return _PACK.unpack(blob)
+
+
+# ── Index maintenance ────────────────────────────────────────────────────────
+
+def _index_rows(question_id, content):
+    sig = signature(content)
+    sig_row = {'question_id': question_id, 'signature': pack(sig)}
+    bucket_rows = [{'question_id': question_id, 'band': band, 'bucket': bucket}
+                   for band, bucket in bucket_keys(sig)]
+    return sig_row, bucket_rows
+
+
+def _write_index(conn, items):
+    """(Re)index [(question_id, content)] on a Connection or Session."""
+    sig_rows, bucket_rows = [], []
+    for qid, content in items:
+        sig_row, rows = _index_rows(qid, content)
+        sig_rows.append(sig_row)
+        bucket_rows.extend(rows)
+    if not sig_rows:
+        return
+    _delete_index(conn, [r['question_id'] for r in sig_rows])
+    conn.execute(insert(QuestionSignatureModel.__table__), sig_rows)
+    if bucket_rows:
+        conn.execute(insert(question_lsh_buckets), bucket_rows)
+
+
+def _delete_index(conn, question_ids):
+    for i in range(0, len(question_ids), _LOOKUP_CHUNK):
+        chunk = question_ids[i:i + _LOOKUP_CHUNK]
+        conn.execute(delete(QuestionSignatureModel.__table__).where(
+            QuestionSignatureModel.__table__.c.question_id.in_(chunk)))
+        conn.execute(delete(question_lsh_buckets).where(
+            question_lsh_buckets.c.question_id.in_(chunk)))
+
+
+def index_questions(items):
+    """Index [(question_id, content)] written by a bulk insert. Caller commits."""
+    _write_index(db.session, list(items))
+
+
+def unindex_questions(question_ids):
+    """Drop index rows for questions removed by a bulk delete. Caller commits."""
+    _delete_index(db.session, list(question_ids))
+
+
+def backfill_signatures(batch_size=1000):
+    """Index questions that have no signature yet (pre-existing rows)."""
+    while True:
+        rows = db.session.query(QuestionModel.question_id, QuestionModel.content).outerjoin(
+            QuestionSignatureModel,
+            QuestionSignatureModel.question_id == QuestionModel.question_id,
+        ).filter(QuestionSignatureModel.question_id.is_(None)).limit(batch_size).all()
+        if not rows:
+            break
+        _write_index(db.session, rows)
+        db.session.commit()
+
+
+@event.listens_for(QuestionModel, 'after_insert')
+def _index_on_insert(mapper, connection, target):
+    _write_index(connection, [(target.question_id, target.content)])
+
+
+@event.listens_for(QuestionModel, 'after_update')
+def _index_on_update(mapper, connection, target):
+    if inspect(target).attrs.content.history.has_changes():
+        _write_index(connection, [(target.question_id, target.content)])
+
+
+@event.listens_for(QuestionModel, 'after_delete')
+def _index_on_delete(mapper, connection, target):
+    _delete_index(connection, [target.question_id])
+
+
+# ── Lookup ───────────────────────────────────────────────────────────────────
+
+def _load_signatures(question_ids):
+    """{question_id: signature} for live questions among question_ids."""
+    ids = list(question_ids)
+    found = {}
+    for i in range(0, len(ids), _LOOKUP_CHUNK):
+        rows = db.session.query(
+            QuestionSignatureModel.question_id, QuestionSignatureModel.signature
+        ).join(
+            QuestionModel, QuestionModel.question_id == QuestionSignatureModel.question_id
+        ).filter(QuestionSignatureModel.question_id.in_(ids[i:i + _LOOKUP_CHUNK])).all()
+        for qid, blob in rows:
+            found[qid] = unpack(blob)
+    return found
+
+
+def find_near_duplicates(signatures, threshold=DEFAULT_THRESHOLD, exclude_ids=()):
+    """Match each signature against the bank.
+
+    Returns one list per input signature of {question_id, similarity}
+    (similarity >= threshold), best first. exclude_ids are never reported.
+    """
+    keys_per_item = [[bucket for _, bucket in bucket_keys(sig)] for sig in signatures]
+    all_keys = list({k for keys in keys_per_item for k in keys})
+
+    ids_by_bucket = defaultdict(set)
+    for i in range(0, len(all_keys), _LOOKUP_CHUNK):
+        rows = db.session.execute(
+            select(question_lsh_buckets.c.bucket, question_lsh_buckets.c.question_id)
+            .where(question_lsh_buckets.c.bucket.in_(all_keys[i:i + _LOOKUP_CHUNK]))
+        ).all()
+        for bucket, qid in rows:
+            ids_by_bucket[bucket].add(qid)
+
+    exclude = set(exclude_ids)
+    candidate_ids = {qid for ids in ids_by_bucket.values() for qid in ids} - exclude
+    bank = _load_signatures(candidate_ids)
+
+    results = []
+    for sig, keys in zip(signatures, keys_per_item):
+        candidates = set()
+        for k in keys:
+            candidates |= ids_by_bucket[k]
+        matches = []
+        for qid in candidates:
+            if qid in bank:
+                score = similarity(sig, bank[qid])
+                if score >= threshold:
+                    matches.append({'question_id': qid, 'similarity': round(score, 3)})
+        matches.sort(key=lambda m: (-m['similarity'], m['question_id']))
+        results.append(matches)
+    return results
+
+
+def find_batch_near_duplicates(signatures, threshold=DEFAULT_THRESHOLD):
+    """Near-duplicate pairs within a batch: {index: [(other_index, similarity)]}."""
+    by_bucket = defaultdict(list)
+    for idx, sig in enumerate(signatures):
+        for _, bucket in bucket_keys(sig):
+            by_bucket[bucket].append(idx)
+    pairs = defaultdict(dict)
+    for members in by_bucket.values():
+        for a in members:
+            for b in members:
+                if a < b and b not in pairs[a]:
+                    score = similarity(signatures[a], signatures[b])
+                    if score >= threshold:
+                        pairs[a][b] = score
+    return {a: sorted(others.items()) for a, others in pairs.items() if others}
+
+
+def bank_near_duplicate_pairs(threshold=DEFAULT_THRESHOLD, limit=500, after=None):
+    """Scan the bank for near-duplicate pairs, a page at a time.
+
+    Questions are visited in question_id order, _SCAN_CHUNK at a time, each
+    chunk with one bucket self-join limited to its questions and to partners
+    with a greater question_id (so every pair is seen once).  Buckets with
+    more than MAX_BUCKET_SIZE questions are skipped: boilerplate shared by a
+    whole group of questions would make the join quadratic.  The scan stops
+    after the question that brings the page to limit pairs.
+
+    Returns (pairs, next_after): pairs are [{question_id, other_question_id,
+    similarity}] by question_id, then best first; pass next_after as after
+    for the next page (None once the bank is exhausted).
+    """
+    a = question_lsh_buckets.alias('a')
+    b = question_lsh_buckets.alias('b')
+    # Found once per call rather than re-aggregated for every chunk
+    crowded = db.session.scalars(
+        select(question_lsh_buckets.c.bucket).group_by(question_lsh_buckets.c.bucket)
+        .having(func.count() > MAX_BUCKET_SIZE)
+    ).all()
+    signatures = QuestionSignatureModel.__table__
+    pairs = []
+    while True:
+        chunk = db.session.scalars(
+            select(signatures.c.question_id)
+            .where(signatures.c.question_id > (after or ''))
+            .order_by(signatures.c.question_id).limit(_SCAN_CHUNK)
+        ).all()
+        if not chunk:
+            return pairs, None
+        partners = defaultdict(set)
+        for qa, qb in db.session.execute(
+            select(a.c.question_id, b.c.question_id)
+            .join(b, (a.c.bucket == b.c.bucket) & (a.c.question_id < b.c.question_id))
+            .where(a.c.question_id.in_(chunk), a.c.bucket.not_in(crowded))
+        ):
+            partners[qa].add(qb)
+        sigs = _load_signatures(set(partners) | {qb for qbs in partners.values() for qb in qbs})
+        for qa in chunk:
+            found = []
+            for qb in partners.get(qa, ()):
+                if qa in sigs and qb in sigs:
+                    score = similarity(sigs[qa], sigs[qb])
+                    if score >= threshold:
+                        found.append({'question_id': qa, 'other_question_id': qb,
+                                      'similarity': round(score, 3)})
+            found.sort(key=lambda p: (-p['similarity'], p['other_question_id']))
+            pairs += found
+            if len(pairs) >= limit:
+                return pairs, qa
+        if len(chunk) < _SCAN_CHUNK:
+            return pairs, None
+        after = chunk[-1]
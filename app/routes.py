@@ -1,10 +1,24 @@
-from flask import Blueprint, request, jsonify, render_template, send_file
-from app.db_models import db, QuestionModel, ExamModel, QuestionTypeModel, CourseSettingsModel, exam_questions, QuestionImageModel
-from app.utils import allowed_file, generate_word_template, export_exam_to_word, save_image_file, delete_question_images, _IMAGES_DIR, _associate_images_in_html
+from flask import Blueprint, current_app, request, jsonify, render_template, send_file, Response, stream_with_context
+from app.db_models import db, QuestionModel, ExamModel, QuestionTypeModel, CourseSettingsModel, exam_questions, QuestionImageModel, QUESTION_FIELDS, question_serializer
+from app.search import keyword_criterion, ranked_search
+from app import batch_export, image_derivatives, image_gc, import_jobs, near_dup
+from app.assembly import assemble
+from app.cache import cached_response
+from app.utils import allowed_file, generate_word_template, export_exam_to_word, snapshot_exam, save_image_file, DeferredImageWriter, delete_image_records, delete_question_images, forget_image, image_file, _associate_images_in_html, _associate_images_bulk, content_hash, image_identities, normalize_question_text
 import os
+import io
+import csv
+import itertools
 import json
 import uuid
-from datetime import datetime
+import base64
+from datetime import datetime, timedelta
+from sqlalchemy import insert, update
+
+try:
+    import orjson
+except ImportError:  # optional speed-up; stdlib json is used without it
+    orjson = None
 
 bp = Blueprint('main', __name__)
 
@@ -32,12 +46,13 @@ def upload_image():
         return jsonify({'error': 'No file selected'}), 400
 
     content_type = f.content_type or 'image/png'
-    image_bytes = f.read()
-    if len(image_bytes) == 0:
+    if not f.stream.read(1):
         return jsonify({'error': 'Empty file'}), 400
+    f.stream.seek(0)
 
     try:
-        image_id = save_image_file(image_bytes, content_type, question_id=None)
+        # Hashed and stored straight from the upload stream
+        image_id = save_image_file(f.stream, content_type, question_id=None)
         db.session.commit()
         return jsonify({'image_id': image_id, 'url': f'/api/images/{image_id}'}), 201
     except Exception as e:
@@ -45,69 +60,331 @@ def upload_image():
         return jsonify({'error': str(e)}), 500
 
 
+_IMAGE_MAX_AGE = 365 * 24 * 3600
+
+
+def _cache_forever(resp):
+    resp.cache_control.public = True
+    resp.cache_control.max_age = _IMAGE_MAX_AGE
+    resp.cache_control.immutable = True
+    return resp
+
+
+def _not_modified(etag, forever):
+    resp = current_app.response_class(status=304)
+    resp.set_etag(etag)
+    if forever:
+        return _cache_forever(resp)
+    resp.cache_control.no_cache = True
+    return resp
+
+
 @bp.route('/api/images/<image_id>', methods=['GET'])
 def serve_image(image_id):
-    """Serve an image file by its image_id."""
-    record = QuestionImageModel.query.filter_by(image_id=image_id).first()
-    if not record:
+    """Serve an image file by its image_id.
+
+    An image_id always names the same bytes (new content gets a new ID), so
+    the URL is already content-versioned: responses are cacheable forever,
+    with the content's SHA-256 as a strong ETag.  Lookups go through an
+    in-process cache; with USE_X_SENDFILE the front server sends the file.
+
+    ?size=thumb|print|webp selects a derivative (app/image_derivatives.py).
+    Until it has been generated the original is sent, marked for
+    revalidation so the derivative replaces it once ready.
+    """
+    size = request.args.get('size')
+    if size and size not in image_derivatives.VARIANTS:
+        return jsonify({'error': f'size must be one of {", ".join(image_derivatives.VARIANTS)}'}), 400
+    image = image_file(image_id)
+    if image is None:
         return jsonify({'error': 'Image not found'}), 404
-    filepath = os.path.join(_IMAGES_DIR, record.filename)
-    if not os.path.exists(filepath):
+
+    path, mimetype, forever = image.path, image.content_type, True
+    etag = image.sha256 and (f'{image.sha256}.{size}' if size else image.sha256)
+    if etag and etag in request.if_none_match:
+        return _not_modified(etag, forever)
+    if size:
+        derived = image_derivatives.derivative_path(image.path, size)
+        if os.path.exists(derived):
+            path, mimetype = derived, image_derivatives.content_type(derived)
+        else:
+            image_derivatives.schedule(image.path)
+            etag, forever = image.sha256, False
+            if etag and etag in request.if_none_match:
+                return _not_modified(etag, forever)
+    try:
+        resp = send_file(path, mimetype=mimetype, conditional=True,
+                         etag=etag or True, max_age=_IMAGE_MAX_AGE if forever else None)
+    except FileNotFoundError:
+        forget_image(image_id)
         return jsonify({'error': 'Image file missing'}), 404
-    return send_file(filepath, mimetype=record.content_type)
+    if forever:
+        return _cache_forever(resp)
+    resp.cache_control.no_cache = True
+    return resp
 
 
 @bp.route('/api/images/<image_id>', methods=['DELETE'])
 def delete_image(image_id):
-    """Delete an image file and its DB record."""
+    """Delete an image record; its file goes with the last record using it."""
     record = QuestionImageModel.query.filter_by(image_id=image_id).first()
     if not record:
         return jsonify({'error': 'Image not found'}), 404
-    try:
-        os.remove(os.path.join(_IMAGES_DIR, record.filename))
-    except OSError:
-        pass
-    db.session.delete(record)
+    delete_image_records([record])
     db.session.commit()
     return jsonify({'message': 'Image deleted'})
 
 
+@bp.route('/api/images/gc', methods=['POST'])
+def collect_orphan_images():
+    """Delete images no question uses that are older than the grace period.
+
+    Body (optional): {"grace_hours": float}; defaults to IMAGE_GC_GRACE_HOURS
+    and may not be below image_gc.MIN_GRACE.
+    """
+    data = request.get_json(silent=True) or {}
+    grace_hours = data.get('grace_hours', current_app.config.get('IMAGE_GC_GRACE_HOURS', 24))
+    min_hours = image_gc.MIN_GRACE / timedelta(hours=1)
+    if isinstance(grace_hours, bool) or not isinstance(grace_hours, (int, float)) or grace_hours < min_hours:
+        return jsonify({'error': f'grace_hours must be a number of at least {min_hours:g}'}), 400
+    return jsonify(image_gc.collect(timedelta(hours=grace_hours)))
+
+
 # ─── Question Bank Management Routes ────────────────────────────────────────
-@bp.route('/api/questions', methods=['GET'])
-def get_questions():
-    """Get all questions or search questions"""
-    keyword = request.args.get('keyword', '')
-    question_type = request.args.get('type', '')
-    language = request.args.get('language', '')
-    difficulty = request.args.get('difficulty', '')
-    knowledge_point = request.args.get('knowledge_point', '')
-    is_used = request.args.get('is_used', '')
-    subject = request.args.get('subject', '')
 
-    query = QuestionModel.query
+_DEFAULT_PAGE_SIZE = 50
+_MAX_PAGE_SIZE = 500
+
+
+def _question_filters(args):
+    """Build filter criteria for QuestionModel from /api/questions query args.
 
+    Shared by every endpoint that accepts the list page's filter parameters.
+    """
+    keyword = args.get('keyword', '')
+    question_type = args.get('type', '')
+    language = args.get('language', '')
+    difficulty = args.get('difficulty', '')
+    knowledge_point = args.get('knowledge_point', '')
+    is_used = args.get('is_used', '')
+    subject = args.get('subject', '')
+
+    criteria = []
     if keyword:
-        query = query.filter(QuestionModel.content.contains(keyword))
+        criteria.append(keyword_criterion(keyword))
     if question_type:
-        query = query.filter_by(question_type=question_type)
+        criteria.append(QuestionModel.question_type == question_type)
     if language:
-        query = query.filter_by(language=language)
+        criteria.append(QuestionModel.language == language)
     if difficulty:
-        query = query.filter_by(difficulty=difficulty)
+        criteria.append(QuestionModel.difficulty == difficulty)
     if knowledge_point:
-        query = query.filter(QuestionModel.knowledge_point.contains(knowledge_point))
+        criteria.append(keyword_criterion(knowledge_point, 'knowledge_point'))
     if is_used == '1':
-        query = query.filter_by(is_used=True)
+        criteria.append(QuestionModel.is_used == True)
     elif is_used == '0':
-        query = query.filter_by(is_used=False)
+        criteria.append(QuestionModel.is_used == False)
     if subject:
-        query = query.filter_by(subject=subject)
+        criteria.append(QuestionModel.subject == subject)
+    return criteria
+
+
+def _encode_cursor(created_at, question_id):
+    """Encode the (created_at, question_id) keyset position as an opaque token."""
+    raw = json.dumps([created_at.isoformat() if created_at else None, question_id])
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
 
-    questions = query.all()
-    return jsonify([q.to_dict() for q in questions])
+def _decode_cursor(cursor):
+    """Decode a token from _encode_cursor(). Raises ValueError if malformed."""
+    try:
+        created_at, question_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return (datetime.fromisoformat(created_at) if created_at else None), str(question_id)
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+
+def _after_cursor(created_at, question_id):
+    """Keyset predicate: rows strictly after (created_at, question_id).
+
+    NULL created_at sorts first in SQLite, so a NULL position continues
+    through the remaining NULL rows before moving on to dated ones.
+    """
+    if created_at is None:
+        return db.or_(
+            db.and_(QuestionModel.created_at.is_(None), QuestionModel.question_id > question_id),
+            QuestionModel.created_at.isnot(None),
+        )
+    return db.or_(
+        QuestionModel.created_at > created_at,
+        db.and_(QuestionModel.created_at == created_at, QuestionModel.question_id > question_id),
+    )
+
+
+def _parse_fields(args):
+    """Output fields from ?fields=a,b (question_id always included); all by default."""
+    raw = args.get('fields', '')
+    if not raw.strip():
+        return list(QUESTION_FIELDS)
+    fields = [f.strip() for f in raw.split(',') if f.strip()]
+    unknown = [f for f in fields if f not in QUESTION_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return list(dict.fromkeys(['question_id'] + fields))
+
+
+def _dumps(obj):
+    """Serialize to a JSON string, with orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(obj).decode('utf-8')
+    return json.dumps(obj, ensure_ascii=False)
+
+
+def _json_response(payload):
+    """jsonify() for list payloads; orjson is several times faster when available."""
+    if orjson is None:
+        return jsonify(payload)
+    return Response(orjson.dumps(payload), mimetype='application/json')
+
+
+@bp.route('/api/questions', methods=['GET'])
+@cached_response('questions')
+def get_questions():
+    """List questions with keyset pagination.
+
+    Query params: the filters in _question_filters(), plus
+      limit  — page size (default 50, max 500)
+      cursor — next_cursor from the previous page
+      all=1  — opt-in to the legacy unpaginated list (returns a bare array)
+      fields — comma-separated output fields (see QUESTION_FIELDS); only the
+               matching columns are selected and decoded
+
+    Returns {questions, total, limit, next_cursor}; next_cursor is null on the
+    last page. Rows are ordered by (created_at, question_id).
+    """
+    criteria = _question_filters(request.args)
+    try:
+        fields = _parse_fields(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    # created_at is always selected for the cursor, but only output if asked for
+    select_cols = QuestionModel.columns_for(fields + ['created_at'])
+    serialize = question_serializer(fields)
+
+    if request.args.get('all') == '1':
+        rows = db.session.execute(db.select(*select_cols).where(*criteria)).all()
+        return _json_response([serialize(r) for r in rows])
+
+    try:
+        limit = int(request.args.get('limit', _DEFAULT_PAGE_SIZE))
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    limit = max(1, min(limit, _MAX_PAGE_SIZE))
+
+    total = db.session.query(db.func.count(QuestionModel.question_id)).filter(*criteria).scalar()
+
+    page_query = db.select(*select_cols).where(*criteria)
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            page_query = page_query.where(_after_cursor(*_decode_cursor(cursor)))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+    rows = db.session.execute(page_query.order_by(
+        QuestionModel.created_at, QuestionModel.question_id
+    ).limit(limit + 1)).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _encode_cursor(rows[-1].created_at, rows[-1].question_id)
+
+    return _json_response({
+        'questions': [serialize(r) for r in rows],
+        'total': total,
+        'limit': limit,
+        'next_cursor': next_cursor,
+    })
+
+
+@bp.route('/api/questions/search', methods=['GET'])
+def search_questions():
+    """Full-text search ranked by relevance, with highlighted snippets.
+
+    Query params: q (required), limit (default 20, max 500), plus the
+    list-page filters except keyword. Each result is the question dict with
+    an extra 'snippet' key (matched text wrapped in <mark>, or null).
+    """
+    q = (request.args.get('q') or '').strip()
+    if not q:
+        return jsonify({'error': 'q is required'}), 400
+    try:
+        limit = int(request.args.get('limit', 20))
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    limit = max(1, min(limit, _MAX_PAGE_SIZE))
+
+    args = request.args.to_dict()
+    args.pop('keyword', None)
+    results = []
+    for question, snippet in ranked_search(q, _question_filters(args), limit):
+        item = question.to_dict()
+        item['snippet'] = snippet
+        results.append(item)
+    return jsonify(results)
+
+
+def _parse_threshold(value):
+    threshold = float(value) if value not in (None, '') else near_dup.DEFAULT_THRESHOLD
+    if not 0 < threshold <= 1:
+        raise ValueError('threshold must be in (0, 1]')
+    return threshold
+
+
+@bp.route('/api/questions/near-duplicates', methods=['GET', 'POST'])
+def near_duplicate_questions():
+    """Find reworded / re-punctuated copies via the MinHash LSH index.
+
+    GET  ?question_id=...  — matches for one question in the bank
+    GET  (no question_id)  — near-duplicate pairs across the whole bank, by
+                             question_id (limit, at most 500; pass
+                             next_after back as after for the next page)
+    POST {"contents": [...]} — check candidate texts before importing;
+                             returns one match list per text
+    All forms accept threshold (estimated Jaccard similarity, default 0.7).
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        threshold = _parse_threshold(data.get('threshold', request.args.get('threshold')))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    if request.method == 'POST':
+        contents = data.get('contents')
+        if not isinstance(contents, list):
+            return jsonify({'error': 'contents must be a list of strings'}), 400
+        sigs = [near_dup.signature(c or '') for c in contents]
+        matches = near_dup.find_near_duplicates(sigs, threshold)
+        return jsonify({'results': [{'index': i, 'matches': m} for i, m in enumerate(matches)]})
+
+    question_id = request.args.get('question_id')
+    if question_id:
+        question = db.session.get(QuestionModel, question_id)
+        if not question:
+            return jsonify({'error': 'Question not found'}), 404
+        matches = near_dup.find_near_duplicates(
+            [near_dup.signature(question.content)], threshold, exclude_ids=[question_id]
+        )[0]
+        return jsonify({'question_id': question_id, 'matches': matches})
+
+    limit = max(1, min(request.args.get('limit', _MAX_PAGE_SIZE, type=int), _MAX_PAGE_SIZE))
+    pairs, next_after = near_dup.bank_near_duplicate_pairs(threshold, limit, request.args.get('after'))
+    return jsonify({'pairs': pairs, 'next_after': next_after})
 
 
 @bp.route('/api/questions/subjects', methods=['GET'])
+@cached_response('questions')
 def get_subjects():
     """Get all distinct subject values from the question bank"""
     rows = db.session.query(QuestionModel.subject).filter(
@@ -118,12 +395,69 @@ def get_subjects():
     return jsonify(subjects)
 
 
+# Facet name (= list filter param) -> column
+_FACET_COLUMNS = {
+    'type': QuestionModel.question_type,
+    'subject': QuestionModel.subject,
+    'difficulty': QuestionModel.difficulty,
+    'language': QuestionModel.language,
+    'is_used': QuestionModel.is_used,
+}
+
+
+@bp.route('/api/questions/facets', methods=['GET'])
+@cached_response('questions')
+def get_question_facets():
+    """Counts per type, subject, difficulty, language and usage.
+
+    Accepts the list filters. One GROUP BY over all facet columns scans the
+    matching rows once; the per-facet counts are rolled up from those
+    combinations here (SQLite has no GROUPING SETS). Returns
+    {total, facets: {name: [{value, count}]}}, largest counts first.
+    """
+    rows = db.session.query(
+        *_FACET_COLUMNS.values(), db.func.count()
+    ).filter(*_question_filters(request.args)).group_by(*_FACET_COLUMNS.values()).all()
+
+    counts = {name: {} for name in _FACET_COLUMNS}
+    total = 0
+    for row in rows:
+        n = row[-1]
+        total += n
+        for name, value in zip(_FACET_COLUMNS, row):
+            if name == 'is_used':
+                value = bool(value)
+            counts[name][value] = counts[name].get(value, 0) + n
+
+    facets = {
+        name: [{'value': v, 'count': c}
+               for v, c in sorted(values.items(), key=lambda kv: (-kv[1], str(kv[0])))]
+        for name, values in counts.items()
+    }
+    return jsonify({'total': total, 'facets': facets})
+
+
 @bp.route('/api/questions', methods=['POST'])
 def add_question():
     """Add a new question"""
     data = request.json
-    now = datetime.now()
+    question = QuestionModel(**_new_question_columns(data, datetime.now()))
+    db.session.add(question)
+    try:
+        db.session.commit()
+        # Associate any images uploaded before the question was saved
+        html_fields = [question.content, question.reference_answer, question.explanation]
+        for html in html_fields:
+            _associate_images_in_html(html, question.question_id)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        return jsonify({'error': 'Question with this ID already exists'}), 400
+    return jsonify(question.to_dict()), 201
+
 
+def _new_question_columns(data, now):
+    """Column values for a question created from an API payload."""
     content_en = data.get('content_en')
     options_en = data.get('options_en')
     language = data.get('language', 'zh')
@@ -131,7 +465,7 @@ def add_question():
     if content_en and language == 'zh':
         language = 'both'
 
-    question = QuestionModel(
+    return dict(
         question_id=data.get('question_id'),
         question_type=data.get('question_type'),
         content=data.get('content'),
@@ -150,18 +484,6 @@ def add_question():
         created_at=now,
         updated_at=now,
     )
-    db.session.add(question)
-    try:
-        db.session.commit()
-        # Associate any images uploaded before the question was saved
-        html_fields = [question.content, question.reference_answer, question.explanation]
-        for html in html_fields:
-            _associate_images_in_html(html, question.question_id)
-        db.session.commit()
-    except Exception:
-        db.session.rollback()
-        return jsonify({'error': 'Question with this ID already exists'}), 400
-    return jsonify(question.to_dict()), 201
 
 
 @bp.route('/api/questions/<question_id>', methods=['GET'])
@@ -180,7 +502,18 @@ def update_question(question_id):
     if not question:
         return jsonify({'error': 'Question not found'}), 404
 
-    data = request.json
+    _apply_question_update(question, request.json, datetime.now())
+
+    db.session.commit()
+    # Associate any newly uploaded images in updated fields
+    for html in [question.content, question.reference_answer, question.explanation]:
+        _associate_images_in_html(html, question.question_id)
+    db.session.commit()
+    return jsonify(question.to_dict())
+
+
+def _apply_question_update(question, data, now):
+    """Apply the fields present in an API payload to an existing question."""
     question.content = data.get('content', question.content)
     if 'question_type' in data:
         question.question_type = data['question_type']
@@ -209,14 +542,7 @@ def update_question(question_id):
     # Auto-upgrade language to 'both' if content_en is provided
     if question.content_en and question.language == 'zh':
         question.language = 'both'
-    question.updated_at = datetime.now()
-
-    db.session.commit()
-    # Associate any newly uploaded images in updated fields
-    for html in [question.content, question.reference_answer, question.explanation]:
-        _associate_images_in_html(html, question.question_id)
-    db.session.commit()
-    return jsonify(question.to_dict())
+    question.updated_at = now
 
 
 @bp.route('/api/questions/<question_id>', methods=['DELETE'])
@@ -241,22 +567,33 @@ def batch_delete_questions():
     if not question_ids:
         return jsonify({'error': 'No question IDs provided'}), 400
 
+    deleted = _delete_questions(question_ids)
+    db.session.commit()
+
+    return jsonify({'message': f'{deleted} questions deleted successfully', 'deleted_count': deleted})
+
+
+def _delete_questions(question_ids):
+    """Delete questions with their images and exam links. Caller commits.
+
+    Image files are removed only once that commit succeeds, so callers may
+    run this alongside other writes and roll everything back.
+    """
     # Cascade delete images for all questions
-    for qid in question_ids:
-        delete_question_images(qid)
+    delete_question_images(question_ids)
 
     # Remove exam_questions associations first
     db.session.execute(
         exam_questions.delete().where(exam_questions.c.question_id.in_(question_ids))
     )
 
+    # Bulk delete bypasses mapper events, so drop near-duplicate index rows here
+    near_dup.unindex_questions(question_ids)
+
     # Delete the questions
-    deleted = QuestionModel.query.filter(QuestionModel.question_id.in_(question_ids)).delete(
+    return QuestionModel.query.filter(QuestionModel.question_id.in_(question_ids)).delete(
         synchronize_session=False
     )
-    db.session.commit()
-
-    return jsonify({'message': f'{deleted} questions deleted successfully', 'deleted_count': deleted})
 
 
 @bp.route('/api/questions/batch-update-type', methods=['POST'])
@@ -264,7 +601,7 @@ def batch_update_question_type():
     """Change question_type for multiple questions at once"""
     data = request.json
     question_ids = data.get('question_ids', [])
-    new_type = data.get('question_type', '')
+    new_type = (data.get('question_type') or '').strip()
 
     if not question_ids:
         return jsonify({'error': 'No question IDs provided'}), 400
@@ -288,9 +625,390 @@ def batch_update_question_type():
     return jsonify({'message': f'{updated} questions updated to "{new_type}"', 'updated_count': updated})
 
 
+_IN_CHUNK = 500  # stay well under SQLite's bound-parameter limit
+
+
+_BULK_MAX_OPERATIONS = 5000
+_BULK_OPS = ('create', 'update', 'delete')
+
+
+def _existing_question_ids(question_ids):
+    found = set()
+    for i in range(0, len(question_ids), _IN_CHUNK):
+        found.update(db.session.scalars(db.select(QuestionModel.question_id).where(
+            QuestionModel.question_id.in_(question_ids[i:i + _IN_CHUNK]))))
+    return found
+
+
+def _check_bulk_operation(op):
+    """(op, question payload, question_id, error) of one bulk operation;
+    error is set when the operation is not shaped as documented."""
+    kind = op.get('op') if isinstance(op, dict) else None
+    if kind not in _BULK_OPS:
+        return kind, {}, None, f'op must be one of {", ".join(_BULK_OPS)}'
+    payload = op.get('question')
+    if payload is None:
+        payload = {}
+    if not isinstance(payload, dict):
+        return kind, {}, None, 'question must be an object'
+    qid = op.get('question_id') or payload.get('question_id')
+    if qid is not None and not isinstance(qid, str):
+        return kind, payload, None, 'question_id must be a string'
+    for field in ('question_type', 'content'):
+        if payload.get(field) is not None and not isinstance(payload[field], str):
+            return kind, payload, qid, f'{field} must be a string'
+    return kind, payload, qid, None
+
+
+@bp.route('/api/questions/bulk', methods=['POST'])
+def bulk_questions():
+    """Apply many creates, updates and deletes in one transaction.
+
+    Body: {"operations": [{"op": "create", "question": {...}},
+                          {"op": "update", "question_id": id, "question": {...}},
+                          {"op": "delete", "question_id": id}],
+           "atomic": false}
+
+    Each operation is validated first; invalid ones are reported and
+    skipped. With atomic=true any invalid operation aborts the whole batch
+    (400). Creates go in as one executemany INSERT, updates are loaded with
+    one IN query, images referenced by the new HTML are associated in one
+    batch. Returns {results: [{index, op, question_id, status, error?}],
+    created, updated, deleted, errors}.
+    """
+    data = request.json or {}
+    operations = data.get('operations')
+    if not isinstance(operations, list):
+        return jsonify({'error': 'operations must be a list'}), 400
+    if len(operations) > _BULK_MAX_OPERATIONS:
+        return jsonify({'error': f'At most {_BULK_MAX_OPERATIONS} operations per request'}), 400
+
+    now = datetime.now()
+    results = []
+    creates, updates, deletes = [], {}, []
+
+    checked = [_check_bulk_operation(op) for op in operations]
+    existing = _existing_question_ids([qid for _, _, qid, error in checked if qid and not error])
+    claimed = set()   # each question may be touched once per batch
+
+    for index, (kind, payload, qid, error) in enumerate(checked):
+        result = {'index': index, 'op': kind}
+        results.append(result)
+        if error:
+            if qid:
+                result['question_id'] = qid
+            result['error'] = error
+            continue
+        if kind == 'create':
+            qid = qid or f"q_{uuid.uuid4().hex[:12]}"
+        result['question_id'] = qid
+
+        if not qid:
+            result['error'] = 'question_id is required'
+        elif qid in claimed:
+            result['error'] = 'question_id appears more than once in this batch'
+        elif kind == 'create' and qid in existing:
+            result['error'] = 'Question with this ID already exists'
+        elif kind == 'create' and not (payload.get('question_type') and payload.get('content')):
+            result['error'] = 'question_type and content are required'
+        elif kind != 'create' and qid not in existing:
+            result['error'] = 'Question not found'
+        if 'error' in result:
+            continue
+
+        claimed.add(qid)
+        if kind == 'create':
+            row = _new_question_columns({**payload, 'question_id': qid}, now)
+            row['question_type'] = row['question_type'].strip()
+            creates.append(row)
+        elif kind == 'update':
+            updates[qid] = payload
+        else:
+            deletes.append(qid)
+
+    errors = sum(1 for r in results if 'error' in r)
+    for r in results:
+        r['status'] = 'error' if 'error' in r else {
+            'create': 'created', 'update': 'updated', 'delete': 'deleted'}[r['op']]
+    if errors and data.get('atomic'):
+        for r in results:
+            if 'error' not in r:
+                r['status'] = 'skipped'
+        return jsonify({'results': results, 'created': 0, 'updated': 0, 'deleted': 0,
+                        'errors': errors}), 400
+
+    try:
+        if deletes:
+            _delete_questions(deletes)
+        if creates:
+            # ORM bulk INSERT skips mapper events: content_hash and the
+            # near-duplicate index are written here.
+            keys = image_identities(db.session, [r['content'] for r in creates])
+            for r in creates:
+                r['content_hash'] = content_hash(r['content'], keys)
+            db.session.execute(insert(QuestionModel), creates)
+            near_dup.index_questions((r['question_id'], r['content']) for r in creates)
+        updated = []
+        if updates:
+            ids = list(updates)
+            for i in range(0, len(ids), _IN_CHUNK):
+                for question in QuestionModel.query.filter(
+                    QuestionModel.question_id.in_(ids[i:i + _IN_CHUNK])
+                ):
+                    _apply_question_update(question, updates[question.question_id], now)
+                    updated.append(question)
+            db.session.flush()
+        _associate_images_bulk(
+            [(r['question_id'], html) for r in creates
+             for html in (r['content'], r['reference_answer'], r['explanation'])]
+            + [(q.question_id, html) for q in updated
+               for html in (q.content, q.reference_answer, q.explanation)]
+        )
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'Bulk operation failed: {e}'}), 500
+
+    return jsonify({
+        'results': results,
+        'created': len(creates),
+        'updated': len(updates),
+        'deleted': len(deletes),
+        'errors': errors,
+    })
+
+
+def _existing_ids_by_hash(hashes):
+    """Map content_hash -> question_id for hashes already in the bank.
+
+    Uses indexed IN lookups on questions.content_hash, chunked.
+    """
+    hashes = list(hashes)
+    found = {}
+    for i in range(0, len(hashes), _IN_CHUNK):
+        rows = db.session.query(QuestionModel.content_hash, QuestionModel.question_id).filter(
+            QuestionModel.content_hash.in_(hashes[i:i + _IN_CHUNK])
+        ).all()
+        for h, qid in rows:
+            found.setdefault(h, qid)
+    return found
+
+
+def _build_import_models(questions_data, import_subject, id_prefix, now, start=0, images=None):
+    """Turn parsed question dicts into QuestionModels, skipping duplicates.
+
+    A question is a duplicate when its normalized content hash matches one
+    already in the bank or earlier in the same batch; figures compare by
+    their bytes' sha256, including those still queued on images.
+    Returns (models, duplicates); each duplicate is
+    {index, content, existing_question_id}. start offsets indexes and IDs
+    when questions_data is one batch of a larger file.
+    """
+    contents = [q_data.get('content') or '' for q_data in questions_data]
+    keys = image_identities(db.session, contents)
+    if images is not None:
+        keys.update(images.identities())
+    hashes = [content_hash(content, keys) for content in contents]
+    known = _existing_ids_by_hash(set(hashes))
+
+    models = []
+    duplicates = []
+    for i, (q_data, h) in enumerate(zip(questions_data, hashes), start):
+        if h in known:
+            duplicates.append({
+                'index': i,
+                'content': normalize_question_text(q_data.get('content'))[:80],
+                'existing_question_id': known[h],
+            })
+            continue
+        question_id = f"{id_prefix}{i}"
+        known[h] = question_id  # prevent duplicates within this batch
+        content_en = q_data.get('content_en') or None
+        options_en = q_data.get('options_en') or []
+        lang = 'both' if content_en else 'zh'
+        models.append(QuestionModel(
+            question_id=question_id,
+            question_type=q_data['type'],
+            content=q_data['content'],
+            options=json.dumps(q_data.get('options', []), ensure_ascii=False),
+            answer=q_data.get('answer'),
+            reference_answer=q_data.get('reference_answer', ''),
+            explanation=q_data.get('explanation', ''),
+            content_en=content_en,
+            options_en=json.dumps(options_en, ensure_ascii=False) if options_en else None,
+            subject=import_subject or q_data.get('subject') or None,
+            knowledge_point=q_data.get('knowledge_point') or None,
+            tags=q_data.get('tags') or None,
+            difficulty=q_data.get('difficulty') or None,
+            language=lang,
+            metadata_json='{}',
+            content_hash=h,
+            created_at=now,
+            updated_at=now,
+        ))
+    return models, duplicates
+
+
+def _check_import_near_duplicates(models, skip):
+    """Flag new questions that closely resemble existing ones or each other.
+
+    Returns (models_to_insert, near_duplicates). With skip=True, flagged
+    questions are dropped (the first of a within-batch group is kept).
+    """
+    sigs = [near_dup.signature(m.content) for m in models]
+    bank_matches = near_dup.find_near_duplicates(sigs)
+    batch_pairs = near_dup.find_batch_near_duplicates(sigs)
+
+    matches = [list(m) for m in bank_matches]
+    for a, others in batch_pairs.items():
+        for b, score in others:
+            matches[b].append({'question_id': models[a].question_id, 'similarity': round(score, 3)})
+
+    kept, flagged = [], []
+    for model, found in zip(models, matches):
+        if not found:
+            kept.append(model)
+            continue
+        flagged.append({
+            'question_id': model.question_id,
+            'content': normalize_question_text(model.content)[:80],
+            'matches': found,
+            'skipped': skip,
+        })
+        if not skip:
+            kept.append(model)
+    return kept, flagged
+
+
+def _import_image_writer(filename):
+    """A DeferredImageWriter for a .docx upload; None for other files."""
+    return DeferredImageWriter() if filename.lower().endswith('.docx') else None
+
+
+def _iter_import_file(file_path, filename, images=None):
+    """Yield question dicts from a saved .docx/.txt upload.
+
+    A .docx is streamed: questions are yielded while the rest of the file
+    is still being read, and embedded images are queued on images (a
+    DeferredImageWriter) as parsing reaches them.  Without a writer they
+    are stored one by one with save_image_file, unowned until
+    _import_question_batch associates them from the HTML.
+    """
+    if filename.lower().endswith('.docx'):
+        from app.docx_importer import iter_docx_questions
+
+        # Collect known question type names for marker validation
+        known_types = {
+            qt.name for qt in QuestionTypeModel.query.all()
+        }
+        save = images.save if images is not None else save_image_file
+        yield from iter_docx_questions(file_path, save, known_types)
+
+    elif filename.lower().endswith('.txt'):
+        from app.utils import parse_question_template
+        with open(file_path, 'r', encoding='utf-8') as f:
+            content = f.read()
+        yield from parse_question_template(content)
+
+
+def _parse_import_file(file_path, filename, images=None):
+    """Parse a saved .docx/.txt upload into a list of question dicts."""
+    return list(_iter_import_file(file_path, filename, images))
+
+
+def _import_question_batch(questions_data, import_subject, id_prefix, now, skip_near_dups, start=0,
+                           images=None):
+    """Add one batch of parsed questions to the session. Caller commits.
+
+    images: the DeferredImageWriter the batch was parsed with, if any; its
+    queued images are inserted owned by the new questions.  Without one,
+    images referenced in the HTML are associated after the insert.
+    Returns (models, duplicates, near_duplicates) as for the import response.
+    """
+    models, duplicates = _build_import_models(questions_data, import_subject, id_prefix, now, start,
+                                              images)
+    models, near_duplicates = _check_import_near_duplicates(models, skip_near_dups)
+    db.session.add_all(models)
+    db.session.flush()
+    if images is not None:
+        parsed = {f"{id_prefix}{i}": q_data for i, q_data in enumerate(questions_data, start)}
+        images.persist({
+            image_id: m.question_id for m in models
+            for image_id in parsed[m.question_id].get('images', ())
+        })
+    else:
+        # Associate any images referenced in the HTML with their question IDs
+        _associate_images_bulk(
+            (m.question_id, html) for m in models
+            for html in (m.content, m.reference_answer, m.explanation)
+        )
+    return models, duplicates, near_duplicates
+
+
+def _import_id_prefix(filename, now, batch_tag):
+    kind = '_txt' if filename.lower().endswith('.txt') else ''
+    return f"q_{now.strftime('%Y%m%d_%H%M%S')}_{batch_tag}{kind}_"
+
+
+def _remove_import_temp(file_path):
+    try:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        csv_path = file_path.rsplit('.', 1)[0] + '.csv'
+        if os.path.exists(csv_path):
+            os.remove(csv_path)
+    except OSError:
+        pass
+
+
+def _run_import_job(job, file_path, filename, import_subject, skip_near_dups, batch_tag, batch_size):
+    """Body of a background import: insert batch by batch while parsing.
+
+    Each batch commits on its own, together with the images parsed for
+    it; a failing batch is rolled back, counted as failed and the job
+    moves on to the next one.  total is known once parsing ends.
+    """
+    now = datetime.now()
+    id_prefix = _import_id_prefix(filename, now, batch_tag)
+    images = _import_image_writer(filename)
+    questions = _iter_import_file(file_path, filename, images)
+    start = 0
+    try:
+        while True:
+            batch = list(itertools.islice(questions, batch_size))
+            if not batch:
+                break
+            job.update(parsed=start + len(batch))
+            try:
+                models, duplicates, near_duplicates = _import_question_batch(
+                    batch, import_subject, id_prefix, now, skip_near_dups, start, images
+                )
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                job.update(failed=job.failed + len(batch), batches_failed=job.batches_failed + 1,
+                           extend={'errors': [f'questions {start + 1}-{start + len(batch)}: {e}']})
+            else:
+                job.update(
+                    inserted=job.inserted + len(models),
+                    skipped=job.skipped + len(duplicates) + sum(1 for d in near_duplicates if d['skipped']),
+                    batches_committed=job.batches_committed + 1,
+                    extend={'duplicates': duplicates, 'near_duplicates': near_duplicates},
+                )
+            start += len(batch)
+    finally:
+        questions.close()
+        _remove_import_temp(file_path)
+    job.update(total=start)
+
+
 @bp.route('/api/questions/import', methods=['POST'])
 def import_questions():
-    """Import questions from a file (Word or CSV)"""
+    """Import questions from a file (Word or TXT).
+
+    With async=1 (form field or query string) the file is imported by a
+    background job; the response is 202 with the job ID and progress URLs.
+    """
     if 'file' not in request.files:
         return jsonify({'error': 'No file provided'}), 400
 
@@ -299,205 +1017,234 @@ def import_questions():
         return jsonify({'error': 'No file selected'}), 400
 
     if file and allowed_file(file.filename):
+        # Unique per request: concurrent imports of the same file name must not collide
+        batch_tag = uuid.uuid4().hex[:6]
+        temp_filename = f"temp_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{batch_tag}_{file.filename}"
+        file_path = os.path.join('temp', temp_filename)
+        # Read subject from form field
+        import_subject = request.form.get('subject') or None
+        skip_near_dups = request.form.get('skip_near_duplicates') == '1'
+        run_async = (request.form.get('async') or request.args.get('async')) == '1'
         try:
             # Save the uploaded file temporarily
-            temp_filename = f"temp_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{file.filename}"
-            file_path = os.path.join('temp', temp_filename)
-
-            # Create temp directory if it doesn't exist
             os.makedirs('temp', exist_ok=True)
-
             file.save(file_path)
 
-            # Read subject from form field
-            import_subject = request.form.get('subject') or None
-
-            # Build a set of existing content for deduplication (trimmed)
-            existing_contents = set(
-                row[0].strip()
-                for row in db.session.query(QuestionModel.content).all()
-                if row[0]
-            )
-
-            questions_data = []
-            models = []
-            skipped = 0
-
-            # Parse .docx using rich-content importer (supports images + tables)
-            if file.filename.lower().endswith('.docx'):
-                from app.docx_importer import parse_docx_with_rich_content
-
-                # Collect known question type names for marker validation
-                known_types = {
-                    qt.name for qt in QuestionTypeModel.query.all()
-                }
-
-                # Wrapper: save_image_fn(bytes, content_type) -> image_id
-                def _save_img_fn(image_bytes, content_type):
-                    return save_image_file(image_bytes, content_type, question_id=None)
-
-                questions_data = parse_docx_with_rich_content(
-                    file_path, _save_img_fn, known_types
+            if run_async:
+                job = import_jobs.submit(
+                    current_app._get_current_object(),
+                    import_jobs.ImportJob(file.filename),
+                    _run_import_job, file_path, file.filename, import_subject, skip_near_dups,
+                    batch_tag, current_app.config.get('IMPORT_BATCH_SIZE', import_jobs.DEFAULT_BATCH_SIZE),
                 )
-
-                now = datetime.now()
-                for i, q_data in enumerate(questions_data):
-                    content_text = (q_data.get('content') or '').strip()
-                    if content_text in existing_contents:
-                        skipped += 1
-                        continue
-                    existing_contents.add(content_text)  # prevent duplicates within this batch
-                    question_id = f"q_{now.strftime('%Y%m%d_%H%M%S')}_{i}"
-                    content_en = q_data.get('content_en') or None
-                    options_en = q_data.get('options_en') or []
-                    lang = 'both' if content_en else 'zh'
-                    model = QuestionModel(
-                        question_id=question_id,
-                        question_type=q_data['type'],
-                        content=q_data['content'],
-                        options=json.dumps(q_data.get('options', []), ensure_ascii=False),
-                        answer=q_data.get('answer'),
-                        reference_answer=q_data.get('reference_answer', ''),
-                        explanation=q_data.get('explanation', ''),
-                        content_en=content_en,
-                        options_en=json.dumps(options_en, ensure_ascii=False) if options_en else None,
-                        subject=import_subject or q_data.get('subject') or None,
-                        knowledge_point=q_data.get('knowledge_point') or None,
-                        tags=q_data.get('tags') or None,
-                        difficulty=q_data.get('difficulty') or None,
-                        language=lang,
-                        metadata_json='{}',
-                        created_at=now,
-                        updated_at=now,
-                    )
-                    models.append(model)
-                db.session.add_all(models)
-                db.session.commit()
-
-                # Associate any images embedded during parsing with their question IDs
-                for model in models:
-                    for field in ('content', 'reference_answer', 'explanation'):
-                        html_val = getattr(model, field) or ''
-                        if '/api/images/' in html_val:
-                            _associate_images_in_html(html_val, model.question_id)
-                db.session.commit()
-
-            elif file.filename.lower().endswith('.txt'):
-                from app.utils import parse_question_template
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                questions_data = parse_question_template(content)
-
-                now = datetime.now()
-                for i, q_data in enumerate(questions_data):
-                    content_text = (q_data.get('content') or '').strip()
-                    if content_text in existing_contents:
-                        skipped += 1
-                        continue
-                    existing_contents.add(content_text)  # prevent duplicates within this batch
-                    question_id = f"q_{now.strftime('%Y%m%d_%H%M%S')}_txt_{i}"
-                    content_en = q_data.get('content_en') or None
-                    options_en = q_data.get('options_en') or []
-                    lang = 'both' if content_en else 'zh'
-                    model = QuestionModel(
-                        question_id=question_id,
-                        question_type=q_data['type'],
-                        content=q_data['content'],
-                        options=json.dumps(q_data.get('options', []), ensure_ascii=False),
-                        answer=q_data.get('answer'),
-                        reference_answer=q_data.get('reference_answer', ''),
-                        explanation=q_data.get('explanation', ''),
-                        content_en=content_en,
-                        options_en=json.dumps(options_en, ensure_ascii=False) if options_en else None,
-                        subject=import_subject or q_data.get('subject') or None,
-                        knowledge_point=q_data.get('knowledge_point') or None,
-                        tags=q_data.get('tags') or None,
-                        difficulty=q_data.get('difficulty') or None,
-                        language=lang,
-                        metadata_json='{}',
-                        created_at=now,
-                        updated_at=now,
-                    )
-                    models.append(model)
-                db.session.add_all(models)
-                db.session.commit()
+                return jsonify({
+                    'job_id': job.job_id,
+                    'status': job.status,
+                    'status_url': f'/api/import-jobs/{job.job_id}',
+                    'events_url': f'/api/import-jobs/{job.job_id}/events',
+                }), 202
+
+            images = _import_image_writer(file.filename)
+            questions_data = _parse_import_file(file_path, file.filename, images)
+            now = datetime.now()
+            models, duplicates, near_duplicates = _import_question_batch(
+                questions_data, import_subject, _import_id_prefix(file.filename, now, batch_tag),
+                now, skip_near_dups, images=images,
+            )
+            db.session.commit()
 
             # Clean up temporary files
-            if os.path.exists(file_path):
-                os.remove(file_path)
+            _remove_import_temp(file_path)
 
             imported = len(models)
             return jsonify({
                 'message': 'Questions imported successfully',
                 'imported': imported,
                 'count': imported,   # backward compat alias
-                'skipped': skipped,
+                'skipped': len(duplicates) + sum(1 for d in near_duplicates if d['skipped']),
+                'duplicates': duplicates,
+                'near_duplicates': near_duplicates,
                 'failed': 0,
             })
         except Exception as e:
             db.session.rollback()
-            try:
-                temp_filename = f"temp_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{file.filename}"
-                file_path = os.path.join('temp', temp_filename)
-                if os.path.exists(file_path):
-                    os.remove(file_path)
-                csv_path = file_path.rsplit('.', 1)[0] + '.csv'
-                if os.path.exists(csv_path):
-                    os.remove(csv_path)
-            except:
-                pass
-
+            _remove_import_temp(file_path)
             return jsonify({'error': f'Import failed: {str(e)}'}), 500
     else:
         return jsonify({'error': 'Invalid file type'}), 400
 
 
+@bp.route('/api/import-jobs', methods=['GET'])
+def list_import_jobs():
+    """Background import jobs known to this process, newest first."""
+    return jsonify([job.to_dict() for job in import_jobs.list_jobs()])
+
+
+@bp.route('/api/import-jobs/<job_id>', methods=['GET'])
+def get_import_job(job_id):
+    job = import_jobs.get_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Import job not found'}), 404
+    return jsonify(job.to_dict())
+
+
+@bp.route('/api/import-jobs/<job_id>/events', methods=['GET'])
+def stream_import_job(job_id):
+    """Server-Sent Events: one 'progress' event per change, then 'done'."""
+    job = import_jobs.get_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Import job not found'}), 404
+
+    def events():
+        version = -1
+        while True:
+            finished = job.finished
+            if job.version != version:
+                version = job.version
+                yield f"event: progress\ndata: {_dumps(job.to_dict())}\n\n"
+            if finished:
+                yield f"event: done\ndata: {_dumps(job.to_dict())}\n\n"
+                return
+            if job.wait(version, timeout=15) == version and not job.finished:
+                yield ': keep-alive\n\n'
+
+    return Response(events(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+_EXPORT_BATCH = 500
+_EXPORT_CSV_HEADER = ['ID', 'Type', 'Content', 'Options', 'Answer', 'Reference Answer', 'Explanation', 'Language']
+_EXPORT_CSV_FIELDS = ['question_id', 'question_type', 'content', 'options', 'answer',
+                      'reference_answer', 'explanation', 'language']
+_EXPORT_MIMETYPES = {
+    'json': 'application/json',
+    'jsonl': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def _iter_export_questions(criteria, fields):
+    """Yield rows holding the columns for fields, in list order.
+
+    yield_per streams from the cursor (server-side on Postgres), so memory
+    stays flat however large the bank is.
+    """
+    stmt = db.select(*QuestionModel.columns_for(fields)).where(*criteria).order_by(
+        QuestionModel.created_at, QuestionModel.question_id
+    ).execution_options(yield_per=_EXPORT_BATCH)
+    yield from db.session.execute(stmt)
+
+
+def _export_json_chunks(rows, fields):
+    serialize = question_serializer(fields)
+    yield '{"questions": ['
+    buf = []
+    for i, row in enumerate(rows):
+        buf.append((',' if i else '') + _dumps(serialize(row)))
+        if len(buf) >= _EXPORT_BATCH:
+            yield ''.join(buf)
+            buf = []
+    buf.append(f'], "exported_at": {json.dumps(datetime.now().isoformat())}}}')
+    yield ''.join(buf)
+
+
+def _export_jsonl_chunks(rows, fields):
+    serialize = question_serializer(fields)
+    buf = []
+    for row in rows:
+        buf.append(_dumps(serialize(row)) + '\n')
+        if len(buf) >= _EXPORT_BATCH:
+            yield ''.join(buf)
+            buf = []
+    if buf:
+        yield ''.join(buf)
+
+
+def _export_csv_chunks(rows, fields):
+    """RFC 4180: CRLF line endings, fields quoted when they need it."""
+    out = io.StringIO()
+    writer = csv.writer(out, lineterminator='\r\n')
+    writer.writerow(_EXPORT_CSV_HEADER)
+    for i, q in enumerate(rows, 1):
+        options_list = json.loads(q.options) if q.options else []
+        writer.writerow([
+            q.question_id, q.question_type, q.content, '|'.join(options_list),
+            q.answer, q.reference_answer, q.explanation, q.language,
+        ])
+        if i % _EXPORT_BATCH == 0:
+            yield out.getvalue()
+            out.seek(0)
+            out.truncate()
+    yield out.getvalue()
+
+
 @bp.route('/api/questions/export', methods=['GET'])
 def export_questions():
-    """Export questions to JSON or CSV"""
+    """Stream questions as JSON, JSON Lines or CSV (accepts the list filters and ?fields=)"""
     export_format = request.args.get('format', 'json')
+    if export_format not in _EXPORT_MIMETYPES:
+        return jsonify({'error': 'Invalid export format. Use json, jsonl or csv.'}), 400
 
-    questions = QuestionModel.query.all()
-
-    if export_format == 'json':
-        filename = f"question_bank_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-        filepath = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'exports', filename)
-        os.makedirs(os.path.dirname(filepath), exist_ok=True)
-
-        data = {
-            'questions': [q.to_dict() for q in questions],
-            'exported_at': datetime.now().isoformat()
-        }
-
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-
-        return send_file(filepath, as_attachment=True)
-
-    elif export_format == 'csv':
-        filename = f"question_bank_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-        filepath = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'exports', filename)
-        os.makedirs(os.path.dirname(filepath), exist_ok=True)
-
-        with open(filepath, 'w', encoding='utf-8') as f:
-            f.write("ID,Type,Content,Options,Answer,Reference Answer,Explanation,Language\n")
-            for q in questions:
-                options_list = json.loads(q.options) if q.options else []
-                options_str = "|".join(options_list)
-                f.write(f"{q.question_id},{q.question_type},{q.content},{options_str},{q.answer},{q.reference_answer},{q.explanation},{q.language}\n")
-
-        return send_file(filepath, as_attachment=True)
-
+    if export_format == 'csv':
+        fields = _EXPORT_CSV_FIELDS
     else:
-        return jsonify({'error': 'Invalid export format. Use json or csv.'}), 400
+        try:
+            fields = _parse_fields(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+    rows = _iter_export_questions(_question_filters(request.args), fields)
+    chunks = {
+        'json': _export_json_chunks,
+        'jsonl': _export_jsonl_chunks,
+        'csv': _export_csv_chunks,
+    }[export_format](rows, fields)
+
+    filename = f"question_bank_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{export_format}"
+    return Response(
+        stream_with_context(chunks),
+        mimetype=_EXPORT_MIMETYPES[export_format],
+        headers={'Content-Disposition': f'attachment; filename={filename}'},
+    )
 
 
 # Exam Generation Routes
 @bp.route('/api/exams', methods=['GET'])
+@cached_response('exams', 'exam_questions', 'questions')
 def get_exams():
-    """Get all exams"""
-    exams = ExamModel.query.all()
-    return jsonify([e.to_dict() for e in exams])
+    """List exams as summaries, newest first.
+
+    Each item carries question_count, type_counts and total_score computed
+    by one grouped query instead of serializing every question.
+    Query params:
+      include=questions — also embed each exam's ordered questions (one
+                          batched query for the whole page)
+      limit, offset     — optional paging
+    """
+    query = ExamModel.query.order_by(ExamModel.created_at.desc(), ExamModel.exam_id)
+    try:
+        limit = int(request.args.get('limit', 0))
+        offset = int(request.args.get('offset', 0))
+    except ValueError:
+        return jsonify({'error': 'limit and offset must be integers'}), 400
+    if offset:
+        query = query.offset(offset)
+    if limit:
+        query = query.limit(limit)
+    exams = query.all()
+
+    exam_ids = [e.exam_id for e in exams]
+    type_counts = ExamModel.type_counts_for(exam_ids)
+    include = set(filter(None, request.args.get('include', '').split(',')))
+    questions = ExamModel.questions_for(exam_ids) if 'questions' in include else None
+
+    return jsonify([
+        e.to_summary_dict(
+            type_counts.get(e.exam_id, {}),
+            questions.get(e.exam_id, []) if questions is not None else None,
+        )
+        for e in exams
+    ])
 
 
 @bp.route('/api/exams', methods=['POST'])
@@ -608,15 +1355,60 @@ def remove_question_from_exam(exam_id, question_id):
     return jsonify(exam.to_dict())
 
 
+def _is_count(value):
+    return isinstance(value, int) and not isinstance(value, bool) and value >= 0
+
+
+def _is_text_list(value):
+    return isinstance(value, list) and all(isinstance(item, str) for item in value)
+
+
+def _check_generate_request(data):
+    """Error message if the generation constraints are not shaped as
+    app/assembly.py documents them, else None."""
+    config = data.get('config', {})
+    if not isinstance(config, dict):
+        return 'config must be an object'
+    for question_type, settings in config.items():
+        if not isinstance(settings, dict):
+            return f'config[{question_type!r}] must be an object'
+        for field in ('count', 'points'):
+            if settings.get(field) is not None and not _is_count(settings[field]):
+                return f'config[{question_type!r}].{field} must be a non-negative integer'
+        if settings.get('difficulty') is not None and not isinstance(settings['difficulty'], dict):
+            return f'config[{question_type!r}].difficulty must be an object'
+        if settings.get('knowledge_points') is not None and not _is_text_list(settings['knowledge_points']):
+            return f'config[{question_type!r}].knowledge_points must be a list of strings'
+    if data.get('difficulty') is not None and not isinstance(data['difficulty'], dict):
+        return 'difficulty must be an object'
+    if data.get('knowledge_points') is not None and not _is_text_list(data['knowledge_points']):
+        return 'knowledge_points must be a list of strings'
+    return None
+
+
 @bp.route('/api/exams/generate', methods=['POST'])
 def generate_exam():
-    """Generate an exam based on configuration"""
+    """Generate an exam based on configuration (see app/assembly.py)"""
     data = request.json
     name = data.get('name', f"Exam_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
     config = data.get('config', {})
     subject_filter = data.get('subject') or None
     now = datetime.now()
 
+    error = _check_generate_request(data)
+    if error:
+        return jsonify({'error': error}), 400
+    try:
+        selected, report = assemble(
+            config,
+            subject=subject_filter,
+            difficulty=data.get('difficulty'),
+            knowledge_points=data.get('knowledge_points'),
+            seed=data.get('seed'),
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
     # Create a new exam
     exam = ExamModel(
         exam_id=data.get('exam_id') or f"exam_{uuid.uuid4().hex[:8]}",
@@ -629,29 +1421,17 @@ def generate_exam():
     db.session.add(exam)
     db.session.flush()
 
-    position = 0
-    for question_type, settings in config.items():
-        count = settings.get('count', 0)
-
-        # Get unused questions of this type (strip whitespace for comparison)
-        q_query = QuestionModel.query.filter(
-            db.func.trim(QuestionModel.question_type) == question_type.strip(),
-            QuestionModel.is_used == False
-        )
-        if subject_filter:
-            q_query = q_query.filter(QuestionModel.subject == subject_filter)
-        available = q_query.limit(count).all()
-
-        for q in available:
-            db.session.execute(exam_questions.insert().values(
-                exam_id=exam.exam_id,
-                question_id=q.question_id,
-                position=position,
-            ))
-            position += 1
+    rows = [qid for ids in selected.values() for qid in ids]
+    if rows:
+        db.session.execute(exam_questions.insert(), [
+            {'exam_id': exam.exam_id, 'question_id': qid, 'position': position}
+            for position, qid in enumerate(rows)
+        ])
 
     db.session.commit()
-    return jsonify(exam.to_dict())
+    result = exam.to_dict()
+    result['assembly_report'] = report
+    return jsonify(result)
 
 
 @bp.route('/api/exams/<exam_id>/export', methods=['GET'])
@@ -677,6 +1457,59 @@ def export_exam(exam_id):
         return jsonify({'error': f'Export failed: {str(e)}'}), 500
 
 
+@bp.route('/api/exams/export-batch', methods=['POST'])
+def export_exams_batch():
+    """Export several exams, each in several variants, as one streamed ZIP.
+
+    Body: {"exam_ids": [...],
+           "variants": [{"mode": "zh"|"en"|"both", "show_answer": bool}, ...]}
+    variants defaults to [{"mode": "zh", "show_answer": true}]. Documents
+    are rendered in a process pool and added to the ZIP as they finish;
+    progress is at GET /api/exams/export-batch/<X-Export-Batch header>.
+    """
+    data = request.json or {}
+    exam_ids = _exam_id_list(data.get('exam_ids'))
+    if exam_ids is None:
+        return jsonify({'error': 'exam_ids must be a non-empty list of exam IDs'}), 400
+    try:
+        variants = batch_export.parse_variants(data.get('variants'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if len(exam_ids) * len(variants) > batch_export.MAX_FILES:
+        return jsonify({'error': f'At most {batch_export.MAX_FILES} documents per batch'}), 400
+
+    exams = {e.exam_id: e for e in ExamModel.query.filter(ExamModel.exam_id.in_(exam_ids))}
+    missing = [eid for eid in exam_ids if eid not in exams]
+    if missing:
+        return jsonify({'error': 'Exam not found', 'missing': missing}), 404
+
+    course_settings = CourseSettingsModel.query.first()
+    snapshots = [snapshot_exam(exams[eid], course_settings) for eid in exam_ids]
+    names = batch_export.file_names(snapshots, variants)
+    tasks = [(names[(snap.exam_id, mode, show_answer)], snap, mode, show_answer)
+             for snap in snapshots for mode, show_answer in variants]
+
+    batch = batch_export.register(batch_export.ExportBatch(len(tasks)))
+    workers = current_app.config.get('EXPORT_WORKERS', batch_export.default_workers())
+    return Response(
+        batch_export.stream_zip(batch, tasks, workers),
+        mimetype='application/zip',
+        headers={
+            'Content-Disposition': (f"attachment; filename=exams_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"),
+            'X-Export-Batch': batch.batch_id,
+            'X-Export-Total': str(len(tasks)),
+        },
+    )
+
+
+@bp.route('/api/exams/export-batch/<batch_id>', methods=['GET'])
+def get_export_batch(batch_id):
+    batch = batch_export.get_batch(batch_id)
+    if batch is None:
+        return jsonify({'error': 'Export batch not found'}), 404
+    return jsonify(batch.to_dict())
+
+
 # Template Download Routes
 @bp.route('/api/templates/download', methods=['GET'])
 def download_template():
@@ -695,6 +1528,7 @@ def download_template():
 
 # Question Type Management Routes
 @bp.route('/api/question-types', methods=['GET'])
+@cached_response('question_types')
 def get_question_types():
     """Get all question types ordered by id"""
     types = QuestionTypeModel.query.order_by(QuestionTypeModel.id).all()
@@ -825,6 +1659,38 @@ def replace_question_in_exam(exam_id):
 
 
 # Final Exam Confirmation Routes
+def _mark_exam_questions(exam_ids, used, now=None):
+    """Set is_used/used_date on every question in the given exams.
+
+    One UPDATE ... WHERE question_id IN (SELECT ... FROM exam_questions)
+    statement; returns the number of question rows changed.
+    """
+    result = db.session.execute(
+        update(QuestionModel)
+        .where(QuestionModel.question_id.in_(
+            db.select(exam_questions.c.question_id)
+            .where(exam_questions.c.exam_id.in_(exam_ids))
+        ))
+        .values(is_used=used, used_date=now if used else None)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount
+
+
+def _confirmation_response(exam, message, question_count):
+    """Counts by default; the full exam only with ?include=exam."""
+    body = {
+        'message': message,
+        'exam_id': exam.exam_id,
+        'is_confirmed': exam.is_confirmed,
+        'confirmed_at': exam.confirmed_at.isoformat() if exam.confirmed_at else None,
+        'question_count': question_count,
+    }
+    if request.args.get('include') == 'exam':
+        body['exam'] = exam.to_dict()
+    return jsonify(body)
+
+
 @bp.route('/api/exams/<exam_id>/confirm', methods=['POST'])
 def confirm_exam(exam_id):
     """Confirm the exam and mark all questions as permanently used"""
@@ -833,16 +1699,13 @@ def confirm_exam(exam_id):
         return jsonify({'error': 'Exam not found'}), 404
 
     now = datetime.now()
-    for q in exam.get_ordered_questions():
-        q.is_used = True
-        q.used_date = now
-
+    marked = _mark_exam_questions([exam_id], True, now)
     exam.is_confirmed = True
     exam.confirmed_at = now
     exam.updated_at = now
     db.session.commit()
 
-    return jsonify({'message': 'Exam confirmed successfully', 'exam': exam.to_dict()})
+    return _confirmation_response(exam, 'Exam confirmed successfully', marked)
 
 
 @bp.route('/api/exams/<exam_id>/revert_confirmation', methods=['POST'])
@@ -852,16 +1715,52 @@ def revert_exam_confirmation(exam_id):
     if not exam:
         return jsonify({'error': 'Exam not found'}), 404
 
-    for q in exam.get_ordered_questions():
-        q.is_used = False
-        q.used_date = None
-
+    marked = _mark_exam_questions([exam_id], False)
     exam.is_confirmed = False
     exam.confirmed_at = None
     exam.updated_at = datetime.now()
     db.session.commit()
 
-    return jsonify({'message': 'Exam confirmation reverted successfully', 'exam': exam.to_dict()})
+    return _confirmation_response(exam, 'Exam confirmation reverted successfully', marked)
+
+
+def _exam_id_list(raw):
+    """raw without repeats if it is a non-empty list of non-empty strings, else None."""
+    if not isinstance(raw, list) or not raw or not all(isinstance(eid, str) and eid for eid in raw):
+        return None
+    return list(dict.fromkeys(raw))
+
+
+@bp.route('/api/exams/batch-confirm', methods=['POST'])
+def batch_confirm_exams():
+    """Confirm many exams in one transaction"""
+    data = request.json or {}
+    exam_ids = _exam_id_list(data.get('exam_ids'))
+    if exam_ids is None:
+        return jsonify({'error': 'exam_ids must be a non-empty list of exam IDs'}), 400
+
+    found = set(db.session.scalars(
+        db.select(ExamModel.exam_id).where(ExamModel.exam_id.in_(exam_ids))
+    ))
+    missing = [eid for eid in exam_ids if eid not in found]
+    if missing:
+        return jsonify({'error': 'Exam not found', 'missing': missing}), 404
+
+    now = datetime.now()
+    marked = _mark_exam_questions(exam_ids, True, now)
+    db.session.execute(
+        update(ExamModel)
+        .where(ExamModel.exam_id.in_(exam_ids))
+        .values(is_confirmed=True, confirmed_at=now, updated_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
+    return jsonify({
+        'message': f'{len(exam_ids)} exams confirmed',
+        'confirmed_count': len(exam_ids),
+        'question_count': marked,
+    })
 
 
 # Usage Management Routes
@@ -875,12 +1774,16 @@ def batch_release_questions():
         return jsonify({'error': 'No question IDs provided'}), 400
 
     released = 0
-    for qid in question_ids:
-        q = db.session.get(QuestionModel, qid)
-        if q and q.is_used:
-            q.is_used = False
-            q.used_date = None
-            released += 1
+    for i in range(0, len(question_ids), _IN_CHUNK):
+        released += db.session.execute(
+            update(QuestionModel)
+            .where(
+                QuestionModel.question_id.in_(question_ids[i:i + _IN_CHUNK]),
+                QuestionModel.is_used == True,
+            )
+            .values(is_used=False, used_date=None)
+            .execution_options(synchronize_session=False)
+        ).rowcount
 
     db.session.commit()
     return jsonify({'message': f'{released} questions released', 'released_count': released})
@@ -898,6 +1801,7 @@ def _get_or_create_course_settings():
 
 
 @bp.route('/api/course-settings', methods=['GET'])
+@cached_response('course_settings')
 def get_course_settings():
     """Get course settings"""
     settings = _get_or_create_course_settings()
@@ -0,0 +1,126 @@
+"""search.py — SQLite FTS5 full-text index over the question bank.
+
+Maintains a ``questions_fts`` virtual table (trigram tokenizer, so Chinese
+text needs no word segmentation) covering content, content_en,
+knowledge_point, tags and explanation.  Triggers on ``questions`` keep it in
+sync for every write path, including bulk ``query.update()`` / ``delete()``
+calls that bypass ORM events.
+
+Trigram matching needs at least three characters; shorter keywords, and
+databases without FTS5 (or non-SQLite engines), fall back to ``LIKE`` over
+the same columns.
+"""
+from flask import current_app
+from sqlalchemy import text, table, column, literal_column, or_
+
+from app.db_models import db, QuestionModel
+
+FTS_TABLE = 'questions_fts'
+FTS_COLUMNS = ('content', 'content_en', 'knowledge_point', 'tags', 'explanation')
+_MIN_TRIGRAM_LEN = 3
+
+_fts = table(FTS_TABLE, column('question_id'))
+_fts_ref = literal_column(FTS_TABLE)
+
+_cols = ', '.join(FTS_COLUMNS)
+_new_vals = ', '.join(f'new.{c}' for c in FTS_COLUMNS)
+
+_DDL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    f"question_id UNINDEXED, {_cols}, tokenize='trigram')",
+    f"CREATE TRIGGER IF NOT EXISTS questions_fts_ai AFTER INSERT ON questions BEGIN "
+    f"INSERT INTO {FTS_TABLE}(question_id, {_cols}) VALUES (new.question_id, {_new_vals}); END",
+    f"CREATE TRIGGER IF NOT EXISTS questions_fts_ad AFTER DELETE ON questions BEGIN "
+    f"DELETE FROM {FTS_TABLE} WHERE question_id = old.question_id; END",
+    # Only re-index when an indexed column (or the key) changes, so usage
+    # flag flips and type changes don't churn the index.
+    f"CREATE TRIGGER IF NOT EXISTS questions_fts_au AFTER UPDATE OF question_id, {_cols} "
+    f"ON questions BEGIN "
+    f"DELETE FROM {FTS_TABLE} WHERE question_id = old.question_id; "
+    f"INSERT INTO {FTS_TABLE}(question_id, {_cols}) VALUES (new.question_id, {_new_vals}); END",
+]
+
+
+def ensure_fts_index(app) -> bool:
+    """Create the FTS table and sync triggers if missing; backfill on first run.
+
+    Records availability in app.extensions['question_fts'] and returns it.
+    """
+    available = False
+    if db.engine.dialect.name == 'sqlite':
+        try:
+            with db.engine.connect() as conn:
+                existed = conn.execute(
+                    text("SELECT 1 FROM sqlite_master WHERE name = :n"), {'n': FTS_TABLE}
+                ).first() is not None
+                for stmt in _DDL:
+                    conn.execute(text(stmt))
+                if not existed:
+                    conn.execute(text(
+                        f"INSERT INTO {FTS_TABLE}(question_id, {_cols}) "
+                        f"SELECT question_id, {_cols} FROM questions"
+                    ))
+                conn.commit()
+            available = True
+        except Exception:
+            available = False  # SQLite built without FTS5 / trigram tokenizer
+    app.extensions['question_fts'] = available
+    return available
+
+
+def fts_available() -> bool:
+    return current_app.extensions.get('question_fts', False)
+
+
+def _match_phrase(keyword: str) -> str:
+    """Quote keyword as a single FTS5 phrase so operators/punctuation are literal."""
+    return '"' + keyword.replace('"', '""') + '"'
+
+
+def _can_match(keyword: str) -> bool:
+    return fts_available() and len(keyword.strip()) >= _MIN_TRIGRAM_LEN
+
+
+def _like_criterion(keyword: str, column_name: str = None):
+    """LIKE fallback over the columns the FTS index would have searched."""
+    names = (column_name,) if column_name else FTS_COLUMNS
+    return or_(*(getattr(QuestionModel, name).contains(keyword) for name in names))
+
+
+def keyword_criterion(keyword: str, column_name: str = None):
+    """Filter criterion for questions matching keyword.
+
+    column_name restricts the match to one indexed column (e.g.
+    'knowledge_point'); otherwise all indexed columns are searched.
+    """
+    keyword = keyword.strip()
+    if not _can_match(keyword):
+        return _like_criterion(keyword, column_name)
+    expr = _match_phrase(keyword)
+    if column_name:
+        expr = f'{{{column_name}}} : {expr}'
+    return QuestionModel.question_id.in_(
+        db.select(_fts.c.question_id).where(_fts_ref.op('MATCH')(expr))
+    )
+
+
+def ranked_search(keyword: str, criteria=(), limit: int = 20):
+    """Return [(QuestionModel, snippet_html)] ranked by BM25 relevance.
+
+    snippet_html wraps matched text in <mark>…</mark>.  Without a usable
+    FTS index the results are LIKE matches in (created_at, question_id)
+    order, with no snippet.
+    """
+    keyword = keyword.strip()
+    if not _can_match(keyword):
+        rows = QuestionModel.query.filter(
+            _like_criterion(keyword), *criteria
+        ).order_by(QuestionModel.created_at, QuestionModel.question_id).limit(limit).all()
+        return [(q, None) for q in rows]
+
+    snippet = db.func.snippet(_fts_ref, -1, '<mark>', '</mark>', '…', 16)
+    return db.session.query(QuestionModel, snippet).join(
+        _fts, _fts.c.question_id == QuestionModel.question_id
+    ).filter(
+        _fts_ref.op('MATCH')(_match_phrase(keyword)), *criteria
+    ).order_by(db.func.bm25(_fts_ref)).limit(limit).all()
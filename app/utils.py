@@ -1,6 +1,15 @@
 import os
+import io
+import copy
 import json
 import uuid
+import itertools
+import threading
+import weakref
+from collections import Counter, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from types import SimpleNamespace
 from html.parser import HTMLParser
 from werkzeug.utils import secure_filename
 from docx import Document
@@ -9,8 +18,22 @@ from docx.enum.text import WD_ALIGN_PARAGRAPH
 from docx.enum.style import WD_STYLE_TYPE
 from docx.oxml.ns import qn, nsdecls
 from docx.oxml import parse_xml
+from docx.oxml.shape import CT_Inline
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.image.image import BaseImageHeader, Image as DocxImage
+from docx.opc.packuri import PackURI
+from docx.opc.part import XmlPart
+from docx.package import Package
+from docx.parts.image import ImagePart
 import csv
 import re
+import html
+import hashlib
+import shutil
+import tempfile
+import unicodedata
+
+from app.cache import LRUCache
 
 # Directory for storing question images on disk
 _HERE = os.path.dirname(os.path.abspath(__file__))
@@ -24,57 +47,549 @@ def allowed_file(filename):
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
-def save_image_file(image_bytes: bytes, content_type: str,
+_TAG_RE = re.compile(r'<[^>]+>')
+_INLINE_TAG_RE = re.compile(r'</?(?:a|b|i|u|s|em|strong|span|sub|sup|font|mark)\b[^>]*>', re.IGNORECASE)
+_IMG_TAG_RE = re.compile(r'<img\b[^>]*>', re.IGNORECASE)
+_IMG_SRC_RE = re.compile(r'\bsrc\s*=\s*["\']?([^"\'\s>]*)', re.IGNORECASE)
+_STORE_SRC_RE = re.compile(r'/api/images/([\w-]+)')
+_CJK = r'\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef'
+_CJK_SPACE_RE = re.compile(rf'\s+(?=[{_CJK}])|(?<=[{_CJK}])\s+')
+_SPACE_RE = re.compile(r'\s+')
+
+
+def normalize_question_text(text: str, images=None) -> str:
+    """Reduce question text to a canonical form for duplicate detection.
+
+    Strips HTML tags (inline formatting vanishes, block tags become spaces),
+    unescapes entities, applies NFKC so full-width and half-width
+    punctuation compare equal, and case-folds. Whitespace touching CJK
+    characters is dropped (it carries no meaning in Chinese text);
+    whitespace between Latin words collapses to a single space.
+
+    Images become [img:<key>] so questions that differ only by their figure
+    stay distinct.  The key is images[image_id] when given (the blob's
+    sha256, see image_identities, so a re-imported figure matches the
+    stored one despite its fresh image_id), else the image_id or src.
+    """
+    if not text:
+        return ''
+    text = _IMG_TAG_RE.sub(lambda m: _image_token(m.group(0), images or {}), text)
+    text = _INLINE_TAG_RE.sub('', text)
+    text = _TAG_RE.sub(' ', text)
+    text = unicodedata.normalize('NFKC', html.unescape(text)).casefold()
+    text = _CJK_SPACE_RE.sub('', text)
+    return _SPACE_RE.sub(' ', text).strip()
+
+
+def _image_token(tag, images):
+    src = _IMG_SRC_RE.search(tag)
+    src = src.group(1) if src else ''
+    stored = _STORE_SRC_RE.search(src)
+    key = images.get(stored.group(1), stored.group(1)) if stored else src
+    return f' [img:{key}] '
+
+
+def content_hash(text: str, images=None) -> str:
+    """SHA-256 hex digest of normalize_question_text(text, images)."""
+    return hashlib.sha256(normalize_question_text(text, images).encode('utf-8')).hexdigest()
+
+
+def image_identities(executor, texts) -> dict:
+    """Map the stored image_ids referenced in texts to their blob sha256.
+
+    executor is a Session or Connection.  Pass the result to content_hash.
+    """
+    from sqlalchemy import select
+    from app.db_models import QuestionImageModel
+    images = QuestionImageModel.__table__
+    ids = list({image_id for text in texts if text for image_id in _STORE_SRC_RE.findall(text)})
+    found = {}
+    for i in range(0, len(ids), 500):
+        found.update(executor.execute(
+            select(images.c.image_id, images.c.sha256)
+            .where(images.c.image_id.in_(ids[i:i + 500]), images.c.sha256.isnot(None))
+        ).all())
+    return found
+
+
+# ── Content-addressed image store ────────────────────────────────────────────
+#
+# Image bytes are stored once per distinct content, under their SHA-256:
+# uploads/images/<first two hex digits>/<sha256><ext>.  Every upload or
+# imported figure still gets its own image_id (a question_images row), but
+# that row is only an alias of an image_blobs row, whose ref_count says how
+# many aliases it has.  Releasing the last alias deletes the blob and its
+# file.  The hash is computed before anything is written, so saving bytes
+# the store already holds costs no disk writes.  Rows from before this
+# layout have no sha256 and own their flat file outright.
+#
+# Blob rows are read and updated with Core statements through whatever
+# executes them (a Session, or a Connection during migrations), so ref
+# counts change atomically in SQL.
+
+_IMAGE_EXTENSIONS = {
+    'image/png': '.png', 'image/jpeg': '.jpg', 'image/jpg': '.jpg',
+    'image/gif': '.gif', 'image/bmp': '.bmp', 'image/webp': '.webp',
+}
+_HASH_CHUNK_SIZE = 64 * 1024
+
+
+def _blob_table():
+    from app.db_models import ImageBlobModel
+    return ImageBlobModel.__table__
+
+
+def _hash_image(source):
+    """(sha256, size, spool_path) of bytes or a binary stream.
+
+    Seekable streams are hashed and rewound; others are copied to a spool
+    file while hashing, since they cannot be read twice.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return hashlib.sha256(source).hexdigest(), len(source), None
+    digest = hashlib.sha256()
+    size = 0
+    chunks = iter(lambda: source.read(_HASH_CHUNK_SIZE), b'')
+    if source.seekable():
+        start = source.tell()
+        for chunk in chunks:
+            digest.update(chunk)
+            size += len(chunk)
+        source.seek(start)
+        return digest.hexdigest(), size, None
+    os.makedirs(_IMAGES_DIR, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=_IMAGES_DIR, suffix='.part', delete=False) as spool:
+        for chunk in chunks:
+            digest.update(chunk)
+            size += len(chunk)
+            spool.write(chunk)
+    return digest.hexdigest(), size, spool.name
+
+
+def _write_blob_file(path, source, spool):
+    """Create path from source atomically: the store never shows a partial file."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if spool is None:
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), suffix='.part',
+                                         delete=False) as f:
+            if isinstance(source, (bytes, bytearray, memoryview)):
+                f.write(source)
+            else:
+                shutil.copyfileobj(source, f, _HASH_CHUNK_SIZE)
+        spool = f.name
+    os.replace(spool, path)
+
+
+_upsert_statements = {}
+
+
+def _upsert_blobs(executor, rows):
+    """Add blob rows, or count more references to existing ones.
+
+    rows: dicts of image_blobs columns, one per distinct sha256, whose
+    ref_count is the number of references being added.  Returns
+    {sha256: stored filename}.  On SQLite and PostgreSQL this is one
+    INSERT ... ON CONFLICT for all rows, which is also safe against two
+    requests storing the same new content at once.
+    """
+    from sqlalchemy import insert, select, update
+    blobs = _blob_table()
+
+    dialect = executor.get_bind().dialect.name if hasattr(executor, 'get_bind') \
+        else executor.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        stmt = _upsert_statements.get(dialect)
+        if stmt is None:
+            if dialect == 'sqlite':
+                from sqlalchemy.dialects.sqlite import insert as dialect_insert
+            else:
+                from sqlalchemy.dialects.postgresql import insert as dialect_insert
+            stmt = dialect_insert(blobs)
+            stmt = _upsert_statements[dialect] = stmt.on_conflict_do_update(
+                index_elements=[blobs.c.sha256],
+                set_={'ref_count': blobs.c.ref_count + stmt.excluded.ref_count},
+            ).returning(blobs.c.sha256, blobs.c.filename)
+        result = executor.execute(stmt, rows[0] if len(rows) == 1 else rows)
+        return dict(result.all())
+
+    stored = {}
+    for values in rows:
+        sha256 = values['sha256']
+        row = executor.execute(select(blobs.c.filename).where(blobs.c.sha256 == sha256)).first()
+        if row is None:
+            executor.execute(insert(blobs).values(**values))
+            stored[sha256] = values['filename']
+            continue
+        executor.execute(update(blobs).where(blobs.c.sha256 == sha256)
+                         .values(ref_count=blobs.c.ref_count + values['ref_count']))
+        stored[sha256] = row.filename
+    return stored
+
+
+def _upsert_blob(executor, sha256, filename, content_type, size):
+    """Add a blob row, or count one more reference to an existing one.
+
+    Returns the blob's stored filename.
+    """
+    return _upsert_blobs(executor, [dict(
+        sha256=sha256, filename=filename, content_type=content_type or 'image/png',
+        file_size=size, ref_count=1, created_at=datetime.now())])[sha256]
+
+
+def _put_blob(executor, source, content_type):
+    """Store source unless its content is already stored, and count one more
+    reference to it.  Returns (sha256, filename, size)."""
+    sha256, size, spool = _hash_image(source)
+    ext = _IMAGE_EXTENSIONS.get((content_type or '').lower(), '.png')
+    filename = _upsert_blob(executor, sha256, f'{sha256[:2]}/{sha256}{ext}', content_type, size)
+    path = image_path(filename)
+    if _reuse_blob_file(path):
+        if spool:
+            os.remove(spool)
+    else:
+        from app import image_derivatives
+        _write_blob_file(path, source, spool)
+        image_derivatives.schedule(path)
+    return sha256, filename, size
+
+
+def _reuse_blob_file(path):
+    """Whether the store file at path exists; touches it if so, so that
+    image_gc's sweep treats it as fresh until its blob row is committed."""
+    try:
+        os.utime(path)
+        return True
+    except OSError:
+        return False
+
+
+def _release_blobs(executor, sha256s):
+    """Drop one reference per entry of sha256s; delete blobs left unreferenced.
+
+    Returns the number of blobs deleted.
+    """
+    from sqlalchemy import bindparam, delete, select, update
+    blobs = _blob_table()
+
+    counts = Counter(sha for sha in sha256s if sha)
+    if not counts:
+        return 0
+    executor.execute(
+        update(blobs).where(blobs.c.sha256 == bindparam('b_sha256'))
+        .values(ref_count=blobs.c.ref_count - bindparam('b_released')),
+        [{'b_sha256': sha256, 'b_released': n} for sha256, n in counts.items()])
+    dead = []
+    shas = list(counts)
+    for i in range(0, len(shas), 500):
+        dead += executor.execute(select(blobs.c.sha256, blobs.c.filename).where(
+            blobs.c.sha256.in_(shas[i:i + 500]), blobs.c.ref_count <= 0)).all()
+    for i in range(0, len(dead), 500):
+        executor.execute(delete(blobs).where(
+            blobs.c.sha256.in_([row.sha256 for row in dead[i:i + 500]])))
+    remove_image_files_on_commit(executor, [row.filename for row in dead])
+    return len(dead)
+
+
+def image_path(filename):
+    """Absolute path of a stored image file (QuestionImageModel.filename)."""
+    return os.path.join(_IMAGES_DIR, filename)
+
+
+def _remove_image_file(filename):
+    from app import image_derivatives
+    path = image_path(filename)
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+    image_derivatives.remove_derivatives(path)
+
+
+def remove_image_files_on_commit(executor, filenames):
+    """Remove stored image files once executor's transaction commits.
+
+    executor is a Session or Connection.  Removing them before the commit
+    would leave rows pointing at missing files if the transaction rolled
+    back; on rollback the files are kept and the list is dropped.
+    """
+    from sqlalchemy import event
+    from sqlalchemy.orm import Session, scoped_session
+    filenames = list(filenames)
+    if not filenames:
+        return
+    if isinstance(executor, scoped_session):
+        executor = executor()
+    doomed = executor.info.get('doomed_image_files')
+    if doomed is not None:
+        doomed.extend(filenames)
+        return
+    executor.info['doomed_image_files'] = filenames
+    commit_event, rollback_event = (('after_commit', 'after_rollback') if isinstance(executor, Session)
+                                    else ('commit', 'rollback'))
+
+    def on_commit(target):
+        event.remove(executor, rollback_event, on_rollback)
+        for name in executor.info.pop('doomed_image_files', ()):
+            _remove_image_file(name)
+
+    def on_rollback(target):
+        event.remove(executor, commit_event, on_commit)
+        executor.info.pop('doomed_image_files', None)
+
+    event.listen(executor, commit_event, on_commit, once=True)
+    event.listen(executor, rollback_event, on_rollback, once=True)
+
+
+# image_id → what serving it needs.  An alias row never changes after it is
+# written (new content always gets a new image_id), so entries only go
+# stale when the image is deleted.
+_IMAGE_FILE_CACHE_SIZE = 4096
+_image_file_cache = LRUCache(_IMAGE_FILE_CACHE_SIZE)
+
+_ImageFile = namedtuple('_ImageFile', 'path content_type sha256')
+
+
+def image_file(image_id):
+    """_ImageFile(path, content_type, sha256) for image_id, or None if unknown.
+
+    sha256 is None for images not (yet) in the content-addressed store.
+    """
+    from app.db_models import db, QuestionImageModel
+
+    cached = _image_file_cache.get(image_id)
+    if cached is None:
+        row = db.session.query(
+            QuestionImageModel.filename, QuestionImageModel.content_type, QuestionImageModel.sha256,
+        ).filter_by(image_id=image_id).first()
+        if row is None:
+            return None
+        cached = _ImageFile(image_path(row.filename), row.content_type or 'image/png', row.sha256)
+        _image_file_cache.put(image_id, cached)
+    return cached
+
+
+def forget_image(image_id):
+    """Drop image_id from the in-process lookup caches."""
+    _image_file_cache.discard(image_id)
+    _image_info_cache.discard(image_id)
+
+
+def save_image_file(image_data, content_type: str,
                     question_id=None, field: str = 'content') -> str:
-    """Save an image to disk and create a QuestionImageModel record.
+    """Store an image and create a QuestionImageModel record for it.
 
+    image_data: bytes or a binary stream.
     Returns the image_id string (e.g. 'img_abc12345').
     The DB record is flushed but NOT committed — caller must commit.
     """
     from app.db_models import db, QuestionImageModel
 
-    # Determine extension from content_type
-    ext_map = {
-        'image/png': '.png', 'image/jpeg': '.jpg', 'image/jpg': '.jpg',
-        'image/gif': '.gif', 'image/bmp': '.bmp', 'image/webp': '.webp',
-    }
-    ext = ext_map.get((content_type or '').lower(), '.png')
-
+    sha256, filename, size = _put_blob(db.session, image_data, content_type)
     image_id = 'img_' + uuid.uuid4().hex[:8]
-    filename = image_id + ext
-
-    os.makedirs(_IMAGES_DIR, exist_ok=True)
-    filepath = os.path.join(_IMAGES_DIR, filename)
-    with open(filepath, 'wb') as f:
-        f.write(image_bytes)
-
     record = QuestionImageModel(
         image_id=image_id,
         question_id=question_id,
         field=field,
+        sha256=sha256,
         filename=filename,
         content_type=content_type or 'image/png',
-        file_size=len(image_bytes),
+        file_size=size,
     )
     db.session.add(record)
     db.session.flush()
     return image_id
 
 
-def delete_question_images(question_id: str) -> None:
-    """Delete all image files and DB records associated with question_id.
+_image_writer_pool = None
+_image_writer_lock = threading.Lock()
 
-    Caller must commit after this call.
+
+def _image_writer():
+    global _image_writer_pool
+    with _image_writer_lock:
+        if _image_writer_pool is None:
+            workers = 4
+            try:
+                from flask import current_app
+                workers = current_app.config.get('IMPORT_IMAGE_WORKERS', workers)
+            except RuntimeError:  # outside an app context (scripts)
+                pass
+            _image_writer_pool = ThreadPoolExecutor(max_workers=workers,
+                                                    thread_name_prefix='image-writer')
+        return _image_writer_pool
+
+
+def _stage_blob_file(image_data, content_type):
+    """Hash image bytes and write their store file unless it exists.
+
+    Runs on the image writer pool, without touching the database.
+    Returns (sha256, filename, size, created).
+    """
+    sha256, size, spool = _hash_image(image_data)
+    ext = _IMAGE_EXTENSIONS.get((content_type or '').lower(), '.png')
+    filename = f'{sha256[:2]}/{sha256}{ext}'
+    path = image_path(filename)
+    if _reuse_blob_file(path):
+        if spool:
+            os.remove(spool)
+        return sha256, filename, size, False
+    _write_blob_file(path, image_data, spool)
+    return sha256, filename, size, True
+
+
+class DeferredImageWriter:
+    """Image saves of one import, written in the background, recorded per batch.
+
+    save() stands in for save_image_file as a parser's save_image_fn: it
+    returns a new image_id at once and queues the bytes on a thread pool
+    (IMPORT_IMAGE_WORKERS), which hashes them and writes the store file
+    while parsing goes on.  persist() then records everything queued so
+    far with one blob upsert and one question_images insert, each row
+    already owned by its question.  Images no inserted question uses get
+    no rows, and the files written for them are removed.
     """
+
+    def __init__(self):
+        self._pending = {}   # image_id -> (Future, content_type)
+
+    def save(self, image_data, content_type):
+        image_id = 'img_' + uuid.uuid4().hex[:8]
+        self._pending[image_id] = (_image_writer().submit(_stage_blob_file, image_data, content_type),
+                                   content_type or 'image/png')
+        return image_id
+
+    def identities(self) -> dict:
+        """{image_id: sha256} of the queued images, waiting for their hashes."""
+        return {image_id: future.result()[0] for image_id, (future, _) in self._pending.items()}
+
+    def persist(self, owners) -> int:
+        """Record the queued images that owners ({image_id: question_id}) names.
+
+        Waits for their files, drops the rest of the queue and returns the
+        number of rows inserted.  Does NOT commit — caller must commit.
+        Files written only for dropped images are removed once it does.
+        """
+        from sqlalchemy import insert, select
+        from app import image_derivatives
+        from app.db_models import db, QuestionImageModel
+
+        pending, self._pending = self._pending, {}
+        results = [(image_id, future.result(), content_type)
+                   for image_id, (future, content_type) in pending.items()]
+        staged = [r for r in results if r[0] in owners]
+        kept = {sha256 for _, (sha256, _, _, _), _ in staged}
+        dropped = {sha256: filename for image_id, (sha256, filename, _, created), _ in results
+                   if created and image_id not in owners and sha256 not in kept}
+        if dropped:
+            blobs = _blob_table()
+            known = set(db.session.scalars(
+                select(blobs.c.sha256).where(blobs.c.sha256.in_(list(dropped)))))
+            remove_image_files_on_commit(
+                db.session, [f for sha256, f in dropped.items() if sha256 not in known])
+        if not staged:
+            return 0
+
+        now = datetime.now()
+        blobs = {}
+        for _, (sha256, filename, size, _), content_type in staged:
+            if sha256 in blobs:
+                blobs[sha256]['ref_count'] += 1
+            else:
+                blobs[sha256] = dict(sha256=sha256, filename=filename, content_type=content_type,
+                                     file_size=size, ref_count=1, created_at=now)
+        stored = _upsert_blobs(db.session, list(blobs.values()))
+        for sha256, values in blobs.items():
+            path = image_path(stored[sha256])
+            if stored[sha256] != values['filename'] and not os.path.exists(path):
+                # Stored earlier under another extension, and its file is gone
+                os.replace(image_path(values['filename']), path)
+        for sha256 in {sha256 for _, (sha256, _, _, created), _ in staged if created}:
+            image_derivatives.schedule(image_path(stored[sha256]))
+
+        db.session.execute(insert(QuestionImageModel), [
+            dict(image_id=image_id, question_id=owners[image_id], field='content', sha256=sha256,
+                 filename=stored[sha256], content_type=content_type, file_size=size, created_at=now)
+            for image_id, (sha256, _, size, _), content_type in staged
+        ])
+        return len(staged)
+
+
+def _image_rows(condition):
+    """(id, image_id, sha256, filename) of question_images rows matching condition."""
     from app.db_models import db, QuestionImageModel
+    images = QuestionImageModel.__table__
+    return db.session.execute(db.select(
+        images.c.id, images.c.image_id, images.c.sha256, images.c.filename).where(condition)).all()
+
 
-    records = QuestionImageModel.query.filter_by(question_id=question_id).all()
+def delete_image_records(records) -> int:
+    """Delete question_images rows and release their stored files.
+
+    records: QuestionImageModel instances or rows with id, image_id,
+    sha256 and filename.  Returns the number of blobs deleted.
+    Caller must commit after this call; files go once it does.
+    """
+    from app.db_models import db, QuestionImageModel
+    images = QuestionImageModel.__table__
+
+    ids = [rec.id for rec in records]
+    for i in range(0, len(ids), 500):
+        db.session.execute(images.delete().where(images.c.id.in_(ids[i:i + 500])))
     for rec in records:
+        if isinstance(rec, QuestionImageModel):
+            db.session.expunge(rec)
+        forget_image(rec.image_id)
+    remove_image_files_on_commit(db.session, [rec.filename for rec in records if rec.sha256 is None])
+    return _release_blobs(db.session, [rec.sha256 for rec in records])
+
+
+def delete_question_images(question_ids) -> int:
+    """Delete the images of one question ID or a list of them and release
+    their files, resolving them with one IN query per 500 IDs.
+
+    Returns the number of image records deleted.
+    Caller must commit after this call.
+    """
+    from app.db_models import QuestionImageModel
+    images = QuestionImageModel.__table__
+
+    if isinstance(question_ids, str):
+        question_ids = [question_ids]
+    question_ids = list(question_ids)
+    rows = []
+    for i in range(0, len(question_ids), 500):
+        rows += _image_rows(images.c.question_id.in_(question_ids[i:i + 500]))
+    delete_image_records(rows)
+    return len(rows)
+
+
+def adopt_legacy_images(conn):
+    """Move image files saved before the content-addressed store into it.
+
+    Idempotent: only rows without a sha256 are touched, and rows whose
+    file is missing are left alone.  The old flat files are removed once
+    conn's transaction commits.
+    """
+    from sqlalchemy import select, update
+    from app.db_models import QuestionImageModel
+    images = QuestionImageModel.__table__
+
+    rows = conn.execute(select(images.c.id, images.c.filename, images.c.content_type)
+                        .where(images.c.sha256.is_(None))).all()
+    replaced = []
+    for row in rows:
         try:
-            os.remove(os.path.join(_IMAGES_DIR, rec.filename))
+            f = open(image_path(row.filename), 'rb')
         except OSError:
-            pass
-        db.session.delete(rec)
+            continue
+        with f:
+            sha256, filename, size = _put_blob(conn, f, row.content_type)
+        conn.execute(update(images).where(images.c.id == row.id).values(
+            sha256=sha256, filename=filename, file_size=size))
+        if filename != row.filename:
+            replaced.append(row.filename)
+    remove_image_files_on_commit(conn, replaced)
+    return len(rows)
 
 
 def _associate_images_in_html(html_content: str, question_id: str) -> None:
@@ -96,6 +611,189 @@ def _associate_images_in_html(html_content: str, question_id: str) -> None:
         ).update({'question_id': question_id}, synchronize_session=False)
 
 
+def _associate_images_bulk(question_html) -> int:
+    """Batched _associate_images_in_html for many questions.
+
+    question_html: iterable of (question_id, html). One lookup and one
+    executemany UPDATE for the whole batch; returns images associated.
+    Does NOT commit — caller must commit.
+    """
+    from sqlalchemy import update
+    from app.db_models import db, QuestionImageModel
+
+    owner = {}
+    for question_id, html in question_html:
+        for img_id in re.findall(r'/api/images/(img_[a-f0-9]+)', html or ''):
+            owner.setdefault(img_id, question_id)
+    if not owner:
+        return 0
+    ids = list(owner)
+    rows = []
+    for i in range(0, len(ids), 500):
+        rows += db.session.query(QuestionImageModel.id, QuestionImageModel.image_id).filter(
+            QuestionImageModel.image_id.in_(ids[i:i + 500]),
+            QuestionImageModel.question_id.is_(None)
+        ).all()
+    if rows:
+        db.session.execute(update(QuestionImageModel), [
+            {'id': pk, 'question_id': owner[image_id]} for pk, image_id in rows
+        ])
+    return len(rows)
+
+
+
+
+# ── Image lookup for export ──────────────────────────────────────────────────
+#
+# Image files are immutable once saved, so what export needs to know about
+# one — its file name and decoded header (pixel size, DPI, content type) —
+# is kept in a process-wide cache keyed by image_id.  prefetch_images()
+# resolves every uncached ID of a paper in one query; after that, inserting
+# an image only reads its bytes.
+
+_IMAGE_INFO_CACHE_SIZE = 4096
+_image_info_cache = LRUCache(_IMAGE_INFO_CACHE_SIZE)
+_IMAGE_ID_RE = re.compile(r'/api/images/(img_[a-f0-9]+)')
+
+_ImageInfo = namedtuple('_ImageInfo', 'path filename header')
+
+
+class _CachedImageHeader(BaseImageHeader):
+    """Header fields of an image decoded once by python-docx."""
+
+    def __init__(self, image):
+        super().__init__(image.px_width, image.px_height, image.horz_dpi, image.vert_dpi)
+        self._content_type = image.content_type
+        self._default_ext = image.ext
+
+    @property
+    def content_type(self):
+        return self._content_type
+
+    @property
+    def default_ext(self):
+        return self._default_ext
+
+
+def _cache_image_info(image_id, filename):
+    from app import image_derivatives
+    path = image_path(filename)
+    # Export embeds images 3.5 in wide; a print-resolution copy is plenty
+    print_path = image_derivatives.derivative_path(path, 'print')
+    if os.path.exists(print_path):
+        path = print_path
+    try:
+        header = _CachedImageHeader(DocxImage.from_file(path))
+    except Exception:   # missing or not an image python-docx understands
+        return None
+    info = _ImageInfo(path, os.path.basename(filename), header)
+    _image_info_cache.put(image_id, info)
+    return info
+
+
+def prefetch_images(html_values):
+    """Resolve every uncached image referenced in html_values in one query."""
+    from app.db_models import db, QuestionImageModel
+
+    wanted = {img_id for html_val in html_values if html_val and '/api/images/' in html_val
+              for img_id in _IMAGE_ID_RE.findall(html_val)}
+    missing = [img_id for img_id in wanted if _image_info_cache.get(img_id) is None]
+    for i in range(0, len(missing), 500):
+        rows = db.session.query(QuestionImageModel.image_id, QuestionImageModel.filename).filter(
+            QuestionImageModel.image_id.in_(missing[i:i + 500])
+        )
+        for image_id, filename in rows:
+            _cache_image_info(image_id, filename)
+
+
+class _StoredImage(DocxImage):
+    """python-docx Image read from the image store; info says where from."""
+
+    def __init__(self, blob, info):
+        super().__init__(blob, info.filename, info.header)
+        self.info = info
+
+
+def _read_image(info):
+    """_StoredImage for an _ImageInfo, or None if its file cannot be read."""
+    try:
+        with open(info.path, 'rb') as f:
+            return _StoredImage(f.read(), info)
+    except OSError:
+        return None
+
+
+def _load_image(image_id):
+    """python-docx Image for image_id, or None if it cannot be inserted."""
+    info = _image_info_cache.get(image_id)
+    if info is None:
+        from app.db_models import QuestionImageModel
+        rec = QuestionImageModel.query.filter_by(image_id=image_id).first()
+        info = rec and _cache_image_info(image_id, rec.filename)
+        if not info:
+            return None
+    return _read_image(info)
+
+
+class _PartImages:
+    """Images related to one document part, indexed by SHA-1.
+
+    python-docx's get_or_add_image() re-hashes every image already in the
+    package and rescans part names on each call, which is quadratic for an
+    image-heavy paper; this keeps the index instead.
+    """
+
+    def __init__(self, part):
+        self.part = part
+        self._rids = {}
+        self._stored = {}   # image store path -> rId
+        self._next_image = len(part.package.image_parts) + 1
+        self._next_rid = len(part.rels) + 1
+
+    def rid(self, image):
+        rid = self._rids.get(image.sha1)
+        if rid is None:
+            image_part = ImagePart.from_image(
+                image, PackURI(f'/word/media/image{self._next_image}.{image.ext}'))
+            self._next_image += 1
+            self.part.package.image_parts.append(image_part)
+            while f'rId{self._next_rid}' in self.part.rels:
+                self._next_rid += 1
+            rid = self._rids[image.sha1] = f'rId{self._next_rid}'
+            self.part.rels.add_relationship(RT.IMAGE, image_part, rid)
+        return rid
+
+    def stored_rid(self, info):
+        """rId of the stored image info, reading its file once per part."""
+        rid = self._stored.get(info.path)
+        if rid is None:
+            image = _read_image(info)
+            if image is None:
+                return None
+            rid = self._stored[info.path] = self.rid(image)
+        return rid
+
+
+_part_images = weakref.WeakKeyDictionary()
+
+
+def _images_of(part):
+    images = _part_images.get(part)
+    if images is None:
+        images = _part_images[part] = _PartImages(part)
+    return images
+
+
+def _relate_image(part, image):
+    """rId of image (an already-decoded python-docx Image) in part's package."""
+    return _images_of(part).rid(image)
+
+
+def _add_picture(run, image, width):
+    """run.add_picture() for a decoded Image."""
+    rid = _relate_image(run.part, image)
+    cx, cy = image.scaled_dimensions(width, None)
+    run._r.add_drawing(CT_Inline.new_pic_inline(run.part.next_id, rid, image.filename, cx, cy))
 
 
 # ── HTML → Word helpers ──────────────────────────────────────────────────────
@@ -165,7 +863,7 @@ class _HtmlToDocxParser(HTMLParser):
             self._underline = True
         elif tag == 'img':
             src = attrs_d.get('src', '')
-            m = re.search(r'/api/images/(img_[a-f0-9]+)', src)
+            m = _IMAGE_ID_RE.search(src)
             if m:
                 self._close_para()
                 self._insert_image(m.group(1))
@@ -221,19 +919,12 @@ class _HtmlToDocxParser(HTMLParser):
                 self._close_para()
 
     def _insert_image(self, image_id):
-        from app.db_models import QuestionImageModel
-        rec = QuestionImageModel.query.filter_by(image_id=image_id).first()
-        if rec is None:
-            return
-        img_path = os.path.join(_IMAGES_DIR, rec.filename)
-        if not os.path.exists(img_path):
+        image = _load_image(image_id)
+        if image is None:
             return
         para = self._ensure_para()
         run = para.add_run()
-        try:
-            run.add_picture(img_path, width=Inches(3.5))
-        except Exception:
-            pass
+        _add_picture(run, image, width=Inches(3.5))
 
     def _render_table(self):
         if not self._table_rows:
@@ -450,15 +1141,167 @@ def _add_page_number_footer(doc):
     _set_run_font(run_end, 9)
 
 
-def export_exam_to_word(exam, filepath: str, mode: str = 'zh', show_answer: bool = True):
-    """Export an exam to a Word document matching formal exam paper formatting.
+# ── Rendered question fragments ──────────────────────────────────────────────
+#
+# A question renders to the same body XML on every export of a given mode,
+# apart from its number.  Each field ('content', 'options', 'answers') is
+# rendered once into a scratch document with a placeholder number, detached,
+# and kept in a process-wide LRU keyed by (question_id, updated_at, mode,
+# field).  Exports deep-copy the cached elements into their own body, fill
+# in the number, and re-register any images with the target package.
+# Fragments keep only where their images are stored (_ImageInfo), not the
+# bytes: each export reads every image file it uses once.
 
-    Accepts an ExamModel instance (SQLAlchemy model).
-    mode: 'zh' (Chinese only), 'en' (English only), 'both' (bilingual, English first)
-    show_answer: True = include answers/explanations, False = questions only
-    """
-    from app.db_models import CourseSettingsModel
+_FRAGMENT_CACHE_SIZE = 4096
+_fragment_cache = LRUCache(_FRAGMENT_CACHE_SIZE)
+_NUMBER_SLOT = '{n}'
 
+_QuestionFragment = namedtuple('_QuestionFragment', 'elements images')
+
+
+def _question_fields(show_answer):
+    return ('content', 'options', 'answers') if show_answer else ('content', 'options')
+
+
+def _add_option_paragraphs(doc, options):
+    for j, opt in enumerate(options):
+        p = doc.add_paragraph()
+        p.paragraph_format.space_before = Pt(0)
+        p.paragraph_format.space_after = Pt(0)
+        p.paragraph_format.line_spacing = 1.15
+        p.paragraph_format.left_indent = Cm(0.5)
+        run = p.add_run(f'[{chr(65+j)}] {opt}')
+        _set_run_font(run, 10.5)
+
+
+def _render_question_content(doc, question, mode, number):
+    content_en = question.content_en or ''
+    if mode == 'both' and content_en:
+        # English first (always plain text), then Chinese (may be HTML)
+        p_en = doc.add_paragraph()
+        p_en.paragraph_format.space_before = Pt(3)
+        p_en.paragraph_format.space_after = Pt(1)
+        p_en.paragraph_format.line_spacing = 1.15
+        run_en = p_en.add_run(f'{number}. {content_en}')
+        _set_run_font(run_en, 10.5)
+        _add_html_to_doc(doc, question.content, size_pt=10.5,
+                         space_before_pt=0, space_after_pt=3,
+                         prefix_text='   ')
+    elif mode == 'en' and content_en:
+        p = doc.add_paragraph()
+        p.paragraph_format.space_before = Pt(3)
+        p.paragraph_format.space_after = Pt(3)
+        p.paragraph_format.line_spacing = 1.15
+        run = p.add_run(f'{number}. {content_en}')
+        _set_run_font(run, 10.5)
+    else:  # zh, or no English content
+        _add_html_to_doc(doc, question.content, size_pt=10.5,
+                         space_before_pt=3, space_after_pt=3,
+                         prefix_text=f'{number}. ')
+
+
+def _render_question_options(doc, question, mode):
+    options_zh = json.loads(question.options) if question.options else []
+    options_en = json.loads(question.options_en) if question.options_en else []
+    if mode == 'both' and options_en:
+        # English options first
+        _add_option_paragraphs(doc, options_en)
+        _add_option_paragraphs(doc, options_zh)
+    elif mode == 'en':
+        _add_option_paragraphs(doc, options_en if options_en else options_zh)
+    else:  # zh
+        _add_option_paragraphs(doc, options_zh)
+
+
+def _render_question_answers(doc, question):
+    if question.answer:
+        p = doc.add_paragraph()
+        p.paragraph_format.space_before = Pt(2)
+        p.paragraph_format.space_after = Pt(0)
+        p.paragraph_format.left_indent = Cm(0.5)
+        run = p.add_run(f'答案：{question.answer}')
+        _set_run_font(run, 10.5, bold=True)
+
+    if question.reference_answer:
+        _add_labeled_html_field(doc, '参考答案：', question.reference_answer)
+
+    if question.explanation:
+        _add_labeled_html_field(doc, '解析：', question.explanation)
+
+
+def _render_question_field(doc, question, mode, field):
+    if field == 'content':
+        _render_question_content(doc, question, mode, _NUMBER_SLOT)
+    elif field == 'options':
+        _render_question_options(doc, question, mode)
+    else:
+        _render_question_answers(doc, question)
+
+
+class _ScratchDocument:
+    """Document that cache misses render into, created on the first miss."""
+
+    def __init__(self):
+        self._doc = None
+
+    @property
+    def doc(self):
+        if self._doc is None:
+            self._doc = _new_exam_document()
+        return self._doc
+
+
+def _question_fragment(scratch, question, mode, field):
+    """Cached body elements for one field of question, rendering on a miss."""
+    key = (question.question_id, question.updated_at, mode, field)
+    fragment = _fragment_cache.get(key)
+    if fragment is not None and all(os.path.exists(info.path) for info in fragment.images.values()):
+        return fragment
+
+    scratch = scratch.doc
+    body = scratch.element.body
+    start = len(body) - 1      # new blocks are inserted before the final sectPr
+    _render_question_field(scratch, question, mode, field)
+    elements = list(body)[start:-1]
+    images = {}
+    for el in elements:
+        body.remove(el)
+        for blip in el.iter(qn('a:blip')):
+            rid = blip.get(qn('r:embed'))
+            images[rid] = scratch.part.related_parts[rid].image.info
+    fragment = _QuestionFragment(tuple(elements), images)
+    _fragment_cache.put(key, fragment)
+    return fragment
+
+
+def _splice_fragment(doc, fragment, number=None, shape_ids=None):
+    """Append a copy of fragment to doc's body.
+
+    number replaces the placeholder in the question's first run; images are
+    added to doc's package and drawing ids renumbered from shape_ids.
+    """
+    images = _images_of(doc.part)
+    rids = {old: images.stored_rid(info) for old, info in fragment.images.items()}
+    anchor = doc.element.body.sectPr
+    for el in fragment.elements:
+        el = copy.deepcopy(el)
+        if number is not None:
+            for t in el.iter(qn('w:t')):
+                if t.text and t.text.startswith(_NUMBER_SLOT):
+                    t.text = str(number) + t.text[len(_NUMBER_SLOT):]
+                    number = None
+                    break
+        if rids:
+            for blip in el.iter(qn('a:blip')):
+                blip.set(qn('r:embed'), rids[blip.get(qn('r:embed'))])
+        if shape_ids is not None:
+            for doc_pr in el.iter(qn('wp:docPr')):
+                doc_pr.set('id', str(next(shape_ids)))
+        anchor.addprevious(el)
+
+
+def _new_exam_document():
+    """Empty document with the exam paper's page setup and default font."""
     doc = Document()
 
     # --- Page setup: A4, standard margins ---
@@ -476,11 +1319,27 @@ def export_exam_to_word(exam, filepath: str, mode: str = 'zh', show_answer: bool
     style.font.size = Pt(10.5)
     style.element.rPr.rFonts.set(qn('w:eastAsia'), '宋体')
     style.paragraph_format.line_spacing = 1.15
+    return doc
+
+
+# ── Exam document skeletons ──────────────────────────────────────────────────
+#
+# Everything ahead of an exam's own content — page setup, the Normal style,
+# the course header and the page-number footer — depends only on the course
+# settings.  It is built once per distinct settings into a skeleton Document
+# that is never modified; each export clones the skeleton's package in
+# memory (deep-copying part XML, sharing binary blobs) instead of loading
+# the python-docx default template and building the setup again.
 
-    # --- Load course settings ---
-    course_settings = CourseSettingsModel.query.first()
-    cs = course_settings  # shorthand
+_SKELETON_CACHE_SIZE = 16
+_skeleton_cache = LRUCache(_SKELETON_CACHE_SIZE)
+_COURSE_HEADER_FIELDS = ('institution_name', 'semester_info', 'exam_title', 'course_name',
+                         'paper_label', 'course_code', 'exam_format', 'exam_method',
+                         'target_audience')
 
+
+def _add_course_header(doc, cs):
+    """Header block from course settings cs (a CourseSettingsModel or None)."""
     # --- Header section ---
     # Line 1: institution + semester (centered, 18pt bold)
     header_line1_parts = []
@@ -527,8 +1386,115 @@ def export_exam_to_word(exam, filepath: str, mode: str = 'zh', show_answer: bool
         _add_styled_paragraph(doc, f'使用对象：{cs.target_audience}', 14,
                               space_before=0, space_after=2)
 
-    # Total score line
-    total_score = exam.calculate_total_score()
+
+def _clone_document(doc):
+    """Independent copy of a python-docx Document, without re-parsing it."""
+    source = doc.part.package
+    package = Package()
+    parts = {}
+    for part in source.iter_parts():
+        if isinstance(part, XmlPart):
+            parts[part] = type(part)(part.partname, part.content_type,
+                                     copy.deepcopy(part.element), package)
+        else:
+            parts[part] = type(part).load(part.partname, part.content_type, part.blob, package)
+    for owner, clone in itertools.chain([(source, package)], parts.items()):
+        for rel in owner.rels.values():
+            target = rel.target_ref if rel.is_external else parts[rel.target_part]
+            clone.load_rel(rel.reltype, target, rel.rId, rel.is_external)
+    for part in parts.values():
+        part.after_unmarshal()
+    package.after_unmarshal()
+    return package.main_document_part.document
+
+
+def _exam_skeleton(course_settings):
+    """A fresh document holding the page setup, course header and footer."""
+    key = tuple(getattr(course_settings, name, None) for name in _COURSE_HEADER_FIELDS) \
+        if course_settings else None
+    skeleton = _skeleton_cache.get(key)
+    if skeleton is None:
+        skeleton = _new_exam_document()
+        _add_course_header(skeleton, course_settings)
+        _add_page_number_footer(skeleton)
+        _skeleton_cache.put(key, skeleton)
+    return _clone_document(skeleton)
+
+
+def export_exam_to_word(exam, filepath, mode: str = 'zh', show_answer: bool = True):
+    """Export an exam to a Word document matching formal exam paper formatting.
+
+    Accepts an ExamModel instance (SQLAlchemy model).
+    filepath: path or writable binary stream for the .docx
+    mode: 'zh' (Chinese only), 'en' (English only), 'both' (bilingual, English first)
+    show_answer: True = include answers/explanations, False = questions only
+    """
+    from app.db_models import CourseSettingsModel
+
+    questions = exam.get_ordered_questions()
+    prefetch_images(html_val for q in questions
+                    for html_val in (q.content, q.reference_answer, q.explanation))
+    doc = _build_exam_document(exam.config, questions, CourseSettingsModel.query.first(),
+                               mode, show_answer)
+    doc.save(filepath)
+
+
+# ── Exam snapshots for rendering outside the request ─────────────────────────
+
+ExamSnapshot = namedtuple('ExamSnapshot', 'exam_id name config questions course_settings images')
+_QuestionSnapshot = namedtuple('_QuestionSnapshot', [
+    'question_id', 'updated_at', 'question_type', 'content', 'content_en', 'options',
+    'options_en', 'answer', 'reference_answer', 'explanation',
+])
+
+
+def snapshot_exam(exam, course_settings=None):
+    """Picklable copy of everything export needs, so another process can
+    render the exam without a database session."""
+    questions = exam.get_ordered_questions()
+    html_values = [html_val for q in questions
+                   for html_val in (q.content, q.reference_answer, q.explanation)]
+    prefetch_images(html_values)
+    images = {}
+    for html_val in html_values:
+        for image_id in _IMAGE_ID_RE.findall(html_val or ''):
+            info = _image_info_cache.get(image_id)
+            if info is not None:
+                images[image_id] = info
+    cs = None
+    if course_settings is not None:
+        cs = SimpleNamespace(**{c.name: getattr(course_settings, c.name)
+                                for c in course_settings.__table__.columns})
+    return ExamSnapshot(
+        exam.exam_id, exam.name, exam.config,
+        [_QuestionSnapshot(*(getattr(q, f) for f in _QuestionSnapshot._fields)) for q in questions],
+        cs, images,
+    )
+
+
+def render_exam_snapshot(snapshot, mode='zh', show_answer=True) -> bytes:
+    """.docx bytes for an ExamSnapshot; needs no app context."""
+    for image_id, info in snapshot.images.items():
+        _image_info_cache.put(image_id, info)
+    doc = _build_exam_document(snapshot.config, snapshot.questions, snapshot.course_settings,
+                               mode, show_answer)
+    stream = io.BytesIO()
+    doc.save(stream)
+    return stream.getvalue()
+
+
+def _build_exam_document(exam_config, questions, course_settings, mode, show_answer):
+    """The exam paper as a python-docx Document.
+
+    exam_config is the exam's JSON config string; questions are ordered
+    QuestionModels (or snapshots); image info must already be cached.
+    """
+    doc = _exam_skeleton(course_settings)
+    config = json.loads(exam_config) if exam_config else {}
+
+    # Total score line (same rule as ExamModel.calculate_total_score)
+    total_score = sum(config.get(q.question_type, {}).get('points', 0)
+                      for q in questions) if config else 0
     if total_score > 0:
         _add_styled_paragraph(doc, f'满分：{total_score} 分', 14,
                               space_before=0, space_after=2)
@@ -539,8 +1505,9 @@ def export_exam_to_word(exam, filepath: str, mode: str = 'zh', show_answer: bool
                           space_before=6, space_after=6)
 
     # --- Questions ---
-    questions = exam.get_ordered_questions()
-    config = json.loads(exam.config) if exam.config else {}
+    # Fragments are rendered into a scratch document and spliced into doc
+    scratch = _ScratchDocument()
+    shape_ids = itertools.count(1)
 
     # Group questions by type (preserving order)
     question_groups = {}
@@ -571,100 +1538,11 @@ def export_exam_to_word(exam, filepath: str, mode: str = 'zh', show_answer: bool
                               space_before=12, space_after=6)
 
         for i, question in enumerate(type_questions, 1):
-            options_zh = json.loads(question.options) if question.options else []
-            options_en = json.loads(question.options_en) if question.options_en else []
-            content_en = question.content_en or ''
-
-            # --- Question content ---
-            if mode == 'both' and content_en:
-                # English first (always plain text), then Chinese (may be HTML)
-                p_en = doc.add_paragraph()
-                p_en.paragraph_format.space_before = Pt(3)
-                p_en.paragraph_format.space_after = Pt(1)
-                p_en.paragraph_format.line_spacing = 1.15
-                run_en = p_en.add_run(f'{i}. {content_en}')
-                _set_run_font(run_en, 10.5)
-                _add_html_to_doc(doc, question.content, size_pt=10.5,
-                                 space_before_pt=0, space_after_pt=3,
-                                 prefix_text='   ')
-            elif mode == 'en':
-                if content_en:
-                    p = doc.add_paragraph()
-                    p.paragraph_format.space_before = Pt(3)
-                    p.paragraph_format.space_after = Pt(3)
-                    p.paragraph_format.line_spacing = 1.15
-                    run = p.add_run(f'{i}. {content_en}')
-                    _set_run_font(run, 10.5)
-                else:
-                    _add_html_to_doc(doc, question.content, size_pt=10.5,
-                                     space_before_pt=3, space_after_pt=3,
-                                     prefix_text=f'{i}. ')
-            else:  # zh or both without English content
-                _add_html_to_doc(doc, question.content, size_pt=10.5,
-                                 space_before_pt=3, space_after_pt=3,
-                                 prefix_text=f'{i}. ')
-
-            # --- Options ---
-            if mode == 'both' and options_en:
-                # English options first
-                for j, opt in enumerate(options_en):
-                    p = doc.add_paragraph()
-                    p.paragraph_format.space_before = Pt(0)
-                    p.paragraph_format.space_after = Pt(0)
-                    p.paragraph_format.line_spacing = 1.15
-                    p.paragraph_format.left_indent = Cm(0.5)
-                    run = p.add_run(f'[{chr(65+j)}] {opt}')
-                    _set_run_font(run, 10.5)
-                # Chinese options
-                for j, opt in enumerate(options_zh):
-                    p = doc.add_paragraph()
-                    p.paragraph_format.space_before = Pt(0)
-                    p.paragraph_format.space_after = Pt(0)
-                    p.paragraph_format.line_spacing = 1.15
-                    p.paragraph_format.left_indent = Cm(0.5)
-                    run = p.add_run(f'[{chr(65+j)}] {opt}')
-                    _set_run_font(run, 10.5)
-            elif mode == 'en':
-                display_opts = options_en if options_en else options_zh
-                for j, opt in enumerate(display_opts):
-                    p = doc.add_paragraph()
-                    p.paragraph_format.space_before = Pt(0)
-                    p.paragraph_format.space_after = Pt(0)
-                    p.paragraph_format.line_spacing = 1.15
-                    p.paragraph_format.left_indent = Cm(0.5)
-                    run = p.add_run(f'[{chr(65+j)}] {opt}')
-                    _set_run_font(run, 10.5)
-            else:  # zh
-                for j, opt in enumerate(options_zh):
-                    p = doc.add_paragraph()
-                    p.paragraph_format.space_before = Pt(0)
-                    p.paragraph_format.space_after = Pt(0)
-                    p.paragraph_format.line_spacing = 1.15
-                    p.paragraph_format.left_indent = Cm(0.5)
-                    run = p.add_run(f'[{chr(65+j)}] {opt}')
-                    _set_run_font(run, 10.5)
-
-            # --- Answers ---
-            if show_answer:
-                if question.answer:
-                    p = doc.add_paragraph()
-                    p.paragraph_format.space_before = Pt(2)
-                    p.paragraph_format.space_after = Pt(0)
-                    p.paragraph_format.left_indent = Cm(0.5)
-                    run = p.add_run(f'答案：{question.answer}')
-                    _set_run_font(run, 10.5, bold=True)
-
-                if question.reference_answer:
-                    _add_labeled_html_field(doc, '参考答案：', question.reference_answer)
-
-                if question.explanation:
-                    _add_labeled_html_field(doc, '解析：', question.explanation)
-
-    # --- Page footer with page numbers ---
-    _add_page_number_footer(doc)
-
-    # Save the document
-    doc.save(filepath)
+            for field in _question_fields(show_answer):
+                _splice_fragment(doc, _question_fragment(scratch, question, mode, field),
+                                 number=i if field == 'content' else None,
+                                 shape_ids=shape_ids)
+    return doc
 
 
 def parse_question_template(content: str) -> list:
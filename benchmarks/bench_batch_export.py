@@ -0,0 +1,74 @@
+"""Batch Word export: in-process rendering vs the worker-process pool.
+
+Seeds several exams of rich-text questions in an in-memory database and
+streams one ZIP of every exam in every mode/answer variant through
+batch_export.stream_zip, once rendering in this process (EXPORT_WORKERS=0)
+and once per worker count.  The pool is warmed up first so process start-up
+is not counted.
+
+    python -m benchmarks.bench_batch_export [--exams 4] [--questions 60] [--workers 2 4]
+"""
+import argparse
+import time
+
+from app import batch_export, utils
+from app.db_models import db, ExamModel, exam_questions
+from app.factory import create_app
+from benchmarks.bench_word_export import MODES, _seed
+
+
+def _copy_exams(n):
+    """Further exams sharing the seeded paper's questions."""
+    rows = db.session.execute(exam_questions.select().where(
+        exam_questions.c.exam_id == 'bench')).mappings().all()
+    base = db.session.get(ExamModel, 'bench')
+    for i in range(1, n):
+        db.session.add(ExamModel(exam_id=f'bench{i}', name=f'基准试卷{i}', config=base.config,
+                                 created_at=base.created_at, updated_at=base.updated_at))
+        db.session.flush()
+        db.session.execute(exam_questions.insert(), [
+            dict(row, exam_id=f'bench{i}') for row in rows])
+    db.session.commit()
+    return ['bench'] + [f'bench{i}' for i in range(1, n)]
+
+
+def _run(tasks, workers):
+    batch = batch_export.ExportBatch(len(tasks))
+    start = time.perf_counter()
+    size = sum(len(chunk) for chunk in batch_export.stream_zip(batch, tasks, workers))
+    assert batch.status == 'completed', batch.errors
+    return time.perf_counter() - start, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--exams', type=int, default=4)
+    parser.add_argument('--questions', type=int, default=60)
+    parser.add_argument('--workers', type=int, nargs='+', default=[2, 4])
+    args = parser.parse_args()
+
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        _seed(args.questions, 0, None)
+        exam_ids = _copy_exams(args.exams)
+        snapshots = [utils.snapshot_exam(db.session.get(ExamModel, eid)) for eid in exam_ids]
+        names = batch_export.file_names(snapshots, MODES)
+        tasks = [(names[(s.exam_id, mode, answers)], s, mode, answers)
+                 for s in snapshots for mode, answers in MODES]
+        print(f'{len(tasks)} documents ({args.exams} exams × {len(MODES)} variants, '
+              f'{args.questions} questions each)')
+
+        utils._fragment_cache.clear()
+        elapsed, size = _run(tasks, 0)
+        print(f'  {"in process":<12} {elapsed * 1000:8.0f}ms  ({size / 1024:.0f} KiB)')
+        for workers in args.workers:
+            batch_export._pool = None
+            _run(tasks[:workers], workers)  # start the processes
+            elapsed, size = _run(tasks, workers)
+            print(f'  {f"{workers} workers":<12} {elapsed * 1000:8.0f}ms  ({size / 1024:.0f} KiB)')
+            batch_export._pool.shutdown()
+
+
+if __name__ == '__main__':
+    main()
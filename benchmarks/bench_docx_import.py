@@ -0,0 +1,101 @@
+""".docx import: python-docx parser vs the streaming iterparse reader.
+
+Builds a question bank with an image and a table in every question, then
+parses it in a fresh process per reader and reports wall time and peak
+resident memory (lxml allocates outside Python, so tracemalloc would not
+see it); the baseline is the interpreter with the app imported.  Images
+are handed to a no-op save function, so only parsing is measured.
+
+    python -m benchmarks.bench_docx_import [--questions 1000] [--image-kb 64]
+"""
+import argparse
+import base64
+import io
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+
+from docx import Document
+
+from app import docx_importer
+
+PNG = base64.b64decode(
+    'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNk+M9QDwADhgGAWjR9awAAAABJRU5ErkJggg==')
+
+
+def _build(path, questions, image_kb):
+    doc = Document()
+    for i in range(questions):
+        p = doc.add_paragraph('[单选][B]')
+        p.add_run().add_break()
+        p.add_run(f'第{i}题：关于林业经济学中成本结构的表述，下列哪项正确？' * 3)
+        for letter in 'ABCD':
+            doc.add_paragraph(f'[{letter}] 选项{letter}的较长说明文字')
+        # A distinct image per question: a 1×1 PNG padded with random bytes
+        doc.add_picture(io.BytesIO(PNG + os.urandom(image_kb * 1024)))
+        table = doc.add_table(rows=3, cols=3)
+        for cell in table._cells:
+            cell.text = '数据'
+        doc.add_paragraph('<解析>')
+        doc.add_paragraph(f'解析正文{i}')
+        doc.add_paragraph('</解析>')
+    doc.save(path)
+
+
+def _measure(path, reader, queue):
+    if reader == 'baseline':
+        queue.put((0, 0.0, _peak_rss_kb()))
+        return
+    start = time.perf_counter()
+    save = lambda data, content_type: 'img_0'
+    if reader == 'python-docx':
+        count = len(docx_importer.parse_docx_with_rich_content(path, save))
+    else:
+        count = sum(1 for _ in docx_importer.iter_docx_questions(path, save))
+    elapsed = time.perf_counter() - start
+    queue.put((count, elapsed, _peak_rss_kb()))
+
+
+def _peak_rss_kb():
+    # ru_maxrss survives fork+exec on Linux, so it would report the parent's
+    # peak from building the document; VmHWM starts over with the new image.
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _run(path, reader):
+    ctx = multiprocessing.get_context('spawn')
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_measure, args=(path, reader, queue))
+    proc.start()
+    result = queue.get()
+    proc.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--questions', type=int, default=1000)
+    parser.add_argument('--image-kb', type=int, default=64)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bank.docx')
+        _build(path, args.questions, args.image_kb)
+        print(f'{args.questions} questions, {os.path.getsize(path) / 2**20:.1f} MiB .docx')
+        for reader in ('baseline', 'python-docx', 'streaming'):
+            count, elapsed, rss = _run(path, reader)
+            timing = f'{count} questions  {elapsed * 1000:8.1f} ms' if count else ' ' * 27
+            print(f'{reader:12} {timing}  peak RSS {rss / 1024:7.1f} MiB')
+
+
+if __name__ == '__main__':
+    main()
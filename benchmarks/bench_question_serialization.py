@@ -0,0 +1,105 @@
+"""Serialization cost of question list payloads, per 10k questions.
+
+Compares the old path (ORM objects -> to_dict() -> json.dumps) with the
+column projection used by GET /api/questions?fields=..., with and without
+orjson.
+
+    python -m benchmarks.bench_question_serialization [--n 10000] [--repeat 5]
+"""
+import argparse
+import json
+import time
+from datetime import datetime
+
+from sqlalchemy import insert
+
+from app.factory import create_app
+from app.db_models import db, QuestionModel, QUESTION_FIELDS, question_serializer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+LIST_FIELDS = ['question_id', 'question_type', 'subject', 'content', 'content_en',
+               'knowledge_point', 'tags', 'difficulty', 'is_used']
+
+
+def _seed(n):
+    now = datetime.now()
+    rows = [{
+        'question_id': f'bench_{i:06d}',
+        'question_type': ('单选', '多选', '是非', '简答')[i % 4],
+        'content': f'第{i}题：在完全竞争市场中，企业的短期供给曲线是哪一条？' * 3,
+        'options': json.dumps(['边际成本曲线', '平均成本曲线', '平均可变成本曲线', '需求曲线'],
+                              ensure_ascii=False),
+        'answer': 'A',
+        'explanation': '短期供给曲线是边际成本曲线位于平均可变成本最低点以上的部分。',
+        'subject': '林业经济学',
+        'knowledge_point': '完全竞争',
+        'tags': '微观,供给',
+        'difficulty': 'medium',
+        'language': 'zh',
+        'metadata_json': json.dumps({'source': 'bench', 'page': i}),
+        'is_used': False,
+        'created_at': now,
+        'updated_at': now,
+    } for i in range(n)]
+    db.session.execute(insert(QuestionModel.__table__), rows)
+    db.session.commit()
+
+
+def _orm_to_dict_json():
+    questions = QuestionModel.query.all()
+    return json.dumps([q.to_dict() for q in questions], ensure_ascii=False)
+
+
+def _projection(fields, dumps):
+    def run():
+        serialize = question_serializer(fields)
+        rows = db.session.execute(db.select(*QuestionModel.columns_for(fields))).all()
+        return dumps([serialize(r) for r in rows])
+    return run
+
+
+def _best_of(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        db.session.expunge_all()
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--n', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    stdlib = lambda obj: json.dumps(obj, ensure_ascii=False)
+    cases = [
+        ('before: ORM + to_dict + json', _orm_to_dict_json),
+        ('all fields, projection + json', _projection(list(QUESTION_FIELDS), stdlib)),
+        ('list fields, projection + json', _projection(LIST_FIELDS, stdlib)),
+    ]
+    if orjson is not None:
+        cases += [
+            ('all fields, projection + orjson', _projection(list(QUESTION_FIELDS), orjson.dumps)),
+            ('list fields, projection + orjson', _projection(LIST_FIELDS, orjson.dumps)),
+        ]
+
+    app = create_app('testing')
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        _seed(args.n)
+        scale = 10000 / args.n
+        print(f'{args.n} questions, best of {args.repeat}; ms per 10k questions')
+        for label, fn in cases:
+            print(f'  {label:<34} {_best_of(fn, args.repeat) * 1000 * scale:8.1f}')
+
+
+if __name__ == '__main__':
+    main()
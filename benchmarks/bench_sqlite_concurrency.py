@@ -0,0 +1,138 @@
+"""Mixed read/import load against a file SQLite database, default vs tuned.
+
+Reader threads page through GET /api/questions and GET /api/exams while
+writer threads POST text imports, the way the threaded launcher serves the
+SPA during a bulk import.  Each mode gets a fresh database file; the
+response cache is disabled so every read reaches SQLite.
+
+    python -m benchmarks.bench_sqlite_concurrency [--seconds 10] [--readers 8] [--writers 2]
+"""
+import argparse
+import io
+import os
+import statistics
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import insert
+
+from app.factory import create_app
+from app.db_models import db, QuestionModel
+from config import config
+
+
+def _make_app(workdir, tuned):
+    class BenchConfig(config['production']):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+        SQLITE_TUNING = tuned
+        RESPONSE_CACHE_SIZE = 0
+        UPLOAD_FOLDER = os.path.join(workdir, 'uploads')
+        TEMP_FOLDER = os.path.join(workdir, 'temp')
+        EXPORTS_FOLDER = os.path.join(workdir, 'exports')
+
+    name = f'bench_{"tuned" if tuned else "default"}'
+    config[name] = BenchConfig
+    return create_app(name)
+
+
+def _seed(n):
+    now = datetime.now()
+    db.session.execute(insert(QuestionModel.__table__), [{
+        'question_id': f'seed_{i:06d}',
+        'question_type': ('单选', '是非', '简答')[i % 3],
+        'content': f'种子题目 {i}：森林资源资产评估的基本方法有哪些？',
+        'options': '[]',
+        'metadata_json': '{}',
+        'is_used': False,
+        'created_at': now,
+        'updated_at': now,
+    } for i in range(n)])
+    db.session.commit()
+
+
+def _import_file(writer_id, batch, size):
+    lines = []
+    for i in range(size):
+        lines.append('[简答]')
+        lines.append(f'导入压测 w{writer_id} b{batch} #{i}：说明边际成本与平均成本在第{i}种情形下的关系。')
+    return io.BytesIO('\n'.join(lines).encode('utf-8'))
+
+
+def _run(app, seconds, readers, writers, import_size):
+    stop = time.perf_counter() + seconds
+    read_lat, write_lat, errors = [], [], []
+    lock = threading.Lock()
+
+    def reader():
+        client = app.test_client()
+        urls = ('/api/questions?limit=50', '/api/questions?type=单选&limit=50', '/api/exams')
+        i = 0
+        while time.perf_counter() < stop:
+            start = time.perf_counter()
+            resp = client.get(urls[i % len(urls)])
+            elapsed = time.perf_counter() - start
+            with lock:
+                (read_lat if resp.status_code == 200 else errors).append(elapsed)
+            i += 1
+
+    def writer(wid):
+        client = app.test_client()
+        batch = 0
+        while time.perf_counter() < stop:
+            start = time.perf_counter()
+            resp = client.post('/api/questions/import', data={
+                'file': (_import_file(wid, batch, import_size), 'bench.txt'),
+            }, content_type='multipart/form-data')
+            elapsed = time.perf_counter() - start
+            with lock:
+                (write_lat if resp.status_code == 200 else errors).append(elapsed)
+            batch += 1
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    threads += [threading.Thread(target=writer, args=(w,)) for w in range(writers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return read_lat, write_lat, errors
+
+
+def _ms(values, q):
+    if not values:
+        return float('nan')
+    if q == 50:
+        return statistics.median(values) * 1000
+    return statistics.quantiles(values, n=100)[q - 1] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--seed', type=int, default=20000, help='questions preloaded')
+    parser.add_argument('--import-size', type=int, default=200, help='questions per import')
+    args = parser.parse_args()
+
+    print(f'{args.readers} readers + {args.writers} importers for {args.seconds:g}s, '
+          f'{args.seed} seeded questions, {args.import_size} questions per import')
+    print(f'  {"mode":<8} {"reads/s":>8} {"read p50":>9} {"read p95":>9} '
+          f'{"imports":>8} {"import p50":>11} {"errors":>7}')
+    for tuned in (False, True):
+        with tempfile.TemporaryDirectory() as workdir:
+            app = _make_app(workdir, tuned)
+            with app.app_context():
+                _seed(args.seed)
+            reads, writes, errors = _run(app, args.seconds, args.readers, args.writers,
+                                         args.import_size)
+            with app.app_context():
+                db.engine.dispose()
+        print(f'  {"tuned" if tuned else "default":<8} {len(reads) / args.seconds:8.1f} '
+              f'{_ms(reads, 50):8.1f}ms {_ms(reads, 95):8.1f}ms {len(writes):8d} '
+              f'{_ms(writes, 50):10.1f}ms {len(errors):7d}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,182 @@
+"""Word exam export: first export vs re-export with cached question fragments.
+
+Builds a paper of rich-text questions (Quill HTML with inline formatting,
+options, tables in reference answers) in an in-memory database and exports
+it in every mode, with and without answers.  The first pass renders every
+question; later passes splice cached fragments.  "save" is the time spent
+in Document.save writing the .docx.
+
+With --images N each question embeds N PNG figures.  The extra "render,
+image info cached" line re-renders every question (fragment cache cleared)
+while the image metadata cache stays warm, and SQL counts the statements
+one export runs.
+
+The "document setup" lines time the part of an export that precedes the
+questions — page setup, styles, course header and footer — built from
+scratch for every export vs cloned from the cached skeleton.
+
+    python -m benchmarks.bench_word_export [--questions 100] [--repeat 5] [--images 0]
+"""
+import argparse
+import json
+import os
+import statistics
+import struct
+import tempfile
+import time
+import zlib
+from datetime import datetime
+from types import SimpleNamespace
+from unittest import mock
+
+from docx.document import Document as _DocxDocument
+from sqlalchemy import event
+
+from app.factory import create_app
+from app.db_models import db, QuestionModel, ExamModel, QuestionImageModel, exam_questions
+from app import utils
+
+MODES = [(mode, answers) for mode in ('zh', 'en', 'both') for answers in (True, False)]
+
+
+def _png(width, height, seed):
+    """Uncompressed-looking RGB PNG of the given size."""
+    def chunk(kind, data):
+        return (struct.pack('>I', len(data)) + kind + data
+                + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff))
+    row = bytes([0]) + bytes((seed + x) % 256 for x in range(width * 3))
+    return (b'\x89PNG\r\n\x1a\n'
+            + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(row * height))
+            + chunk(b'IEND', b''))
+
+
+def _seed_images(n, images_dir):
+    ids = []
+    for i in range(n):
+        image_id = f'img_{i:08x}'
+        with open(os.path.join(images_dir, f'{image_id}.png'), 'wb') as f:
+            f.write(_png(400, 300, i))
+        db.session.add(QuestionImageModel(image_id=image_id, filename=f'{image_id}.png'))
+        ids.append(image_id)
+    return ids
+
+
+def _seed(n, images_per_question, images_dir):
+    now = datetime.now()
+    image_ids = _seed_images(n * images_per_question, images_dir)
+    for i in range(n):
+        single = i % 3 != 2
+        figures = ''.join(f'<img src="/api/images/{image_id}">' for image_id in
+                          image_ids[i * images_per_question:(i + 1) * images_per_question])
+        db.session.add(QuestionModel(
+            question_id=f'bq{i:04d}',
+            question_type='单选' if single else '简答',
+            content=(f'<p>第{i}题：在<strong>完全竞争</strong>市场中，<em>边际成本</em>与'
+                     f'平均成本的关系如何？</p>{figures}<p>请结合森林资源资产评估的实际情形说明。</p>'),
+            content_en=f'Question {i}: how do marginal and average cost relate?',
+            options=json.dumps(['相等', '边际成本更高', '平均成本更高', '无法确定'] if single else [],
+                               ensure_ascii=False),
+            options_en=json.dumps(['Equal', 'MC higher', 'AC higher', 'Unknown']) if single else None,
+            answer='A' if single else None,
+            reference_answer=None if single else (
+                '<p>参考要点：</p><table><tr><td>产量</td><td>边际成本</td></tr>'
+                '<tr><td>10</td><td>5.5</td></tr><tr><td>20</td><td>6.1</td></tr></table>'),
+            explanation='<p>解析：<u>长期均衡</u>时价格等于平均成本最低点。</p>',
+            language='both',
+            created_at=now,
+            updated_at=now,
+        ))
+    db.session.add(ExamModel(exam_id='bench', name='基准试卷', config=json.dumps(
+        {'单选': {'count': n, 'points': 2}, '简答': {'count': n, 'points': 10}}),
+        created_at=now, updated_at=now))
+    db.session.flush()
+    db.session.execute(exam_questions.insert(), [
+        {'exam_id': 'bench', 'question_id': f'bq{i:04d}', 'position': i} for i in range(n)])
+    db.session.commit()
+
+
+def _export_all(exam, workdir, save_times, statements):
+    save_times.clear()
+    statements.clear()
+    start = time.perf_counter()
+    for mode, answers in MODES:
+        utils.export_exam_to_word(exam, os.path.join(workdir, f'{mode}_{answers}.docx'),
+                                  mode=mode, show_answer=answers)
+    n = len(MODES)
+    return (time.perf_counter() - start) / n * 1000, sum(save_times) / n * 1000, len(statements) / n
+
+
+def _report(label, total, saved, sql):
+    print(f'  {label:<28} {total:7.1f}ms  (save {saved:5.1f}ms, SQL {sql:5.1f})')
+
+
+def _build_setup(course_settings):
+    """The setup every export used to run: template, page setup, header, footer."""
+    doc = utils._new_exam_document()
+    utils._add_course_header(doc, course_settings)
+    utils._add_page_number_footer(doc)
+    return doc
+
+
+def _time_ms(fn, repeat):
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--questions', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=5, help='re-export passes')
+    parser.add_argument('--images', type=int, default=0, help='figures per question')
+    args = parser.parse_args()
+
+    app = create_app('testing')
+    save = _DocxDocument.save
+    save_times = []
+
+    def timed_save(doc, path):
+        start = time.perf_counter()
+        save(doc, path)
+        save_times.append(time.perf_counter() - start)
+
+    with app.app_context(), tempfile.TemporaryDirectory() as workdir, \
+            mock.patch.object(_DocxDocument, 'save', timed_save), \
+            mock.patch.object(utils, '_IMAGES_DIR', workdir):
+        db.create_all()
+        _seed(args.questions, args.images, workdir)
+        exam = db.session.get(ExamModel, 'bench')
+        statements = []
+        event.listen(db.engine, 'before_cursor_execute', lambda *a: statements.append(1))
+        print(f'{args.questions} questions, {args.images} figures each, '
+              f'{len(MODES)} mode/answer combinations, per-export averages')
+
+        utils._fragment_cache.clear()
+        utils._image_info_cache.clear()
+        _report('first export', *_export_all(exam, workdir, save_times, statements))
+        runs = [_export_all(exam, workdir, save_times, statements) for _ in range(args.repeat)]
+        _report('re-export', *(statistics.median(r[k] for r in runs) for k in range(3)))
+        if args.images:
+            runs = []
+            for _ in range(args.repeat):
+                utils._fragment_cache.clear()
+                runs.append(_export_all(exam, workdir, save_times, statements))
+            _report('render, image info cached', *(statistics.median(r[k] for r in runs)
+                                                  for k in range(3)))
+
+        course_settings = SimpleNamespace(
+            institution_name='示例大学', semester_info='2025–2026学年第1学期', exam_title='期末考试试卷',
+            course_name='林业经济学', paper_label='A', course_code='F1001', exam_format='闭卷',
+            exam_method='笔试', target_audience='2023级本科生')
+        repeat = max(args.repeat, 20)
+        print(f'  {"document setup, built":<28} '
+              f'{_time_ms(lambda: _build_setup(course_settings), repeat):7.1f}ms')
+        print(f'  {"document setup, cloned":<28} '
+              f'{_time_ms(lambda: utils._exam_skeleton(course_settings), repeat):7.1f}ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -35,6 +35,25 @@ class Config:
         or 'sqlite:///' + os.path.join(_DATA_BASE, 'exam_system.db')
     )
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # WAL + pragmas on every SQLite connection (app/engine.py)
+    SQLITE_TUNING = True
+    # Serialized GET responses kept in memory (app/cache.py); 0 disables
+    RESPONSE_CACHE_SIZE = 256
+    # Background imports (app/import_jobs.py): pool threads, questions per commit
+    IMPORT_JOB_WORKERS = 2
+    IMPORT_BATCH_SIZE = 200
+    # Threads hashing and writing images found while parsing a .docx import (app/utils.py)
+    IMPORT_IMAGE_WORKERS = 4
+    # Let a front server (nginx, Apache mod_xsendfile) send files named by
+    # X-Sendfile instead of streaming them through Python
+    USE_X_SENDFILE = os.environ.get('USE_X_SENDFILE') == '1'
+    # Threads generating thumbnail/print/WebP image variants (app/image_derivatives.py)
+    IMAGE_DERIVATIVE_WORKERS = 2
+    # Orphaned images (app/image_gc.py): minimum age, and hours between runs (0 = on demand only)
+    IMAGE_GC_GRACE_HOURS = 24
+    IMAGE_GC_INTERVAL_HOURS = 6
+    # Batch Word export (app/batch_export.py): render processes; 0 = in the request thread
+    EXPORT_WORKERS = min(4, os.cpu_count() or 1)
 
 
 class DevelopmentConfig(Config):
@@ -52,6 +71,7 @@ class TestingConfig(Config):
     TESTING = True
     WTF_CSRF_ENABLED = False
     SQLALCHEMY_DATABASE_URI = 'sqlite://'  # In-memory database for test isolation
+    IMAGE_GC_INTERVAL_HOURS = 0
 
 
 # Configuration dictionary
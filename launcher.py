@@ -11,6 +11,7 @@ PyInstaller 打包时以此文件为入口。
   macOS 打包版：~/Library/Application Support/试题管理系统/
   普通 Python 运行：项目根目录（保持向后兼容）
 """
+import multiprocessing
 import os
 import sys
 import socket
@@ -92,4 +93,7 @@ def main() -> None:
 
 
 if __name__ == '__main__':
+    # Batch Word export renders in spawned worker processes; a frozen
+    # (PyInstaller) build must route those children to the worker code.
+    multiprocessing.freeze_support()
     main()
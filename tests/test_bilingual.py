@@ -81,7 +81,7 @@ class TestBilingualAPI:
         create_question_in_db(db, question_id='bi_d_easy', difficulty='easy')
         create_question_in_db(db, question_id='bi_d_hard', difficulty='hard')
         resp = client.get('/api/questions?difficulty=easy')
-        data = resp.get_json()
+        data = resp.get_json()['questions']
         assert len(data) == 1
         assert data[0]['question_id'] == 'bi_d_easy'
 
@@ -185,7 +185,7 @@ class TestBilingualImport:
         assert data['count'] == 1
 
         # Check persisted data
-        questions = client.get('/api/questions').get_json()
+        questions = client.get('/api/questions').get_json()['questions']
         imported = [q for q in questions if '什么是可持续发展' in q['content']]
         assert len(imported) == 1
         q = imported[0]
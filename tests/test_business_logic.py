@@ -12,7 +12,7 @@ class TestUsageTracking:
         create_question_in_db(db, question_id='uf2', is_used=True, content='已用题目')
         # Search all — both returned
         resp = client.get('/api/questions')
-        assert len(resp.get_json()) == 2
+        assert len(resp.get_json()['questions']) == 2
 
     def test_generate_selects_unused_only(self, client, db):
         """Auto-generate only selects unused questions."""
@@ -43,12 +43,12 @@ class TestUsageTracking:
         create_question_in_db(db, question_id='co1', content='第一题')
         create_question_in_db(db, question_id='co2', content='第二题')
 
-        # Generate first exam
-        client.post('/api/exams/generate', json={
+        # Generate first exam (selection is random)
+        first = client.post('/api/exams/generate', json={
             'exam_id': 'coe1',
             'name': '第一次',
             'config': {'单选': {'count': 1, 'points': 5}},
-        })
+        }).get_json()['questions'][0]['question_id']
         # Confirm it — this marks questions as used
         client.post('/api/exams/coe1/confirm')
 
@@ -60,8 +60,8 @@ class TestUsageTracking:
         })
         data = resp.get_json()
         # Should get the other question
-        if len(data['questions']) == 1:
-            assert data['questions'][0]['question_id'] == 'co2'
+        other = 'co2' if first == 'co1' else 'co1'
+        assert [q['question_id'] for q in data['questions']] == [other]
 
     def test_replace_does_not_change_used_flags(self, client, db):
         """Replace only swaps the association, does not change is_used."""
@@ -0,0 +1,76 @@
+"""Tests for the .docx importer: the python-docx parser and the streaming reader."""
+import base64
+import itertools
+
+from docx import Document
+
+from app import docx_importer
+
+PNG = base64.b64decode(
+    'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNk+M9QDwADhgGAWjR9awAAAABJRU5ErkJggg==')
+
+
+def _bank(path, image_path, count=3):
+    """A question bank with soft breaks, options, an image, a table and answer sections."""
+    doc = Document()
+    doc.add_paragraph('题库说明（第一个标记之前的内容忽略）')
+    for i in range(count):
+        p = doc.add_paragraph('[单选][B]')
+        p.add_run().add_break()
+        p.add_run(f'第{i}题：下列哪项正确？')
+        doc.add_paragraph('[A] 甲')
+        doc.add_paragraph('[B] 乙')
+        doc.add_paragraph('[A_en] first')
+        doc.add_picture(str(image_path))
+        table = doc.add_table(rows=2, cols=2)
+        table.cell(0, 0).text = f'表{i}'
+        table.cell(1, 1).text = '值'
+        doc.add_paragraph('<解析>')
+        doc.add_paragraph('知识点：成本')
+        doc.add_paragraph(f'解析正文{i}')
+        doc.add_paragraph('</解析>')
+    p = doc.add_paragraph('[简答>材料分析]')
+    p.add_run().add_break()
+    p.add_run('最后一题')
+    doc.add_paragraph('<参考答案>要点一')
+    doc.add_paragraph('</参考答案>')
+    doc.save(str(path))
+    return path
+
+
+def _saver(saved):
+    def save(image_bytes, content_type):
+        saved.append((image_bytes, content_type))
+        return f'img_{len(saved):04x}'
+    return save
+
+
+class TestStreamingReader:
+    def test_same_questions_as_python_docx(self, tmp_path):
+        (tmp_path / 'dot.png').write_bytes(PNG)
+        path = _bank(tmp_path / 'bank.docx', tmp_path / 'dot.png')
+        loaded, streamed = [], []
+        expected = docx_importer.parse_docx_with_rich_content(str(path), _saver(loaded))
+        questions = list(docx_importer.iter_docx_questions(str(path), _saver(streamed)))
+        assert questions == expected
+        assert streamed == loaded == [(PNG, 'image/png')] * 3
+
+        first = questions[0]
+        assert (first['type'], first['answer'], first['options']) == ('单选', 'B', ['甲', '乙'])
+        assert first['content'].startswith('第0题：下列哪项正确？\n<img src="/api/images/img_0001"')
+        assert first['images'] == ['img_0001']
+        assert '<td style="padding:4px;">表0</td>' in first['content']
+        assert (first['knowledge_point'], first['explanation']) == ('成本', '解析正文0')
+        assert (questions[-1]['type'], questions[-1]['reference_answer']) == ('简答>材料分析', '要点一')
+
+    def test_yields_each_question_as_parsing_reaches_it(self, tmp_path):
+        """A question comes out before later images are read."""
+        (tmp_path / 'dot.png').write_bytes(PNG)
+        path = _bank(tmp_path / 'bank.docx', tmp_path / 'dot.png', count=5)
+        saved = []
+        questions = docx_importer.iter_docx_questions(str(path), _saver(saved))
+        first_two = list(itertools.islice(questions, 2))
+        assert [q['content'][:3] for q in first_two] == ['第0题', '第1题']
+        assert len(saved) == 2   # the third question's marker ended the second
+        assert len(list(questions)) == 4
+        assert len(saved) == 5
@@ -115,13 +115,13 @@ class TestDataIntegrity:
             })
         # Verify all 10 exist
         resp = client.get('/api/questions')
-        assert len(resp.get_json()) == 10
+        assert len(resp.get_json()['questions']) == 10
 
         # Delete 5 rapidly
         for i in range(5):
             client.delete(f'/api/questions/ci{i}')
         resp = client.get('/api/questions')
-        assert len(resp.get_json()) == 5
+        assert len(resp.get_json()['questions']) == 5
 
 
 class TestIndexPage:
@@ -0,0 +1,33 @@
+"""Tests for database engine configuration."""
+from sqlalchemy import create_engine, text
+from app.engine import (
+    SQLITE_PRAGMAS, engine_options, install_sqlite_pragmas, normalize_database_uri,
+)
+
+
+class TestEngineOptions:
+    def test_postgres_pool_settings(self):
+        """Postgres gets a pre-pinged pool; env vars override the sizes."""
+        options = engine_options('postgresql://u:p@db/exam', env={'DB_POOL_SIZE': '4'})
+        assert options['pool_pre_ping'] is True
+        assert options['pool_size'] == 4
+        assert options['max_overflow'] == 20
+
+    def test_legacy_postgres_scheme(self):
+        assert normalize_database_uri('postgres://u@h/db') == 'postgresql://u@h/db'
+        assert normalize_database_uri('sqlite:///x.db') == 'sqlite:///x.db'
+
+    def test_sqlite_pragmas_on_every_connection(self, tmp_path):
+        """A file database runs in WAL with the tuned pragmas."""
+        engine = create_engine(f"sqlite:///{tmp_path / 'tuned.db'}",
+                               **engine_options('sqlite:///x.db'))
+        install_sqlite_pragmas(engine)
+        with engine.connect() as conn:
+            assert conn.execute(text('PRAGMA journal_mode')).scalar() == 'wal'
+            assert conn.execute(text('PRAGMA synchronous')).scalar() == 1   # NORMAL
+            assert conn.execute(text('PRAGMA foreign_keys')).scalar() == 1
+            assert conn.execute(text('PRAGMA busy_timeout')).scalar() == SQLITE_PRAGMAS['busy_timeout']
+        engine.dispose()
+
+    def test_app_enforces_foreign_keys(self, db):
+        assert db.session.execute(text('PRAGMA foreign_keys')).scalar() == 1
@@ -26,6 +26,39 @@ class TestCreateExam:
         resp = client.get('/api/exams')
         assert len(resp.get_json()) == 2
 
+    def test_get_exams_summary(self, client, db):
+        """List items carry per-type counts and total score, not questions."""
+        create_question_in_db(db, question_id='sm1', question_type='单选')
+        create_question_in_db(db, question_id='sm2', question_type='单选')
+        create_question_in_db(db, question_id='sm3', question_type='是非')
+        create_exam_in_db(db, exam_id='es1', config={'单选': {'count': 2, 'points': 5},
+                                                     '是非': {'count': 1, 'points': 2}},
+                          question_ids=['sm1', 'sm2', 'sm3'])
+        create_exam_in_db(db, exam_id='es2')
+        data = {e['exam_id']: e for e in client.get('/api/exams').get_json()}
+        assert 'questions' not in data['es1']
+        assert data['es1']['type_counts'] == {'单选': 2, '是非': 1}
+        assert data['es1']['question_count'] == 3
+        assert data['es1']['total_score'] == 12
+        assert data['es2']['question_count'] == 0
+
+    def test_get_exams_include_questions(self, client, db):
+        """include=questions embeds each exam's questions in position order."""
+        create_question_in_db(db, question_id='iq1')
+        create_question_in_db(db, question_id='iq2')
+        create_exam_in_db(db, exam_id='ei1', question_ids=['iq2', 'iq1'])
+        create_exam_in_db(db, exam_id='ei2', question_ids=['iq1'])
+        data = {e['exam_id']: e for e in client.get('/api/exams?include=questions').get_json()}
+        assert [q['question_id'] for q in data['ei1']['questions']] == ['iq2', 'iq1']
+        assert [q['question_id'] for q in data['ei2']['questions']] == ['iq1']
+
+    def test_get_exams_paged(self, client, db):
+        """limit/offset page through exams."""
+        for i in range(3):
+            create_exam_in_db(db, exam_id=f'ep{i}')
+        assert len(client.get('/api/exams?limit=2').get_json()) == 2
+        assert len(client.get('/api/exams?limit=2&offset=2').get_json()) == 1
+
 
 class TestGetExam:
     def test_get_exam_by_id(self, client, db):
@@ -116,6 +149,73 @@ class TestGenerateExam:
         assert len(data['questions']) == 1  # Only 1 available
 
 
+    def _generate(self, client, **body):
+        body.setdefault('config', {'单选': {'count': 3, 'points': 5}})
+        return client.post('/api/exams/generate', json=body).get_json()
+
+    def test_generate_is_random_and_seedable(self, client, db):
+        """Different seeds give different papers; the same seed repeats."""
+        for i in range(30):
+            create_question_in_db(db, question_id=f'rq{i:02d}', content=f'随机题{i}')
+        ids = lambda d: [q['question_id'] for q in d['questions']]
+        first = ids(self._generate(client, exam_id='rnd1', seed=1))
+        again = ids(self._generate(client, exam_id='rnd2', seed=1))
+        papers = {tuple(ids(self._generate(client, exam_id=f'rnd{s + 3}', seed=s))) for s in range(5)}
+        assert first == again
+        assert len(papers) > 1
+
+    def test_generate_difficulty_and_coverage(self, client, db):
+        """Difficulty mix and required knowledge points are honoured."""
+        for i in range(10):
+            create_question_in_db(db, question_id=f'de{i}', content=f'易题{i}', difficulty='easy')
+            create_question_in_db(db, question_id=f'dh{i}', content=f'难题{i}', difficulty='hard')
+        create_question_in_db(db, question_id='dkp', content='外部性题', difficulty='hard',
+                              knowledge_point='外部性')
+        data = self._generate(client, exam_id='dc1', seed=7,
+                              config={'单选': {'count': 4, 'points': 5}},
+                              difficulty={'easy': 0.5, 'hard': 0.5},
+                              knowledge_points=['外部性'])
+        picked = {q['question_id']: q['difficulty'] for q in data['questions']}
+        assert 'dkp' in picked
+        assert sorted(picked.values()) == ['easy', 'easy', 'hard', 'hard']
+        assert data['assembly_report']['unmet'] == []
+
+    def test_generate_reports_unmet_targets(self, client, db):
+        """Unsatisfiable targets come back as a best-effort paper plus report."""
+        create_question_in_db(db, question_id='um1', difficulty='easy')
+        data = self._generate(client, exam_id='um', config={
+            '单选': {'count': 2, 'points': 5, 'difficulty': {'hard': 2},
+                     'knowledge_points': ['不存在的知识点']},
+        })
+        assert [q['question_id'] for q in data['questions']] == ['um1']
+        kinds = sorted(u['kind'] for u in data['assembly_report']['unmet'])
+        assert kinds == ['count', 'difficulty', 'knowledge_point']
+
+    def test_generate_invalid_config(self, client, db):
+        resp = client.post('/api/exams/generate', json={'config': {'单选': {'count': 'x'}}})
+        assert resp.status_code == 400
+
+    def test_generate_rejects_malformed_constraints(self, client, db):
+        """Badly shaped constraints are a 400, not a 500 from the solver."""
+        create_question_in_db(db, question_id='mc1')
+        for body in ({'config': ['单选']},
+                     {'config': {'单选': 3}},
+                     {'config': {'单选': {'count': -1}}},
+                     {'config': {'单选': {'count': 2.5}}},
+                     {'config': {'单选': {'count': True}}},
+                     {'config': {'单选': {'count': 1, 'points': '5'}}},
+                     {'config': {'单选': {'count': 1, 'difficulty': ['easy']}}},
+                     {'config': {'单选': {'count': 1, 'difficulty': {'easy': 'x'}}}},
+                     {'config': {'单选': {'count': 1, 'difficulty': {'easy': -1}}}},
+                     {'config': {'单选': {'count': 1, 'knowledge_points': [1]}}},
+                     {'config': {'单选': {'count': 1}}, 'difficulty': 'easy'},
+                     {'config': {'单选': {'count': 1}}, 'knowledge_points': '外部性'}):
+            resp = client.post('/api/exams/generate', json=body)
+            assert resp.status_code == 400, body
+            assert resp.get_json()['error']
+        assert client.get('/api/exams').get_json() == []
+
+
 class TestConfirmRevert:
     def test_confirm_exam(self, client, db):
         """POST .../confirm marks questions as used."""
@@ -150,6 +250,46 @@ class TestConfirmRevert:
         assert resp.get_json()['is_used'] is False
 
 
+    def test_confirm_returns_counts_unless_exam_requested(self, client, db):
+        """Confirm returns counts only; ?include=exam adds the full exam."""
+        create_question_in_db(db, question_id='cc1')
+        create_question_in_db(db, question_id='cc2', content='题目2')
+        create_exam_in_db(db, exam_id='cce1', question_ids=['cc1', 'cc2'])
+        data = client.post('/api/exams/cce1/confirm').get_json()
+        assert data['question_count'] == 2
+        assert data['is_confirmed'] is True
+        assert 'exam' not in data
+        data = client.post('/api/exams/cce1/revert_confirmation?include=exam').get_json()
+        assert data['exam']['is_confirmed'] is False
+
+    def test_batch_confirm(self, client, db):
+        """POST /api/exams/batch-confirm confirms every exam at once."""
+        create_question_in_db(db, question_id='bc1')
+        create_question_in_db(db, question_id='bc2', content='题目2')
+        create_exam_in_db(db, exam_id='bce1', question_ids=['bc1'])
+        create_exam_in_db(db, exam_id='bce2', question_ids=['bc2'])
+        resp = client.post('/api/exams/batch-confirm', json={'exam_ids': ['bce1', 'bce2']})
+        assert resp.get_json()['confirmed_count'] == 2
+        assert resp.get_json()['question_count'] == 2
+        assert client.get('/api/exams/bce2').get_json()['is_confirmed'] is True
+        assert client.get('/api/questions/bc2').get_json()['is_used'] is True
+
+    def test_batch_confirm_rejects_malformed_exam_ids(self, client, db):
+        create_exam_in_db(db, 'ab')
+        for exam_ids in ('ab', [['ab']], [{'id': 'ab'}], ['ab', ''], [], None):
+            resp = client.post('/api/exams/batch-confirm', json={'exam_ids': exam_ids})
+            assert resp.status_code == 400, exam_ids
+        assert client.get('/api/exams/ab').get_json()['is_confirmed'] is False
+
+    def test_batch_confirm_missing_exam_changes_nothing(self, client, db):
+        """An unknown exam ID rejects the whole batch."""
+        create_question_in_db(db, question_id='bm1')
+        create_exam_in_db(db, exam_id='bme1', question_ids=['bm1'])
+        resp = client.post('/api/exams/batch-confirm', json={'exam_ids': ['bme1', 'nope']})
+        assert resp.status_code == 404
+        assert resp.get_json()['missing'] == ['nope']
+        assert client.get('/api/questions/bm1').get_json()['is_used'] is False
+
 class TestReplaceQuestion:
     def test_replace_question(self, client, db):
         """POST .../replace_question replaces question in exam."""
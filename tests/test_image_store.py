@@ -0,0 +1,416 @@
+"""Tests for the content-addressed image store, serving, derivatives and GC."""
+import hashlib
+import io
+import os
+import pytest
+from datetime import datetime, timedelta
+from docx import Document
+from sqlalchemy import event, update
+from app import image_derivatives, image_gc, routes, utils
+from app.db_models import ImageBlobModel, QuestionImageModel, QuestionModel
+from tests.conftest import create_question_in_db, create_exam_in_db
+
+PNG = bytes.fromhex(
+    '89504e470d0a1a0a0000000d4948445200000001000000010806000000'
+    '1f15c4890000000d49444154789c63f8cfc0f01f0005000201f5a7a76b0000000049454e44ae426082')
+SHA = hashlib.sha256(PNG).hexdigest()
+
+
+@pytest.fixture
+def images_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils, '_IMAGES_DIR', str(tmp_path))
+    return tmp_path
+
+
+def _upload(client, data=PNG):
+    resp = client.post('/api/images/upload', data={'file': (io.BytesIO(data), 'fig.png', 'image/png')},
+                       content_type='multipart/form-data')
+    assert resp.status_code == 201
+    return resp.get_json()['image_id']
+
+
+def _stored_files(images_dir):
+    return sorted(p.relative_to(images_dir).as_posix() for p in images_dir.rglob('*') if p.is_file())
+
+
+class TestImageStore:
+    def test_same_bytes_stored_once(self, client, db, images_dir):
+        """Each upload gets its own image_id; the bytes are stored once."""
+        first, second = _upload(client), _upload(client)
+        assert first != second
+        assert _stored_files(images_dir) == [f'{SHA[:2]}/{SHA}.png']
+        blob = db.session.get(ImageBlobModel, SHA)
+        assert (blob.ref_count, blob.file_size) == (2, len(PNG))
+        for image_id in (first, second):
+            resp = client.get(f'/api/images/{image_id}')
+            assert resp.data == PNG
+            assert resp.mimetype == 'image/png'
+
+    def test_file_removed_with_last_alias(self, client, db, images_dir):
+        first, second = _upload(client), _upload(client)
+        assert client.delete(f'/api/images/{first}').status_code == 200
+        assert db.session.get(ImageBlobModel, SHA).ref_count == 1
+        assert client.get(f'/api/images/{second}').data == PNG
+
+        assert client.delete(f'/api/images/{second}').status_code == 200
+        assert db.session.get(ImageBlobModel, SHA) is None
+        assert _stored_files(images_dir) == []
+
+    def test_known_content_is_not_written_again(self, db, images_dir, monkeypatch):
+        """Imports hash before writing; repeated figures cost no disk writes."""
+        utils.save_image_file(PNG, 'image/png')
+        writes = []
+        monkeypatch.setattr(utils, '_write_blob_file', lambda *a: writes.append(a))
+        for _ in range(3):
+            utils.save_image_file(PNG, 'image/png')
+        utils.save_image_file(io.BufferedReader(io.BytesIO(PNG)), 'image/png')
+        assert writes == []
+        assert db.session.get(ImageBlobModel, SHA).ref_count == 5
+
+    def test_unseekable_stream_is_spooled(self, db, images_dir):
+        class Pipe(io.RawIOBase):
+            def __init__(self, data):
+                self._data = io.BytesIO(data)
+
+            def readable(self):
+                return True
+
+            def readinto(self, buf):
+                return self._data.readinto(buf)
+
+        utils.save_image_file(Pipe(PNG * 3), 'image/png')
+        utils.save_image_file(Pipe(PNG * 3), 'image/png')
+        sha = hashlib.sha256(PNG * 3).hexdigest()
+        assert _stored_files(images_dir) == [f'{sha[:2]}/{sha}.png']
+        assert (images_dir / sha[:2] / f'{sha}.png').read_bytes() == PNG * 3
+
+    def test_deleting_question_releases_its_images(self, client, db, images_dir):
+        create_question_in_db(db, 'is1', content='第一题')
+        create_question_in_db(db, 'is2', content='第二题')
+        utils.save_image_file(PNG, 'image/png', question_id='is1')
+        utils.save_image_file(PNG, 'image/png', question_id='is2')
+        db.session.commit()
+        assert client.delete('/api/questions/is1').status_code == 200
+        assert db.session.get(ImageBlobModel, SHA).ref_count == 1
+        assert client.delete('/api/questions/is2').status_code == 200
+        assert QuestionImageModel.query.count() == 0
+        assert _stored_files(images_dir) == []
+
+    def test_files_removed_only_after_commit(self, db, images_dir):
+        create_question_in_db(db, 'rb1', content='第一题')
+        utils.save_image_file(PNG, 'image/png', question_id='rb1')
+        (images_dir / 'img_0ld0000a.png').write_bytes(PNG)
+        db.session.add(QuestionImageModel(image_id='img_0ld0000a', question_id='rb1',
+                                          filename='img_0ld0000a.png'))
+        db.session.commit()
+        files = _stored_files(images_dir)
+
+        utils.delete_question_images('rb1')
+        db.session.rollback()
+        assert QuestionImageModel.query.count() == 2
+        assert _stored_files(images_dir) == files
+        db.session.commit()   # the rolled-back removals stay dropped
+        assert _stored_files(images_dir) == files
+
+        utils.delete_question_images('rb1')
+        assert _stored_files(images_dir) == files
+        db.session.commit()
+        assert _stored_files(images_dir) == []
+
+    def test_failed_bulk_request_keeps_deleted_questions_files(self, client, db, images_dir, monkeypatch):
+        """A bulk delete rolled back by a failing create leaves every file in place."""
+        create_question_in_db(db, 'rb2', content='第二题')
+        utils.save_image_file(PNG, 'image/png', question_id='rb2')
+        db.session.commit()
+
+        def fail(items):
+            raise RuntimeError('index unavailable')
+        monkeypatch.setattr(routes.near_dup, 'index_questions', fail)
+        resp = client.post('/api/questions/bulk', json={'operations': [
+            {'op': 'delete', 'question_id': 'rb2'},
+            {'op': 'create', 'question': {'question_type': '简答', 'content': '新题'}},
+        ]})
+        assert resp.status_code == 500
+        assert db.session.get(QuestionModel, 'rb2') is not None
+        assert QuestionImageModel.query.filter_by(question_id='rb2').count() == 1
+        assert _stored_files(images_dir) == [f'{SHA[:2]}/{SHA}.png']
+
+    def test_legacy_files_adopted(self, db, images_dir):
+        """Flat img_xxx files move into the store, deduplicated, once committed."""
+        utils.save_image_file(PNG, 'image/png')
+        for image_id in ('img_0ld00001', 'img_0ld00002'):
+            (images_dir / f'{image_id}.png').write_bytes(PNG)
+            db.session.add(QuestionImageModel(image_id=image_id, filename=f'{image_id}.png'))
+        db.session.add(QuestionImageModel(image_id='img_0ld00003', filename='img_0ld00003.png'))
+        db.session.commit()
+
+        with db.engine.begin() as conn:
+            assert utils.adopt_legacy_images(conn) == 3
+            assert (images_dir / 'img_0ld00001.png').exists()
+        db.session.expire_all()
+        assert _stored_files(images_dir) == [f'{SHA[:2]}/{SHA}.png']
+        adopted = QuestionImageModel.query.filter_by(image_id='img_0ld00002').one()
+        assert (adopted.sha256, adopted.filename) == (SHA, f'{SHA[:2]}/{SHA}.png')
+        assert db.session.get(ImageBlobModel, SHA).ref_count == 3
+        # File missing: left for the caller to notice
+        assert QuestionImageModel.query.filter_by(image_id='img_0ld00003').one().sha256 is None
+
+
+class TestDeferredImages:
+    def test_batch_recorded_with_one_upsert_and_one_insert(self, db, images_dir):
+        """Queued images get owned rows in one statement each; unused ones get none."""
+        create_question_in_db(db, 'dq1', content='图一')
+        create_question_in_db(db, 'dq2', content='图二')
+        images = utils.DeferredImageWriter()
+        a, b, c = images.save(PNG, 'image/png'), images.save(PNG, 'image/png'), images.save(PNG * 2, 'image/png')
+        unused = images.save(PNG * 3, 'image/png')
+        statements = []
+        listener = lambda conn, cursor, stmt, *a: statements.append(stmt)
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            assert images.persist({a: 'dq1', b: 'dq1', c: 'dq2'}) == 3
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', listener)
+        db.session.commit()
+
+        assert sum('INSERT INTO image_blobs' in stmt for stmt in statements) == 1
+        assert sum('INSERT INTO question_images' in stmt for stmt in statements) == 1
+        owners = dict(db.session.query(QuestionImageModel.image_id, QuestionImageModel.question_id))
+        assert owners == {a: 'dq1', b: 'dq1', c: 'dq2'}
+        assert db.session.get(ImageBlobModel, SHA).ref_count == 2
+        assert db.session.get(ImageBlobModel, hashlib.sha256(PNG * 2).hexdigest()).ref_count == 1
+        assert unused not in owners
+        assert images.persist({}) == 0   # the queue was emptied
+        # The file written for the unused image went with the commit
+        assert _stored_files(images_dir) == sorted(
+            f'{sha[:2]}/{sha}.png' for sha in (SHA, hashlib.sha256(PNG * 2).hexdigest()))
+
+    def test_dropped_images_files_kept_until_commit(self, db, images_dir):
+        images = utils.DeferredImageWriter()
+        images.save(PNG, 'image/png')
+        assert images.persist({}) == 0
+        assert _stored_files(images_dir) == [f'{SHA[:2]}/{SHA}.png']
+        db.session.rollback()
+        assert _stored_files(images_dir) == [f'{SHA[:2]}/{SHA}.png']
+        images.save(PNG, 'image/png')   # reuses the file: not created, not removed
+        images.persist({})
+        db.session.commit()
+        assert _stored_files(images_dir) == [f'{SHA[:2]}/{SHA}.png']
+
+    def test_docx_parsed_without_writer_saves_images_directly(self, db, images_dir, tmp_path):
+        from tests.test_docx_importer import _bank
+        (tmp_path / 'dot.png').write_bytes(PNG)
+        path = _bank(tmp_path / 'bank.docx', tmp_path / 'dot.png', count=2)
+        questions = routes._parse_import_file(str(path), 'bank.docx')
+        db.session.commit()
+        image_ids = [image_id for q in questions for image_id in q['images']]
+        assert len(image_ids) == 2
+        assert QuestionImageModel.query.filter(QuestionImageModel.image_id.in_(image_ids)).count() == 2
+
+    def test_docx_import_owns_images_without_html_scan(self, client, db, images_dir, tmp_path, monkeypatch):
+        from tests.test_docx_importer import _bank
+        (tmp_path / 'dot.png').write_bytes(PNG)
+        path = _bank(tmp_path / 'bank.docx', tmp_path / 'dot.png', count=2)
+        monkeypatch.setattr(routes, '_associate_images_bulk', lambda *a: pytest.fail('scanned HTML'))
+
+        def upload():
+            return client.post('/api/questions/import', data={'file': (io.BytesIO(path.read_bytes()), 'bank.docx')},
+                               content_type='multipart/form-data').get_json()
+
+        assert upload()['imported'] == 3
+        rows = QuestionImageModel.query.all()
+        assert len(rows) == 2
+        for row in rows:
+            assert row.image_id in db.session.get(QuestionModel, row.question_id).content
+        assert db.session.get(ImageBlobModel, SHA).ref_count == 2
+        # Re-importing skips every question as a duplicate and stores no images
+        assert upload()['imported'] == 0
+        assert QuestionImageModel.query.count() == 2
+
+
+class TestImageServing:
+    def test_cacheable_forever_with_content_etag(self, client, images_dir):
+        resp = client.get(f'/api/images/{_upload(client)}')
+        assert resp.data == PNG
+        assert resp.headers['ETag'] == f'"{SHA}"'
+        cache_control = resp.cache_control
+        assert (cache_control.public, cache_control.immutable, cache_control.max_age) == \
+            (True, True, 365 * 24 * 3600)
+
+    def test_revalidation_and_repeat_requests_skip_database(self, client, db, images_dir):
+        image_id = _upload(client)
+        client.get(f'/api/images/{image_id}')
+        statements = []
+        listener = lambda conn, cursor, stmt, *a: statements.append(stmt)
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            resp = client.get(f'/api/images/{image_id}', headers={'If-None-Match': f'"{SHA}"'})
+            assert resp.status_code == 304
+            assert resp.data == b''
+            assert resp.headers['ETag'] == f'"{SHA}"'
+            assert client.get(f'/api/images/{image_id}').data == PNG
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', listener)
+        assert statements == []
+
+    def test_deleted_image_is_not_served_from_cache(self, client, images_dir):
+        image_id = _upload(client)
+        client.get(f'/api/images/{image_id}')
+        client.delete(f'/api/images/{image_id}')
+        assert client.get(f'/api/images/{image_id}').status_code == 404
+
+    def test_x_sendfile(self, app, client, images_dir):
+        app.config['USE_X_SENDFILE'] = True
+        resp = client.get(f'/api/images/{_upload(client)}')
+        assert resp.headers['X-Sendfile'] == str(images_dir / SHA[:2] / f'{SHA}.png')
+        assert resp.data == b''
+
+
+class TestImageDerivatives:
+    def _thumb(self, images_dir, data=PNG):
+        path = image_derivatives.derivative_path(str(images_dir / SHA[:2] / f'{SHA}.png'), 'thumb')
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def test_size_falls_back_to_original_until_generated(self, client, images_dir):
+        image_id = _upload(client)
+        resp = client.get(f'/api/images/{image_id}?size=thumb')
+        assert resp.data == PNG
+        assert resp.cache_control.no_cache
+        assert not resp.cache_control.immutable
+
+        thumb = b'thumbnail bytes'
+        self._thumb(images_dir, thumb)
+        resp = client.get(f'/api/images/{image_id}?size=thumb', headers={'If-None-Match': f'"{SHA}"'})
+        assert resp.data == thumb
+        assert resp.headers['ETag'] == f'"{SHA}.thumb"'
+        assert resp.cache_control.immutable
+        assert client.get(f'/api/images/{image_id}?size=huge').status_code == 400
+
+    def test_derivatives_removed_with_original(self, client, images_dir):
+        image_id = _upload(client)
+        path = self._thumb(images_dir)
+        client.delete(f'/api/images/{image_id}')
+        assert not os.path.exists(path)
+        assert _stored_files(images_dir) == []
+
+    def test_export_embeds_print_variant(self, db, images_dir, tmp_path):
+        image_id = utils.save_image_file(PNG, 'image/png')
+        printed = PNG + b'print'
+        with open(image_derivatives.derivative_path(utils.image_path(
+                QuestionImageModel.query.filter_by(image_id=image_id).one().filename), 'print'), 'wb') as f:
+            f.write(printed)
+        create_question_in_db(db, 'idp1', content=f'<p>图</p><img src="/api/images/{image_id}">')
+        exam = create_exam_in_db(db, 'idpe', question_ids=['idp1'])
+        out = tmp_path / 'print.docx'
+        utils.export_exam_to_word(exam, str(out))
+        images = [rel.target_part.blob for rel in Document(str(out)).part.rels.values()
+                  if 'image' in rel.reltype]
+        assert images == [printed]
+
+    def test_generated_variants(self, images_dir):
+        Image = pytest.importorskip('PIL.Image')
+        source = io.BytesIO()
+        Image.new('RGB', (2400, 1200), 'white').save(source, 'PNG')
+        path = str(images_dir / 'big.png')
+        with open(path, 'wb') as f:
+            f.write(source.getvalue())
+        image_derivatives.schedule(path).result(timeout=30)
+        sizes = {name: Image.open(image_derivatives.derivative_path(path, name)).size
+                 for name in image_derivatives.VARIANTS}
+        assert sizes == {'thumb': (320, 160), 'print': (1050, 525), 'webp': (1600, 800)}
+
+
+class TestImageGC:
+    def _age(self, db, image_ids, hours=48):
+        db.session.execute(update(QuestionImageModel).where(QuestionImageModel.image_id.in_(image_ids))
+                           .values(created_at=datetime.now() - timedelta(hours=hours)))
+        db.session.commit()
+
+    def _image_selects(self, db, fn):
+        statements = []
+        listener = lambda conn, cursor, stmt, *a: statements.append(stmt)
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            result = fn()
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', listener)
+        return result, [s for s in statements if s.startswith('SELECT') and 'question_images' in s]
+
+    def test_collects_old_unowned_images(self, client, db, images_dir):
+        create_question_in_db(db, 'gc1', content='保留')
+        create_question_in_db(db, 'gc2', content='将被删除')
+        owned = utils.save_image_file(PNG, 'image/png', question_id='gc1')
+        dangling = utils.save_image_file(PNG * 2, 'image/png', question_id='gc2')
+        abandoned = _upload(client, PNG * 3)
+        fresh = _upload(client, PNG * 4)
+        db.session.commit()
+        # Dangling owner, as left in databases written without foreign keys
+        with db.engine.connect() as conn:
+            conn.exec_driver_sql('PRAGMA foreign_keys=OFF')
+            conn.execute(QuestionModel.__table__.delete().where(QuestionModel.question_id == 'gc2'))
+            conn.commit()
+            conn.exec_driver_sql('PRAGMA foreign_keys=ON')
+        self._age(db, [owned, dangling, abandoned])
+
+        resp = client.post('/api/images/gc', json={'grace_hours': 24})
+        assert resp.get_json() == {'images': 2, 'blobs': 2, 'files': 0}
+        remaining = {image_id for (image_id,) in db.session.query(QuestionImageModel.image_id)}
+        assert remaining == {owned, fresh}
+        assert len(_stored_files(images_dir)) == 2
+        for grace_hours in (-1, 0, 0.5):
+            assert client.post('/api/images/gc', json={'grace_hours': grace_hours}).status_code == 400
+
+    def test_anti_join_batches(self, client, db, images_dir):
+        ids = [_upload(client, PNG + bytes([i])) for i in range(5)]
+        self._age(db, ids)
+        result, selects = self._image_selects(db, lambda: image_gc.collect(batch_size=2))
+        assert result['images'] == 5
+        # One anti-join per batch; the last batch is short
+        assert len(selects) == 3
+        assert all('LEFT OUTER JOIN questions' in s for s in selects)
+        assert QuestionImageModel.query.count() == 0
+
+    def test_sweeps_untracked_store_files(self, client, db, images_dir):
+        _upload(client)
+        derived = image_derivatives.derivative_path(utils.image_path(f'{SHA[:2]}/{SHA}.png'), 'thumb')
+        stray_sha = hashlib.sha256(b'rolled back').hexdigest()
+        stray = images_dir / stray_sha[:2] / f'{stray_sha}.png'
+        stray.parent.mkdir(exist_ok=True)
+        recent = images_dir / 'tmp1234.part'
+        for path in (derived, stray, recent):
+            with open(path, 'wb') as f:
+                f.write(b'x')
+        old = (datetime.now() - timedelta(hours=48)).timestamp()
+        os.utime(derived, (old, old))
+        os.utime(stray, (old, old))
+
+        assert image_gc.collect()['files'] == 1
+        assert not stray.exists()
+        assert os.path.exists(derived)
+        assert recent.exists()
+
+    def test_sweep_keeps_file_reused_by_in_flight_import(self, db, images_dir):
+        """Staging bytes the store already has touches the file before its row exists."""
+        path = images_dir / SHA[:2] / f'{SHA}.png'
+        path.parent.mkdir()
+        path.write_bytes(PNG)
+        old = (datetime.now() - timedelta(hours=48)).timestamp()
+        os.utime(path, (old, old))
+
+        assert utils._stage_blob_file(PNG, 'image/png')[3] is False
+        assert image_gc.collect(timedelta(0))['files'] == 0
+        assert path.exists()
+
+    def test_batch_delete_resolves_images_in_one_query(self, client, db, images_dir):
+        for i in range(3):
+            create_question_in_db(db, f'bd{i}', content=f'批量删除{i}')
+            utils.save_image_file(PNG + bytes([i]), 'image/png', question_id=f'bd{i}')
+        db.session.commit()
+        resp, selects = self._image_selects(db, lambda: client.post(
+            '/api/questions/batch-delete', json={'question_ids': ['bd0', 'bd1', 'bd2']}))
+        assert resp.get_json()['deleted_count'] == 3
+        assert len(selects) == 1
+        assert QuestionImageModel.query.count() == 0
+        assert _stored_files(images_dir) == []
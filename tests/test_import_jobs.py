@@ -0,0 +1,110 @@
+"""Tests for background import jobs."""
+import io
+import json
+from app import import_jobs, routes, utils
+from app.db_models import QuestionImageModel, QuestionModel
+from tests.conftest import create_question_in_db
+from tests.test_docx_importer import PNG, _bank
+
+
+def _txt(count, prefix='后台导入题目'):
+    body = '\n'.join(f'[简答]\n{prefix}第{i}题：说明第{i}种成本结构的特点。' for i in range(count))
+    return io.BytesIO(body.encode('utf-8'))
+
+
+def _start(client, file, name='bank.txt', **form):
+    resp = client.post('/api/questions/import', data={'file': (file, name), 'async': '1', **form},
+                       content_type='multipart/form-data')
+    assert resp.status_code == 202
+    return resp.get_json()
+
+
+def _wait(job_id):
+    job = import_jobs.get_job(job_id)
+    while not job.finished:
+        job.wait(job.version, timeout=5)
+    return job
+
+
+class TestImportJobs:
+    def test_async_import_returns_job_and_progress(self, client, db, app):
+        """Upload returns at once; the job inserts in batches and reports counts."""
+        app.config['IMPORT_BATCH_SIZE'] = 4
+        create_question_in_db(db, question_id='bg_dup', content='后台导入题目第0题：说明第0种成本结构的特点。')
+        started = _start(client, _txt(10))
+        assert started['status_url'] == f"/api/import-jobs/{started['job_id']}"
+        _wait(started['job_id'])
+
+        status = client.get(started['status_url']).get_json()
+        assert status['status'] == 'completed'
+        assert (status['total'], status['parsed'], status['inserted'], status['skipped'],
+                status['failed']) == (10, 10, 9, 1, 0)
+        assert status['batches_committed'] == 3
+        assert status['duplicates'][0]['existing_question_id'] == 'bg_dup'
+        assert QuestionModel.query.count() == 10
+
+    def test_failed_batch_keeps_committed_batches(self, client, db, app, monkeypatch):
+        """A batch that raises is rolled back; the others stay committed."""
+        app.config['IMPORT_BATCH_SIZE'] = 3
+        original = routes._check_import_near_duplicates
+        calls = []
+
+        def flaky(models, skip):
+            calls.append(1)
+            if len(calls) == 2:
+                raise RuntimeError('disk full')
+            return original(models, skip)
+
+        monkeypatch.setattr(routes, '_check_import_near_duplicates', flaky)
+        job = _wait(_start(client, _txt(8))['job_id'])
+        assert job.status == 'partial'
+        assert (job.inserted, job.failed) == (5, 3)
+        assert job.batches_failed == 1
+        assert 'disk full' in job.errors[0]
+        assert QuestionModel.query.count() == 5
+
+    def test_docx_batches_commit_while_parsing(self, client, db, app, tmp_path, monkeypatch):
+        """Each batch is inserted, with its images, before the next is parsed."""
+        app.config['IMPORT_BATCH_SIZE'] = 2
+        monkeypatch.setattr(utils, '_IMAGES_DIR', str(tmp_path / 'images'))
+        (tmp_path / 'dot.png').write_bytes(PNG)
+        path = _bank(tmp_path / 'bank.docx', tmp_path / 'dot.png', count=4)
+        original = routes._import_question_batch
+        parsed_at_insert = []
+
+        def record(batch, *args):
+            parsed_at_insert.append((len(batch), QuestionImageModel.query.count()))
+            return original(batch, *args)
+
+        monkeypatch.setattr(routes, '_import_question_batch', record)
+        job = _wait(_start(client, io.BytesIO(path.read_bytes()), name='bank.docx')['job_id'])
+        assert job.status == 'completed'
+        assert (job.total, job.inserted, job.batches_committed) == (5, 5, 3)
+        # Image rows are inserted with their batch, not while parsing
+        assert [n for n, _ in parsed_at_insert] == [2, 2, 1]
+        assert [images for _, images in parsed_at_insert] == [0, 2, 4]
+        for q in QuestionModel.query.filter(QuestionModel.question_type == '单选'):
+            (image,) = QuestionImageModel.query.filter_by(question_id=q.question_id).all()
+            assert image.image_id in q.content
+
+    def test_event_stream_ends_with_done(self, client, db):
+        job_id = _start(client, _txt(2))['job_id']
+        resp = client.get(f'/api/import-jobs/{job_id}/events')
+        assert resp.mimetype == 'text/event-stream'
+        body = resp.get_data(as_text=True)
+        last = body.strip().split('\n\n')[-1]
+        assert last.startswith('event: done')
+        assert json.loads(last.split('data: ', 1)[1])['inserted'] == 2
+
+    def test_unknown_job(self, client, db):
+        assert client.get('/api/import-jobs/job_missing').status_code == 404
+        assert client.get('/api/import-jobs/job_missing/events').status_code == 404
+
+    def test_list_fields_extended_under_the_lock(self):
+        job = import_jobs.ImportJob('bank.txt')
+        snapshot = job.to_dict()
+        job.update(batches_committed=1, extend={'duplicates': [{'index': 0}]})
+        job.finish(error='boom')
+        assert snapshot['duplicates'] == [] and snapshot['errors'] == []
+        assert (job.duplicates, job.errors, job.status) == ([{'index': 0}], ['boom'], 'partial')
+        assert job.version == 2
@@ -3,6 +3,7 @@ import json
 import pytest
 from datetime import datetime
 from app.db_models import db, QuestionModel, ExamModel, exam_questions
+from app.utils import content_hash, normalize_question_text
 from tests.conftest import create_question_in_db, create_exam_in_db
 
 
@@ -76,6 +77,36 @@ class TestQuestionModel:
         assert d['reference_answer'] is None
 
 
+    def test_content_hash_set_and_refreshed(self, app, db):
+        """content_hash is filled on insert and recomputed when content changes."""
+        q = create_question_in_db(db, question_id='ch1', content='<p>森林 经济学</p>')
+        assert q.content_hash == content_hash('森林经济学')
+        q.content = '新内容'
+        db.session.commit()
+        assert q.content_hash == content_hash('新内容')
+
+
+class TestContentNormalization:
+    def test_html_and_whitespace_ignored(self):
+        """Markup, entities, CJK spacing and full-width punctuation don't matter."""
+        assert content_hash('<p>什么是 <b>机会成本</b>？</p>') == content_hash('什么是机会成本?')
+        assert content_hash('What&nbsp;is   <em>rent</em>?') == content_hash('what is rent?')
+
+    def test_latin_word_boundaries_kept(self):
+        """Spaces between Latin words still separate tokens."""
+        assert normalize_question_text('forest rent') != normalize_question_text('forestrent')
+
+    def test_images_keep_their_identity(self):
+        """Questions that differ only by figure don't hash alike."""
+        a = '如图所示，求面积。<img src="/api/images/img_0a1b2c3d" style="max-width:100%">'
+        b = '如图所示，求面积。<img src="/api/images/img_4e5f6a7b" style="max-width:100%">'
+        assert content_hash(a) != content_hash(b)
+        assert content_hash(a) == content_hash('<p>如图所示,求面积。<img src="/api/images/img_0a1b2c3d"></p>')
+        # A re-imported copy of the figure has a new image_id but the same blob
+        blobs = {'img_0a1b2c3d': 'f' * 64, 'img_99999999': 'f' * 64}
+        assert content_hash(a, blobs) == content_hash(a.replace('0a1b2c3d', '99999999'), blobs)
+
+
 class TestExamModel:
     def test_create_exam_model(self, app, db):
         """Create an ExamModel and verify fields."""
@@ -0,0 +1,120 @@
+"""Tests for the MinHash LSH near-duplicate index."""
+import io
+from app import near_dup
+from app.db_models import QuestionSignatureModel, question_lsh_buckets
+from tests.conftest import create_question_in_db
+
+BASE = '在完全竞争市场中，企业的短期供给曲线是边际成本曲线位于平均可变成本曲线最低点以上的部分。'
+REWORDED = '在完全竞争的市场中，企业短期供给曲线是：边际成本曲线位于平均可变成本曲线最低点以上的那部分'
+# Close enough to trip the default import threshold (0.7).
+LIGHT_EDIT = '在完全竞争市场中，企业短期供给曲线是边际成本曲线位于平均可变成本曲线最低点以上的部分'
+UNRELATED = '森林资源资产评估中常用的方法包括市场价格法、收益现值法和重置成本法等。'
+
+
+class TestSignature:
+    def test_similar_texts_score_high(self):
+        """Reworded copies score well above unrelated text."""
+        sig = near_dup.signature(BASE)
+        assert near_dup.similarity(sig, near_dup.signature(REWORDED)) >= 0.6
+        assert near_dup.similarity(sig, near_dup.signature(UNRELATED)) < 0.2
+
+    def test_formatting_ignored(self):
+        """HTML and punctuation width give identical signatures."""
+        assert near_dup.signature('<p>什么是 <b>机会成本</b>？</p>') == near_dup.signature('什么是机会成本?')
+
+    def test_empty_text_not_bucketed(self):
+        assert near_dup.bucket_keys(near_dup.signature('')) == []
+
+
+class TestIndexSync:
+    def test_insert_update_delete(self, client, db):
+        """Index rows follow ORM inserts, content edits and deletes."""
+        create_question_in_db(db, question_id='nd1', content=BASE)
+        assert db.session.get(QuestionSignatureModel, 'nd1') is not None
+        before = db.session.get(QuestionSignatureModel, 'nd1').signature
+
+        client.put('/api/questions/nd1', json={'content': UNRELATED})
+        db.session.expire_all()
+        assert db.session.get(QuestionSignatureModel, 'nd1').signature != before
+
+        client.delete('/api/questions/nd1')
+        assert db.session.get(QuestionSignatureModel, 'nd1') is None
+        assert db.session.execute(question_lsh_buckets.select()).all() == []
+
+    def test_batch_delete_unindexes(self, client, db):
+        create_question_in_db(db, question_id='nb1', content=BASE)
+        client.post('/api/questions/batch-delete', json={'question_ids': ['nb1']})
+        assert db.session.query(QuestionSignatureModel).count() == 0
+
+
+class TestNearDuplicateApi:
+    def test_lookup_by_question(self, client, db):
+        create_question_in_db(db, question_id='lq1', content=BASE)
+        create_question_in_db(db, question_id='lq2', content=REWORDED)
+        create_question_in_db(db, question_id='lq3', content=UNRELATED)
+        data = client.get('/api/questions/near-duplicates?question_id=lq1&threshold=0.5').get_json()
+        assert [m['question_id'] for m in data['matches']] == ['lq2']
+
+    def test_check_candidate_texts(self, client, db):
+        create_question_in_db(db, question_id='cq1', content=BASE)
+        resp = client.post('/api/questions/near-duplicates',
+                           json={'contents': [REWORDED, UNRELATED], 'threshold': 0.5})
+        results = resp.get_json()['results']
+        assert [m['question_id'] for m in results[0]['matches']] == ['cq1']
+        assert results[1]['matches'] == []
+
+    def test_bank_pairs(self, client, db):
+        create_question_in_db(db, question_id='bp1', content=BASE)
+        create_question_in_db(db, question_id='bp2', content=REWORDED)
+        create_question_in_db(db, question_id='bp3', content=UNRELATED)
+        pairs = client.get('/api/questions/near-duplicates?threshold=0.5').get_json()['pairs']
+        assert [(p['question_id'], p['other_question_id']) for p in pairs] == [('bp1', 'bp2')]
+
+    def test_bank_pairs_paginate(self, client, db):
+        for i in range(5):
+            create_question_in_db(db, question_id=f'pg{i}a', content=f'{BASE}第{i}组')
+            create_question_in_db(db, question_id=f'pg{i}b', content=f'{REWORDED}第{i}组')
+        seen, after = [], None
+        while True:
+            url = '/api/questions/near-duplicates?threshold=0.5&limit=2' + (f'&after={after}' if after else '')
+            data = client.get(url).get_json()
+            seen += [(p['question_id'], p['other_question_id']) for p in data['pairs']]
+            after = data['next_after']
+            if after is None:
+                break
+        assert len(seen) == len(set(seen))
+        assert {('pg0a', 'pg0b'), ('pg4a', 'pg4b')} <= set(seen)
+
+    def test_bank_scan_skips_crowded_buckets(self, db, monkeypatch):
+        create_question_in_db(db, question_id='cb1', content=BASE)
+        create_question_in_db(db, question_id='cb2', content=BASE)
+        assert near_dup.bank_near_duplicate_pairs()[0]
+        monkeypatch.setattr(near_dup, 'MAX_BUCKET_SIZE', 1)
+        assert near_dup.bank_near_duplicate_pairs() == ([], None)
+
+    def test_invalid_threshold(self, client, db):
+        assert client.get('/api/questions/near-duplicates?threshold=2').status_code == 400
+
+
+class TestImportCheck:
+    def _import(self, client, text, **form):
+        data = {'file': (io.BytesIO(text.encode('utf-8')), 'nd.txt'), **form}
+        return client.post('/api/questions/import', data=data,
+                           content_type='multipart/form-data').get_json()
+
+    def test_import_flags_near_duplicates(self, client, db):
+        """Near copies are imported but reported with their matches."""
+        create_question_in_db(db, question_id='iq_orig', content=BASE)
+        result = self._import(client, f'[简答]\n{LIGHT_EDIT}\n[简答]\n{UNRELATED}\n')
+        assert result['imported'] == 2
+        assert len(result['near_duplicates']) == 1
+        flagged = result['near_duplicates'][0]
+        assert flagged['matches'][0]['question_id'] == 'iq_orig'
+        assert flagged['skipped'] is False
+
+    def test_import_can_skip_near_duplicates(self, client, db):
+        """skip_near_duplicates=1 drops near copies, including within the batch."""
+        result = self._import(client, f'[简答]\n{BASE}\n[简答]\n{LIGHT_EDIT}\n',
+                              skip_near_duplicates='1')
+        assert result['imported'] == 1
+        assert result['skipped'] == 1
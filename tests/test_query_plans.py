@@ -0,0 +1,142 @@
+"""Query-plan regression tests for the hot question-bank queries.
+
+Each test runs a real endpoint or helper, captures the SQL it sends, and
+checks SQLite's EXPLAIN QUERY PLAN for every statement: none may fall
+back to a full table scan or sort an exam's questions with a temp B-tree.
+"""
+import re
+from sqlalchemy import create_engine, event, inspect, text
+from app.db_models import db as models
+from app.assembly import load_candidates
+from app.migrations import MIGRATIONS, current_version, run_migrations
+from tests.conftest import create_question_in_db, create_exam_in_db
+
+HOT_TABLES = ('questions', 'exam_questions', 'exams', 'question_images')
+_FULL_SCAN = re.compile(r'^SCAN (%s)$' % '|'.join(HOT_TABLES))
+
+
+class _CaptureSQL:
+    """Record (statement, parameters) of single-row executions on an engine."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = []
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE')):
+            self.statements.append((statement, parameters))
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self)
+
+
+def _plans(db, statements):
+    conn = db.engine.raw_connection()
+    try:
+        for statement, parameters in statements:
+            rows = conn.execute('EXPLAIN QUERY PLAN ' + statement, parameters).fetchall()
+            yield statement, [row[-1] for row in rows]
+    finally:
+        conn.close()
+
+
+def _assert_indexed(db, capture, forbid_sort_on=()):
+    assert capture.statements, 'no SQL captured'
+    for statement, plan in _plans(db, capture.statements):
+        scans = [step for step in plan if _FULL_SCAN.match(step)]
+        assert not scans, f'full scan {scans} in:\n{statement}\nplan: {plan}'
+        for table in forbid_sort_on:
+            if table in statement and 'ORDER BY' in statement:
+                assert not any('TEMP B-TREE' in step for step in plan), \
+                    f'sort step in:\n{statement}\nplan: {plan}'
+
+
+def _seed(db):
+    for i in range(6):
+        create_question_in_db(db, question_id=f'qp{i}', question_type=('单选', '简答')[i % 2],
+                              content=f'计划题目{i}', difficulty=('易', '难')[i % 2])
+    create_exam_in_db(db, exam_id='qpe', question_ids=['qp0', 'qp1', 'qp2'])
+
+
+class TestHotQueryPlans:
+    def test_question_list_filters(self, client, db):
+        _seed(db)
+        urls = ['/api/questions?type=单选', '/api/questions?subject=林业经济学',
+                '/api/questions?subject=林业经济学&type=简答&difficulty=难',
+                '/api/questions?type=单选&is_used=0',
+                '/api/questions/facets?subject=林业经济学']
+        for url in urls:
+            with _CaptureSQL(db.engine) as capture:
+                assert client.get(url).status_code == 200
+            _assert_indexed(db, capture)
+
+    def test_assembly_candidates(self, db):
+        _seed(db)
+        for subject in (None, '林业经济学'):
+            with _CaptureSQL(db.engine) as capture:
+                load_candidates('单选', subject)
+            _assert_indexed(db, capture)
+
+    def test_exam_detail_and_list(self, client, db):
+        _seed(db)
+        with _CaptureSQL(db.engine) as capture:
+            client.get('/api/exams/qpe')
+            client.get('/api/exams?include=questions&limit=10')
+        _assert_indexed(db, capture, forbid_sort_on=('exam_questions',))
+
+    def test_usage_marking_and_delete(self, client, db):
+        _seed(db)
+        with _CaptureSQL(db.engine) as capture:
+            responses = [
+                client.post('/api/exams/qpe/confirm'),
+                client.post('/api/exams/qpe/revert_confirmation'),
+                client.post('/api/questions/batch-delete', json={'question_ids': ['qp4', 'qp5']}),
+            ]
+        assert [r.status_code for r in responses] == [200, 200, 200]
+        _assert_indexed(db, capture)
+
+    def test_duplicate_lookup_on_import(self, client, db):
+        import io
+        _seed(db)
+        with _CaptureSQL(db.engine) as capture:
+            client.post('/api/questions/import', data={
+                'file': (io.BytesIO('[简答]\n计划题目1'.encode('utf-8')), 'dup.txt')},
+                content_type='multipart/form-data')
+        _assert_indexed(db, capture)
+
+
+class TestSchemaMigrations:
+    def test_fresh_database_is_current(self, db):
+        with db.engine.connect() as conn:
+            assert current_version(conn) == MIGRATIONS[-1].version
+        assert run_migrations(db.engine) == []
+
+    def test_upgrades_database_from_before_the_migrations(self, app, tmp_path):
+        engine = create_engine(f'sqlite:///{tmp_path / "old.db"}')
+        models.metadata.create_all(engine, tables=[
+            t for t in models.metadata.sorted_tables if t.name != 'question_images'])
+        with engine.begin() as conn:
+            conn.execute(text(
+                'CREATE TABLE question_images (id INTEGER PRIMARY KEY, image_id VARCHAR(64) UNIQUE, '
+                'question_id VARCHAR(64), field VARCHAR(32), filename VARCHAR(256) NOT NULL, '
+                'original_name VARCHAR(256), content_type VARCHAR(64), file_size INTEGER, '
+                'created_at DATETIME)'))
+            for index in ('ix_questions_content_hash', 'ix_questions_created_at_question_id'):
+                conn.execute(text(f'DROP INDEX {index}'))
+            conn.execute(text('ALTER TABLE questions DROP COLUMN content_hash'))
+            conn.execute(text("INSERT INTO questions (question_id, question_type, content) "
+                              "VALUES ('q1', ' 单选 ', '题干')"))
+
+        assert run_migrations(engine) == [m.version for m in MIGRATIONS]
+        schema = inspect(engine)
+        assert 'sha256' in {c['name'] for c in schema.get_columns('question_images')}
+        assert {'ix_questions_content_hash', 'ix_questions_created_at_question_id'} <= \
+            {i['name'] for i in schema.get_indexes('questions')}
+        with engine.connect() as conn:
+            row = conn.execute(text('SELECT question_type, content_hash FROM questions')).one()
+        assert row.question_type == '单选' and row.content_hash
+        engine.dispose()
@@ -2,6 +2,8 @@
 import json
 import io
 import pytest
+from datetime import datetime
+from app.db_models import QuestionModel
 from tests.conftest import create_question_in_db
 
 
@@ -68,7 +70,8 @@ class TestGetQuestions:
         """Empty database returns empty list."""
         resp = client.get('/api/questions')
         assert resp.status_code == 200
-        assert resp.get_json() == []
+        assert resp.get_json()['questions'] == []
+        assert resp.get_json()['total'] == 0
 
     def test_get_questions_list(self, client, db):
         """Returns correct list when data exists."""
@@ -76,7 +79,7 @@ class TestGetQuestions:
         create_question_in_db(db, question_id='q2', content='题目二')
         resp = client.get('/api/questions')
         assert resp.status_code == 200
-        data = resp.get_json()
+        data = resp.get_json()['questions']
         assert len(data) == 2
 
     def test_get_question_by_id(self, client, db):
@@ -92,6 +95,110 @@ class TestGetQuestions:
         assert resp.status_code == 404
 
 
+
+class TestQuestionPagination:
+    def test_keyset_pages_cover_all_rows(self, client, db):
+        """Following next_cursor walks every row once, in (created_at, id) order."""
+        for i in range(7):
+            create_question_in_db(db, question_id=f'pg{i}', content=f'分页题目{i}')
+        seen = []
+        cursor = None
+        while True:
+            url = '/api/questions?limit=3' + (f'&cursor={cursor}' if cursor else '')
+            page = client.get(url).get_json()
+            assert page['total'] == 7
+            assert page['limit'] == 3
+            seen.extend(q['question_id'] for q in page['questions'])
+            cursor = page['next_cursor']
+            if not cursor:
+                break
+        assert seen == [f'pg{i}' for i in range(7)]
+
+    def test_same_created_at_ties_broken_by_id(self, client, db):
+        """Rows sharing created_at are split across pages without loss."""
+        for qid in ('tb3', 'tb1', 'tb2'):
+            create_question_in_db(db, question_id=qid)
+        db.session.query(QuestionModel).update({'created_at': datetime(2024, 1, 1)})
+        db.session.commit()
+        first = client.get('/api/questions?limit=2').get_json()
+        second = client.get(f"/api/questions?limit=2&cursor={first['next_cursor']}").get_json()
+        assert [q['question_id'] for q in first['questions']] == ['tb1', 'tb2']
+        assert [q['question_id'] for q in second['questions']] == ['tb3']
+        assert second['next_cursor'] is None
+
+    def test_total_respects_filters(self, client, db):
+        """total counts only rows matching the filters, not just the page."""
+        for i in range(4):
+            create_question_in_db(db, question_id=f'tf{i}', question_type='单选')
+        create_question_in_db(db, question_id='tf_x', question_type='是非')
+        page = client.get('/api/questions?type=单选&limit=1').get_json()
+        assert page['total'] == 4
+        assert len(page['questions']) == 1
+
+    def test_all_opt_in_returns_bare_list(self, client, db):
+        """all=1 keeps the legacy unpaginated array response."""
+        create_question_in_db(db, question_id='al1')
+        create_question_in_db(db, question_id='al2')
+        resp = client.get('/api/questions?all=1')
+        data = resp.get_json()
+        assert isinstance(data, list)
+        assert len(data) == 2
+
+    def test_invalid_cursor_rejected(self, client, db):
+        """A malformed cursor returns 400."""
+        resp = client.get('/api/questions?cursor=not-a-cursor')
+        assert resp.status_code == 400
+
+
+class TestFieldProjection:
+    def test_fields_limits_keys(self, client, db):
+        """fields= returns only the requested keys plus question_id."""
+        create_question_in_db(db, question_id='fp1', content='投影题目')
+        page = client.get('/api/questions?fields=content,is_used').get_json()
+        assert page['questions'] == [{'question_id': 'fp1', 'content': '投影题目', 'is_used': False}]
+
+    def test_paging_works_without_created_at_field(self, client, db):
+        """The cursor still works when created_at isn't an output field."""
+        for i in range(3):
+            create_question_in_db(db, question_id=f'fc{i}')
+        first = client.get('/api/questions?fields=content&limit=2').get_json()
+        second = client.get(f"/api/questions?fields=content&limit=2&cursor={first['next_cursor']}").get_json()
+        assert [q['question_id'] for q in first['questions'] + second['questions']] == ['fc0', 'fc1', 'fc2']
+
+    def test_unrequested_json_columns_not_decoded(self, client, db):
+        """A corrupt metadata_json only matters when metadata is requested."""
+        create_question_in_db(db, question_id='fj1')
+        db.session.query(QuestionModel).update({'metadata_json': '{not json'})
+        db.session.commit()
+        resp = client.get('/api/questions?fields=content,options')
+        assert resp.get_json()['questions'][0]['options'] == ['A选项', 'B选项', 'C选项', 'D选项']
+
+    def test_unknown_field_rejected(self, client, db):
+        resp = client.get('/api/questions?fields=content,password')
+        assert resp.status_code == 400
+        assert 'password' in resp.get_json()['error']
+
+
+class TestFacets:
+    def test_facet_counts(self, client, db):
+        """Every facet is counted from one grouped query."""
+        create_question_in_db(db, question_id='fa1', question_type='单选', difficulty='easy')
+        create_question_in_db(db, question_id='fa2', question_type='单选', difficulty='hard', is_used=True)
+        create_question_in_db(db, question_id='fa3', question_type='是非', difficulty='easy')
+        data = client.get('/api/questions/facets').get_json()
+        assert data['total'] == 3
+        assert data['facets']['type'] == [{'value': '单选', 'count': 2}, {'value': '是非', 'count': 1}]
+        assert data['facets']['difficulty'] == [{'value': 'easy', 'count': 2}, {'value': 'hard', 'count': 1}]
+        assert data['facets']['is_used'] == [{'value': False, 'count': 2}, {'value': True, 'count': 1}]
+        assert data['facets']['subject'] == [{'value': None, 'count': 3}]
+
+    def test_facets_honour_filters(self, client, db):
+        create_question_in_db(db, question_id='ff1', question_type='单选', difficulty='easy')
+        create_question_in_db(db, question_id='ff2', question_type='是非', difficulty='hard')
+        data = client.get('/api/questions/facets?difficulty=hard').get_json()
+        assert data['total'] == 1
+        assert data['facets']['type'] == [{'value': '是非', 'count': 1}]
+
 class TestUpdateQuestion:
     def test_update_question(self, client, db):
         """PUT modifies question content."""
@@ -121,13 +228,107 @@ class TestDeleteQuestion:
         assert resp.status_code == 404
 
 
+class TestBulkQuestions:
+    def test_mixed_operations(self, client, db):
+        """Creates, updates and deletes land in one commit with per-item results."""
+        create_question_in_db(db, question_id='bk_up', content='旧题干')
+        create_question_in_db(db, question_id='bk_del')
+        resp = client.post('/api/questions/bulk', json={'operations': [
+            {'op': 'create', 'question': {'question_id': 'bk_new', 'question_type': ' 单选 ',
+                                          'content': '新题', 'options': ['A', 'B']}},
+            {'op': 'update', 'question_id': 'bk_up', 'question': {'content': '新题干'}},
+            {'op': 'delete', 'question_id': 'bk_del'},
+        ]})
+        assert resp.status_code == 200
+        data = resp.get_json()
+        assert [r['status'] for r in data['results']] == ['created', 'updated', 'deleted']
+        assert (data['created'], data['updated'], data['deleted'], data['errors']) == (1, 1, 1, 0)
+        new = db.session.get(QuestionModel, 'bk_new')
+        assert new.question_type == '单选'
+        assert new.content_hash
+        assert db.session.get(QuestionModel, 'bk_up').content == '新题干'
+        assert db.session.get(QuestionModel, 'bk_del') is None
+
+    def test_invalid_items_reported_and_skipped(self, client, db):
+        create_question_in_db(db, question_id='bk_dup')
+        resp = client.post('/api/questions/bulk', json={'operations': [
+            {'op': 'create', 'question': {'question_id': 'bk_dup', 'question_type': '单选', 'content': 'x'}},
+            {'op': 'create', 'question': {'question_type': '单选'}},
+            {'op': 'update', 'question_id': 'missing', 'question': {}},
+            {'op': 'upsert'},
+            {'op': 'create', 'question': {'question_type': '简答', 'content': '有效'}},
+        ]})
+        data = resp.get_json()
+        assert resp.status_code == 200
+        assert [r['status'] for r in data['results']] == ['error'] * 4 + ['created']
+        assert data['results'][4]['question_id'].startswith('q_')
+        assert QuestionModel.query.count() == 2
+
+    def _bulk_errors(self, client, operations):
+        resp = client.post('/api/questions/bulk', json={'operations': operations + [
+            {'op': 'create', 'question': {'question_type': '简答', 'content': '有效'}}]})
+        assert resp.status_code == 200
+        results = resp.get_json()['results']
+        assert results[-1]['status'] == 'created'
+        return [r.get('error') for r in results[:-1]]
+
+    def test_question_that_is_not_an_object(self, client, db):
+        create_question_in_db(db, question_id='bk_ok')
+        assert self._bulk_errors(client, [
+            {'op': 'create', 'question': '单选题'},
+            {'op': 'update', 'question_id': 'bk_ok', 'question': ['x']},
+            {'op': 'create', 'question': 42},
+        ]) == ['question must be an object'] * 3
+
+    def test_question_type_that_is_not_a_string(self, client, db):
+        create_question_in_db(db, question_id='bk_ok')
+        assert self._bulk_errors(client, [
+            {'op': 'create', 'question': {'question_type': 7, 'content': '题干'}},
+            {'op': 'update', 'question_id': 'bk_ok', 'question': {'question_type': ['单选']}},
+        ]) == ['question_type must be a string'] * 2
+
+    def test_question_id_that_is_not_a_string(self, client, db):
+        create_question_in_db(db, question_id='bk_ok')
+        assert self._bulk_errors(client, [
+            {'op': 'delete', 'question_id': ['bk_ok']},
+            {'op': 'update', 'question': {'question_id': {'id': 'bk_ok'}}},
+        ]) == ['question_id must be a string'] * 2
+        assert db.session.get(QuestionModel, 'bk_ok') is not None
+
+    def test_atomic_rejects_whole_batch(self, client, db):
+        resp = client.post('/api/questions/bulk', json={'atomic': True, 'operations': [
+            {'op': 'create', 'question': {'question_type': '单选', 'content': 'ok'}},
+            {'op': 'delete', 'question_id': 'missing'},
+        ]})
+        assert resp.status_code == 400
+        assert [r['status'] for r in resp.get_json()['results']] == ['skipped', 'error']
+        assert QuestionModel.query.count() == 0
+
+    def test_associates_uploaded_images(self, client, db):
+        from app.db_models import QuestionImageModel
+        db.session.add(QuestionImageModel(image_id='img_0b0c01', filename='img_0b0c01.png'))
+        db.session.commit()
+        client.post('/api/questions/bulk', json={'operations': [{'op': 'create', 'question': {
+            'question_id': 'bk_img', 'question_type': '简答',
+            'content': '<p>看图</p><img src="/api/images/img_0b0c01">'}}]})
+        image = QuestionImageModel.query.filter_by(image_id='img_0b0c01').one()
+        assert image.question_id == 'bk_img'
+
+    def test_thousand_creates_in_one_request(self, client, db):
+        ops = [{'op': 'create', 'question': {'question_type': '简答', 'content': f'批量题目 {i}'}}
+               for i in range(1000)]
+        resp = client.post('/api/questions/bulk', json={'operations': ops})
+        assert resp.get_json()['created'] == 1000
+        assert QuestionModel.query.count() == 1000
+
+
 class TestSearchQuestions:
     def test_search_by_keyword(self, client, db):
         """keyword search filters correctly."""
         create_question_in_db(db, question_id='sk1', content='Python是编程语言')
         create_question_in_db(db, question_id='sk2', content='Java是编程语言')
         resp = client.get('/api/questions?keyword=Python')
-        data = resp.get_json()
+        data = resp.get_json()['questions']
         assert len(data) == 1
         assert data[0]['question_id'] == 'sk1'
 
@@ -136,7 +337,7 @@ class TestSearchQuestions:
         create_question_in_db(db, question_id='st1', question_type='单选')
         create_question_in_db(db, question_id='st2', question_type='是非', content='判断题')
         resp = client.get('/api/questions?type=是非')
-        data = resp.get_json()
+        data = resp.get_json()['questions']
         assert len(data) == 1
         assert data[0]['question_id'] == 'st2'
 
@@ -145,7 +346,7 @@ class TestSearchQuestions:
         create_question_in_db(db, question_id='sl1', language='zh')
         create_question_in_db(db, question_id='sl2', language='en', content='English question')
         resp = client.get('/api/questions?language=en')
-        data = resp.get_json()
+        data = resp.get_json()['questions']
         assert len(data) == 1
         assert data[0]['question_id'] == 'sl2'
 
@@ -155,7 +356,7 @@ class TestSearchQuestions:
         create_question_in_db(db, question_id='sc2', question_type='单选', language='en', content='Python basics')
         create_question_in_db(db, question_id='sc3', question_type='是非', language='zh', content='Python判断')
         resp = client.get('/api/questions?type=单选&language=zh&keyword=Python')
-        data = resp.get_json()
+        data = resp.get_json()['questions']
         assert len(data) == 1
         assert data[0]['question_id'] == 'sc1'
 
@@ -163,7 +364,7 @@ class TestSearchQuestions:
         """Search with no matches returns empty list."""
         create_question_in_db(db, question_id='sn1', content='数学题目')
         resp = client.get('/api/questions?keyword=不存在的关键词')
-        assert resp.get_json() == []
+        assert resp.get_json()['questions'] == []
 
 
 class TestImportExport:
@@ -184,6 +385,42 @@ class TestImportExport:
         result = resp.get_json()
         assert result['count'] >= 1
 
+    def test_import_reports_duplicates(self, client, db):
+        """Re-formatted copies are skipped and reported with the existing ID."""
+        create_question_in_db(db, question_id='dup_orig', content='<p>什么是 机会成本？</p>')
+        txt_content = """[简答]
+什么是机会成本?
+[简答]
+什么是边际成本？
+[简答]
+什么是边际成本？
+"""
+        data = {'file': (io.BytesIO(txt_content.encode('utf-8')), 'dup.txt')}
+        resp = client.post('/api/questions/import', data=data, content_type='multipart/form-data')
+        result = resp.get_json()
+        assert result['imported'] == 1
+        assert result['skipped'] == 2
+        dups = {d['index']: d['existing_question_id'] for d in result['duplicates']}
+        assert dups[0] == 'dup_orig'
+        assert dups[2].endswith('_txt_1')
+
+    def test_import_keeps_questions_differing_only_by_figure(self, client, db, tmp_path, monkeypatch):
+        from docx import Document
+        from app import utils
+        from tests.test_docx_importer import PNG
+        monkeypatch.setattr(utils, '_IMAGES_DIR', str(tmp_path / 'images'))
+        doc = Document()
+        for padding in (b'a', b'b'):
+            doc.add_paragraph('[简答]')
+            doc.add_paragraph('根据下图说明林分结构。')
+            doc.add_picture(io.BytesIO(PNG + padding))
+        doc.save(str(tmp_path / 'figures.docx'))
+
+        data = {'file': (io.BytesIO((tmp_path / 'figures.docx').read_bytes()), 'figures.docx')}
+        result = client.post('/api/questions/import', data=data,
+                             content_type='multipart/form-data').get_json()
+        assert (result['imported'], result['skipped']) == (2, 0)
+
     def test_import_no_file(self, client, db):
         """No file upload returns 400."""
         resp = client.post('/api/questions/import', data={}, content_type='multipart/form-data')
@@ -193,3 +430,35 @@ class TestImportExport:
         """Invalid export format returns 400."""
         resp = client.get('/api/questions/export?format=xml')
         assert resp.status_code == 400
+
+    def test_export_json_streams_whole_bank(self, client, db):
+        """format=json streams a valid document with every question."""
+        for i in range(3):
+            create_question_in_db(db, question_id=f'ej{i}', content=f'题目{i}')
+        resp = client.get('/api/questions/export?format=json')
+        assert resp.is_streamed
+        data = json.loads(resp.get_data(as_text=True))
+        assert [q['question_id'] for q in data['questions']] == ['ej0', 'ej1', 'ej2']
+        assert 'exported_at' in data
+
+    def test_export_jsonl_honours_filters(self, client, db):
+        """format=jsonl emits one object per line, filtered like the list."""
+        create_question_in_db(db, question_id='el1', question_type='单选')
+        create_question_in_db(db, question_id='el2', question_type='是非', content='是非题')
+        resp = client.get('/api/questions/export?format=jsonl&type=是非')
+        assert resp.mimetype == 'application/x-ndjson'
+        lines = resp.get_data(as_text=True).splitlines()
+        assert [json.loads(line)['question_id'] for line in lines] == ['el2']
+
+    def test_export_csv_is_rfc4180(self, client, db):
+        """Commas, quotes and newlines in fields survive a CSV round trip."""
+        import csv
+        tricky = '含有,逗号、"引号"\n和换行'
+        create_question_in_db(db, question_id='ec1', content=tricky, options=['A,1', 'B'])
+        body = client.get('/api/questions/export?format=csv').get_data(as_text=True)
+        assert body.startswith('ID,Type,Content')
+        assert '\r\n' in body
+        rows = list(csv.reader(io.StringIO(body, newline='')))
+        assert rows[1][0] == 'ec1'
+        assert rows[1][2] == tricky
+        assert rows[1][3] == 'A,1|B'
@@ -0,0 +1,93 @@
+"""Tests for ETag / conditional GET response caching."""
+from sqlalchemy import event
+from app import cache
+from app.db_models import QuestionModel
+from tests.conftest import create_question_in_db, create_exam_in_db
+
+
+class _QueryCounter:
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def __call__(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self)
+
+
+class TestConditionalGet:
+    def test_etag_and_304(self, client, db):
+        """A matching If-None-Match gets 304 with no body."""
+        create_question_in_db(db, question_id='et1')
+        first = client.get('/api/questions')
+        assert first.headers['ETag']
+        assert first.headers['Cache-Control'] == 'no-cache'
+        again = client.get('/api/questions', headers={'If-None-Match': first.headers['ETag']})
+        assert again.status_code == 304
+        assert again.data == b''
+
+    def test_repeat_load_skips_database(self, client, db):
+        """A cached response is served without running any SQL."""
+        create_question_in_db(db, question_id='et2')
+        client.get('/api/question-types')
+        with _QueryCounter(db.engine) as counter:
+            resp = client.get('/api/question-types')
+        assert resp.status_code == 200
+        assert counter.count == 0
+
+    def test_query_string_is_part_of_key(self, client, db):
+        create_question_in_db(db, question_id='qk1', question_type='单选')
+        create_question_in_db(db, question_id='qk2', question_type='是非', content='是非题')
+        assert client.get('/api/questions?type=单选').get_json()['total'] == 1
+        assert client.get('/api/questions').get_json()['total'] == 2
+
+
+class TestInvalidation:
+    def test_orm_write_invalidates(self, client, db):
+        """Creating a question changes the list ETag and content."""
+        etag = client.get('/api/questions').headers['ETag']
+        client.post('/api/questions', json={'question_id': 'iv1', 'question_type': '单选', 'content': '新题'})
+        resp = client.get('/api/questions', headers={'If-None-Match': etag})
+        assert resp.status_code == 200
+        assert resp.get_json()['total'] == 1
+
+    def test_bulk_update_invalidates(self, client, db):
+        """query.update() bypasses the unit of work but still bumps the table."""
+        create_question_in_db(db, question_id='bu1')
+        assert client.get('/api/questions/subjects').get_json() == []
+        db.session.query(QuestionModel).update({'subject': '林业经济学'})
+        db.session.commit()
+        assert client.get('/api/questions/subjects').get_json() == ['林业经济学']
+
+    def test_exam_question_insert_invalidates_exam_list(self, client, db):
+        """Core inserts into exam_questions refresh /api/exams summaries."""
+        create_question_in_db(db, question_id='eq1')
+        create_exam_in_db(db, exam_id='eqe1')
+        assert client.get('/api/exams').get_json()[0]['question_count'] == 0
+        client.post('/api/exams/eqe1/add_question', json={'question_id': 'eq1'})
+        assert client.get('/api/exams').get_json()[0]['question_count'] == 1
+
+    def test_rollback_does_not_bump(self, client, db):
+        before = cache.generation('questions')
+        db.session.add(QuestionModel(question_id='rb1', question_type='单选', content='x'))
+        db.session.flush()
+        db.session.rollback()
+        assert cache.generation('questions') == before
+
+
+class TestLRUCache:
+    def test_evicts_least_recently_used(self):
+        lru = cache.LRUCache(max_entries=2)
+        lru.put('a', 1)
+        lru.put('b', 2)
+        lru.get('a')
+        lru.put('c', 3)
+        assert lru.get('b') is None
+        assert lru.get('a') == 1
+        assert len(lru) == 2
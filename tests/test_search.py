@@ -0,0 +1,95 @@
+"""Tests for the FTS5 full-text question index."""
+import pytest
+from sqlalchemy import text
+from tests.conftest import create_question_in_db
+
+
+def _fts_ids(db):
+    rows = db.session.execute(text('SELECT question_id FROM questions_fts')).fetchall()
+    return {r[0] for r in rows}
+
+
+class TestFtsSync:
+    def test_insert_indexed(self, client, db):
+        """New questions appear in the FTS table."""
+        client.post('/api/questions', json={
+            'question_id': 'fs1', 'question_type': '单选', 'content': '森林经济学概论',
+        })
+        assert _fts_ids(db) == {'fs1'}
+
+    def test_update_reindexed(self, client, db):
+        """Editing content replaces the indexed text."""
+        create_question_in_db(db, question_id='fs2', content='旧的题干内容')
+        client.put('/api/questions/fs2', json={'content': '全新的题干内容'})
+        assert client.get('/api/questions?keyword=旧的题干').get_json()['total'] == 0
+        assert client.get('/api/questions?keyword=全新的题干').get_json()['total'] == 1
+
+    def test_delete_and_batch_delete_unindexed(self, client, db):
+        """Single and bulk deletes both remove FTS rows."""
+        for qid in ('fd1', 'fd2', 'fd3'):
+            create_question_in_db(db, question_id=qid)
+        client.delete('/api/questions/fd1')
+        client.post('/api/questions/batch-delete', json={'question_ids': ['fd2']})
+        assert _fts_ids(db) == {'fd3'}
+
+
+class TestKeywordSearch:
+    def test_keyword_matches_other_columns(self, client, db):
+        """keyword searches content_en, tags and explanation as well as content."""
+        create_question_in_db(db, question_id='kc1', content='题目甲', content_en='Forest rent theory')
+        create_question_in_db(db, question_id='kc2', content='题目乙', tags='林业,地租')
+        create_question_in_db(db, question_id='kc3', content='题目丙')
+        data = client.get('/api/questions?keyword=forest').get_json()['questions']
+        assert [q['question_id'] for q in data] == ['kc1']
+
+    def test_short_keyword_falls_back_to_like(self, client, db):
+        """Keywords under three characters still match via LIKE."""
+        create_question_in_db(db, question_id='ks1', content='什么是林木')
+        create_question_in_db(db, question_id='ks2', content='什么是草原')
+        data = client.get('/api/questions?keyword=林木').get_json()['questions']
+        assert [q['question_id'] for q in data] == ['ks1']
+
+    def test_short_keyword_searches_every_indexed_column(self, client, db):
+        """The LIKE fallback covers the same columns as the FTS match."""
+        create_question_in_db(db, question_id='kl1', content='题目甲', tags='林木,产权')
+        create_question_in_db(db, question_id='kl2', content='题目乙', content_en='Tree rent')
+        create_question_in_db(db, question_id='kl3', content='题目丙', knowledge_point='林木经营')
+        data = client.get('/api/questions?keyword=林木').get_json()['questions']
+        assert sorted(q['question_id'] for q in data) == ['kl1', 'kl3']
+        data = client.get('/api/questions/search?q=re').get_json()
+        assert [r['question_id'] for r in data] == ['kl2']
+
+    def test_keyword_with_fts_syntax_is_literal(self, client, db):
+        """Quotes and operators in the keyword are searched literally."""
+        create_question_in_db(db, question_id='kq1', content='关于 "AND" 运算符')
+        resp = client.get('/api/questions?keyword="AND" 运')
+        assert resp.status_code == 200
+        assert resp.get_json()['total'] == 1
+
+    def test_knowledge_point_filter(self, client, db):
+        """knowledge_point filter only matches that column."""
+        create_question_in_db(db, question_id='kp1', content='可持续发展题', knowledge_point='其他')
+        create_question_in_db(db, question_id='kp2', content='题目', knowledge_point='可持续发展')
+        data = client.get('/api/questions?knowledge_point=可持续发展').get_json()['questions']
+        assert [q['question_id'] for q in data] == ['kp2']
+
+
+class TestRankedSearch:
+    def test_ranked_with_snippet(self, client, db):
+        """Results carry <mark> snippets and better matches rank first."""
+        create_question_in_db(db, question_id='rs1', content='边际成本与平均成本')
+        create_question_in_db(db, question_id='rs2', content='边际成本、边际收益与边际成本曲线')
+        data = client.get('/api/questions/search?q=边际成本').get_json()
+        assert [q['question_id'] for q in data] == ['rs2', 'rs1']
+        assert '<mark>边际成本</mark>' in data[0]['snippet']
+
+    def test_search_honours_filters(self, client, db):
+        """List filters narrow the ranked results."""
+        create_question_in_db(db, question_id='sf1', content='机会成本定义', question_type='单选')
+        create_question_in_db(db, question_id='sf2', content='机会成本计算', question_type='是非')
+        data = client.get('/api/questions/search?q=机会成本&type=是非').get_json()
+        assert [q['question_id'] for q in data] == ['sf2']
+
+    def test_search_requires_q(self, client, db):
+        """Missing q returns 400."""
+        assert client.get('/api/questions/search').status_code == 400
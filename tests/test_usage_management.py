@@ -15,7 +15,7 @@ class TestUsageManagement:
 
         resp = client.get('/api/questions?is_used=1')
         assert resp.status_code == 200
-        data = resp.get_json()
+        data = resp.get_json()['questions']
         assert len(data) == 2
         ids = {q['question_id'] for q in data}
         assert ids == {'u1', 'u3'}
@@ -27,7 +27,7 @@ class TestUsageManagement:
 
         resp = client.get('/api/questions?is_used=0')
         assert resp.status_code == 200
-        data = resp.get_json()
+        data = resp.get_json()['questions']
         assert len(data) == 1
         assert data[0]['question_id'] == 'u2'
 
@@ -88,6 +88,6 @@ class TestUsageManagement:
 
         resp = client.get('/api/questions?is_used=1&type=单选')
         assert resp.status_code == 200
-        data = resp.get_json()
+        data = resp.get_json()['questions']
         assert len(data) == 1
         assert data[0]['question_id'] == 'ct1'
@@ -0,0 +1,286 @@
+"""Tests for Word exam export, its fragment cache, skeletons and image lookups."""
+import base64
+import inspect
+import io
+import json
+import zipfile
+from datetime import datetime, timedelta
+from docx import Document
+from sqlalchemy import event
+from app import utils
+from app.db_models import CourseSettingsModel, ExamModel, QuestionImageModel
+from tests.conftest import create_question_in_db, create_exam_in_db
+
+PNG = base64.b64decode(
+    'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNk+M9QDwADhgGAWjR9awAAAABJRU5ErkJggg==')
+
+
+def _export(exam, tmp_path, mode='zh', show_answer=True):
+    path = tmp_path / f'{exam.exam_id}_{mode}_{show_answer}.docx'
+    utils.export_exam_to_word(exam, str(path), mode=mode, show_answer=show_answer)
+    return path
+
+
+def _body_xml(path):
+    return zipfile.ZipFile(path).read('word/document.xml')
+
+
+def _texts(path):
+    return [p.text for p in Document(str(path)).paragraphs]
+
+
+class TestFragmentCache:
+    def test_reexport_is_identical_without_rendering(self, db, tmp_path, monkeypatch):
+        """A second export splices cached fragments and yields the same body."""
+        create_question_in_db(db, 'fc1', content='<p>第一题 <strong>加粗</strong></p>')
+        create_question_in_db(db, 'fc2', content='第二题\n第二行', content_en='Second')
+        exam = create_exam_in_db(db, 'fce', question_ids=['fc1', 'fc2'])
+        first = _body_xml(_export(exam, tmp_path, 'both'))
+
+        calls = []
+        monkeypatch.setattr(utils, '_render_question_field', lambda *a: calls.append(a))
+        second = _body_xml(_export(exam, tmp_path, 'both'))
+        assert calls == []
+        assert second == first
+
+    def test_number_follows_position(self, db, tmp_path):
+        """One cached fragment is numbered by its position in each paper."""
+        create_question_in_db(db, 'fn1', content='甲题')
+        create_question_in_db(db, 'fn2', content='乙题')
+        a = create_exam_in_db(db, 'fna', question_ids=['fn1', 'fn2'])
+        b = create_exam_in_db(db, 'fnb', question_ids=['fn2', 'fn1'])
+        assert '1. 甲题' in _texts(_export(a, tmp_path))
+        texts = _texts(_export(b, tmp_path))
+        assert '1. 乙题' in texts
+        assert '2. 甲题' in texts
+
+    def test_edit_invalidates(self, db, tmp_path):
+        """A new updated_at renders the question again."""
+        q = create_question_in_db(db, 'fe1', content='旧题干')
+        exam = create_exam_in_db(db, 'fee', question_ids=['fe1'])
+        _export(exam, tmp_path)
+        q.content = '新题干'
+        q.updated_at = datetime.now() + timedelta(seconds=1)
+        db.session.commit()
+        assert '1. 新题干' in _texts(_export(exam, tmp_path))
+
+    def test_cached_image_added_to_each_document(self, db, tmp_path, monkeypatch):
+        """Images in a cached fragment are re-registered with every package."""
+        monkeypatch.setattr(utils, '_IMAGES_DIR', str(tmp_path))
+        (tmp_path / 'img_0fc0ffee.png').write_bytes(PNG)
+        db.session.add(QuestionImageModel(image_id='img_0fc0ffee', filename='img_0fc0ffee.png'))
+        db.session.commit()
+        create_question_in_db(db, 'fi1', content='<p>看图</p><img src="/api/images/img_0fc0ffee">')
+        exam = create_exam_in_db(db, 'fie', question_ids=['fi1'])
+        _export(exam, tmp_path)
+        path = _export(exam, tmp_path, show_answer=False)
+        doc = Document(str(path))
+        images = [rel for rel in doc.part.rels.values() if 'image' in rel.reltype]
+        assert len(images) == 1
+        assert images[0].target_part.blob == PNG
+        assert f'r:embed="{images[0].rId}"' in _body_xml(path).decode()
+
+
+    def test_cached_fragments_hold_no_image_bytes(self, db, tmp_path, monkeypatch):
+        """Fragments keep image paths; each export reads the files again."""
+        monkeypatch.setattr(utils, '_IMAGES_DIR', str(tmp_path))
+        (tmp_path / 'img_0b1e55ed.png').write_bytes(PNG)
+        db.session.add(QuestionImageModel(image_id='img_0b1e55ed', filename='img_0b1e55ed.png'))
+        db.session.commit()
+        create_question_in_db(db, 'fb1', content='<p>甲</p><img src="/api/images/img_0b1e55ed">')
+        create_question_in_db(db, 'fb2', content='<p>乙</p><img src="/api/images/img_0b1e55ed">')
+        exam = create_exam_in_db(db, 'fbe', question_ids=['fb1', 'fb2'])
+        _export(exam, tmp_path)
+
+        fragments = [f for key, f in utils._fragment_cache._entries.items()
+                     if key[0] in ('fb1', 'fb2') and f.images]
+        assert len(fragments) == 2
+        for fragment in fragments:
+            assert [info.path for info in fragment.images.values()] == [str(tmp_path / 'img_0b1e55ed.png')]
+        reads = []
+        read = utils._read_image
+        monkeypatch.setattr(utils, '_read_image', lambda info: reads.append(info.path) or read(info))
+        doc = Document(str(_export(exam, tmp_path, show_answer=False)))
+        assert len(reads) == 1   # once per export, shared by both questions
+        assert len(doc.inline_shapes) == 2
+        assert [part.blob for part in doc.part.package.image_parts] == [PNG]
+
+
+class TestImagePrefetch:
+    def _paper(self, db, tmp_path, monkeypatch, image_ids):
+        monkeypatch.setattr(utils, '_IMAGES_DIR', str(tmp_path))
+        for image_id in image_ids:
+            (tmp_path / f'{image_id}.png').write_bytes(PNG)
+            db.session.add(QuestionImageModel(image_id=image_id, filename=f'{image_id}.png'))
+        db.session.commit()
+        for i, image_id in enumerate(image_ids):
+            create_question_in_db(db, f'ip{image_id}', content=f'<p>图{i}</p><img src="/api/images/{image_id}">')
+        return create_exam_in_db(db, f'ipe{image_ids[0]}', question_ids=[f'ip{i}' for i in image_ids])
+
+    def test_one_query_for_all_images(self, db, tmp_path, monkeypatch):
+        exam = self._paper(db, tmp_path, monkeypatch, ['img_1a01', 'img_1a02', 'img_1a03'])
+        statements = []
+        listener = lambda conn, cursor, stmt, *a: statements.append(stmt)
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            path = _export(exam, tmp_path)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', listener)
+        assert sum('question_images' in stmt for stmt in statements) == 1
+        assert len(Document(str(path)).inline_shapes) == 3
+
+    def test_rerender_skips_database_and_header_decoding(self, db, tmp_path, monkeypatch):
+        """With fragments evicted, cached image info still serves every image."""
+        exam = self._paper(db, tmp_path, monkeypatch, ['img_2b01', 'img_2b02'])
+        _export(exam, tmp_path)
+        utils._fragment_cache.clear()
+
+        decoded = []
+        monkeypatch.setattr(utils.DocxImage, 'from_file', lambda *a: decoded.append(a))
+        statements = []
+        listener = lambda conn, cursor, stmt, *a: statements.append(stmt)
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            path = _export(exam, tmp_path)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', listener)
+        assert decoded == []
+        assert not any('question_images' in stmt for stmt in statements)
+        assert len(Document(str(path)).inline_shapes) == 2
+
+
+class TestBatchExport:
+    def _exams(self, db):
+        create_question_in_db(db, 'bx1', content='批量导出题一', content_en='Batch one')
+        create_question_in_db(db, 'bx2', question_type='简答', content='批量导出题二')
+        create_exam_in_db(db, 'bxa', name='期末 A卷', config={'单选': {'count': 1, 'points': 5}},
+                          question_ids=['bx1', 'bx2'])
+        create_exam_in_db(db, 'bxb', name='期末 B卷', question_ids=['bx2'])
+
+    def _post(self, client, body):
+        resp = client.post('/api/exams/export-batch', json=body)
+        return resp, zipfile.ZipFile(io.BytesIO(resp.get_data())) if resp.status_code == 200 else None
+
+    def test_zip_of_every_variant(self, app, client, db, tmp_path):
+        """Worker processes render each exam × variant into the streamed ZIP."""
+        app.config['EXPORT_WORKERS'] = 2
+        self._exams(db)
+        resp, zf = self._post(client, {'exam_ids': ['bxa', 'bxb'], 'variants': [
+            {'mode': 'zh', 'show_answer': False}, {'mode': 'both', 'show_answer': True}]})
+        assert resp.headers['X-Export-Total'] == '4'
+        names = set(zf.namelist())
+        assert names == {'期末_A卷_zh.docx', '期末_A卷_both_答案.docx', '期末_B卷_zh.docx',
+                         '期末_B卷_both_答案.docx', 'manifest.json'}
+        # Same document as a single export of that variant
+        doc = Document(io.BytesIO(zf.read('期末_A卷_both_答案.docx')))
+        texts = [p.text for p in doc.paragraphs]
+        assert '1. Batch one' in texts
+        assert '满分：5 分' in texts
+        single = tmp_path / 'single.docx'
+        utils.export_exam_to_word(db.session.get(ExamModel, 'bxa'), str(single),
+                                  mode='both', show_answer=True)
+        assert [p.text for p in Document(str(single)).paragraphs] == texts
+
+        progress = client.get(f"/api/exams/export-batch/{resp.headers['X-Export-Batch']}").get_json()
+        assert (progress['status'], progress['done'], progress['total']) == ('completed', 4, 4)
+
+    def test_in_process_rendering_and_manifest(self, app, client, db):
+        app.config['EXPORT_WORKERS'] = 0
+        self._exams(db)
+        resp, zf = self._post(client, {'exam_ids': ['bxb']})
+        manifest = json.loads(zf.read('manifest.json'))
+        assert manifest == {'files': ['期末_B卷_zh_答案.docx'], 'errors': []}
+
+    def test_validation(self, client, db):
+        self._exams(db)
+        assert self._post(client, {'exam_ids': []})[0].status_code == 400
+        assert self._post(client, {'exam_ids': ['bxa'], 'variants': [{'mode': 'fr'}]})[0].status_code == 400
+        resp, _ = self._post(client, {'exam_ids': ['bxa', 'nope']})
+        assert resp.status_code == 404
+        assert resp.get_json()['missing'] == ['nope']
+        assert client.get('/api/exams/export-batch/exp_missing').status_code == 404
+
+    def test_rejects_malformed_exam_ids(self, client, db):
+        self._exams(db)
+        for exam_ids in ('bxa', [['bxa']], [{'id': 'bxa'}], ['bxa', ''], None):
+            resp, _ = self._post(client, {'exam_ids': exam_ids})
+            assert resp.status_code == 400, exam_ids
+
+
+class TestDocumentSkeleton:
+    def test_setup_built_once_per_settings(self, db, tmp_path, monkeypatch):
+        """Exports clone the cached skeleton; changed settings build a new one."""
+        settings = CourseSettingsModel(course_name='林业经济学', course_code='F101')
+        db.session.add(settings)
+        db.session.commit()
+        create_question_in_db(db, 'sk1', content='骨架题')
+        exam = create_exam_in_db(db, 'ske', question_ids=['sk1'])
+        utils._skeleton_cache.clear()
+        built = []
+        footer = utils._add_page_number_footer
+        monkeypatch.setattr(utils, '_add_page_number_footer', lambda doc: built.append(footer(doc)))
+
+        first = _export(exam, tmp_path)
+        second = _export(exam, tmp_path, 'both', show_answer=False)
+        assert len(built) == 1
+        for path in (first, second):
+            doc = Document(str(path))
+            assert '课程名称：《林业经济学》（A）卷' in [p.text for p in doc.paragraphs]
+            assert 'NUMPAGES' in doc.sections[0].footer._element.xml
+
+        settings.course_code = 'F102'
+        db.session.commit()
+        texts = _texts(_export(exam, tmp_path))
+        assert len(built) == 2
+        assert '课程代号：F102' in texts
+        assert '课程代号：F101' not in texts
+
+    def test_clone_is_independent(self):
+        skeleton = utils._exam_skeleton(None)
+        skeleton.add_paragraph('只在这一份')
+        assert '只在这一份' not in [p.text for p in utils._exam_skeleton(None).paragraphs]
+
+
+class TestPythonDocxInternals:
+    """Canary for the python-docx internals the export relies on
+    (_relate_image, _add_picture, _CachedImageHeader, _clone_document).
+    If this fails after an upgrade, fix those helpers, then widen the
+    version range in requirements.txt."""
+
+    def test_signatures(self):
+        from docx.opc.part import Part, XmlPart
+        from docx.opc.rel import Relationships
+        from docx.oxml.shape import CT_Inline
+        from docx.parts.image import ImagePart
+
+        def params(fn):
+            return [p for p in inspect.signature(fn).parameters if p != 'self']
+        assert params(CT_Inline.new_pic_inline) == ['shape_id', 'rId', 'filename', 'cx', 'cy']
+        assert params(utils.BaseImageHeader.__init__) == ['px_width', 'px_height', 'horz_dpi', 'vert_dpi']
+        assert params(utils.DocxImage.__init__) == ['blob', 'filename', 'image_header']
+        assert params(ImagePart.__init__) == ['partname', 'content_type', 'blob', 'image']
+        assert params(Part.load) == ['partname', 'content_type', 'blob', 'package']
+        assert params(XmlPart.__init__) == ['partname', 'content_type', 'element', 'package']
+        assert params(Relationships.add_relationship) == ['reltype', 'target', 'rId', 'is_external']
+
+    def test_image_round_trip(self, tmp_path):
+        """An Image related by _relate_image is the one its part hands back,
+        and _add_picture produces a picture python-docx reads."""
+        doc = Document()
+        path = tmp_path / 'dot.png'
+        path.write_bytes(PNG)
+        info = utils._ImageInfo(str(path), 'dot.png',
+                                utils._CachedImageHeader(utils.DocxImage.from_file(str(path))))
+        image = utils._read_image(info)
+        assert (image.content_type, image.ext, image.px_width) == ('image/png', 'png', 1)
+        run = doc.add_paragraph().add_run()
+        utils._add_picture(run, image, width=utils.Inches(1))
+        rid = utils._relate_image(doc.part, image)
+        assert utils._relate_image(doc.part, image) == rid
+        assert doc.part.related_parts[rid].image is image
+        clone = utils._clone_document(doc)
+        saved = tmp_path / 'out.docx'
+        clone.save(str(saved))
+        shapes = Document(str(saved)).inline_shapes
+        assert len(shapes) == 1
+        assert shapes[0].width == utils.Inches(1)